@@ -1,7 +1,9 @@
-from django.contrib import admin
-from django.db.models import Sum
+from django.contrib import admin, messages
+from django.db.models import Count
 from django.utils.html import format_html
-from .models import RewardAccount, RewardTransaction
+from payment import export
+from . import balances
+from .models import BackfillCheckpoint, RewardAccount, RewardTier, RewardTransaction
 
 
 @admin.register(RewardAccount)
@@ -19,10 +21,15 @@ class RewardAccountAdmin(admin.ModelAdmin):
         return format_html('${}', '{:.2f}'.format(float(obj.lifetime_points)))
     lifetime_points_display.short_description = 'Lifetime Points'
     
+    def get_queryset(self, request):
+        # Count the transactions of every row in the changelist query itself
+        qs = super().get_queryset(request)
+        return qs.select_related('user').annotate(num_transactions=Count('user__reward_transactions'))
+    
     def transaction_count(self, obj):
-        count = obj.user.reward_transactions.count()
-        return format_html('<span style="color: blue;">{} transactions</span>', count)
+        return format_html('<span style="color: blue;">{} transactions</span>', obj.num_transactions)
     transaction_count.short_description = 'Transactions'
+    transaction_count.admin_order_field = 'num_transactions'
     
     fieldsets = (
         ('User Information', {
@@ -38,6 +45,19 @@ class RewardAccountAdmin(admin.ModelAdmin):
     )
 
 
+@admin.register(RewardTier)
+class RewardTierAdmin(admin.ModelAdmin):
+    list_display = ['__str__', 'up_to', 'points', 'step', 'step_points']
+    list_editable = ['points', 'step', 'step_points']
+    list_display_links = ['__str__']
+
+
+@admin.register(BackfillCheckpoint)
+class BackfillCheckpointAdmin(admin.ModelAdmin):
+    list_display = ['name', 'last_pk', 'updated_at']
+    readonly_fields = ['updated_at']
+
+
 @admin.register(RewardTransaction)
 class RewardTransactionAdmin(admin.ModelAdmin):
     list_display = ['id', 'user', 'order_link', 'order_total_display', 'points_earned_display', 'transaction_type', 'created_at']
@@ -83,16 +103,27 @@ class RewardTransactionAdmin(admin.ModelAdmin):
 
 # Create a custom admin action to recalculate points
 def recalculate_user_points(modeladmin, request, queryset):
-    """Recalculate total points for selected users based on their transactions"""
-    for account in queryset:
-        total = account.user.reward_transactions.filter(
-            transaction_type='PURCHASE'
-        ).aggregate(Sum('points_earned'))['points_earned__sum'] or 0
-        
-        account.total_points = total
-        account.save()
+    """Rebuild total and lifetime points of the selected accounts from their transactions"""
+    drift = balances.recompute(queryset)
     
-    modeladmin.message_user(request, f'Successfully recalculated points for {queryset.count()} accounts.')
+    if drift:
+        details = ', '.join(
+            f"{row['user__username']} (${row['total_points']} -> ${row['expected_total']})"
+            for row in drift[:10]
+        )
+        if len(drift) > 10:
+            details += f', and {len(drift) - 10} more'
+        modeladmin.message_user(request, f'Corrected points for {len(drift)} accounts: {details}.', messages.WARNING)
+    else:
+        modeladmin.message_user(request, 'All selected accounts already match their transactions.')
 
 recalculate_user_points.short_description = 'Recalculate total points'
 RewardAccountAdmin.actions = [recalculate_user_points]
+
+
+def export_ledger_csv(modeladmin, request, queryset):
+    """Stream the selected reward transactions as CSV, oldest first"""
+    return export.streaming_response(export.ledger_lines(queryset, 'csv'), 'csv', name='reward-ledger')
+
+export_ledger_csv.short_description = 'Export selected transactions as CSV'
+RewardTransactionAdmin.actions = [export_ledger_csv]
@@ -3,3 +3,7 @@ from django.apps import AppConfig
 
 class AccountConfig(AppConfig):
     name = 'account'
+
+    def ready(self):
+        # Connect the reward tier signal handlers
+        from . import signals  # noqa: F401
@@ -0,0 +1,130 @@
+"""
+Rewards backfill
+
+Awards the PURCHASE RewardTransaction that orders placed before
+rewards existed, or whose award failed, never got. Orders are
+streamed in primary key order and posted chunk_size at a time, each
+chunk and its checkpoint in one transaction, so a stopped run picks
+up after its last chunk.
+"""
+
+from collections import defaultdict
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import Case, DecimalField, Exists, F, OuterRef, Value, When
+
+from payment.models import Order
+
+from .models import BackfillCheckpoint, RewardAccount, RewardTransaction
+from .tiers import get_schedule
+
+
+CHECKPOINT = 'rewards-backfill'
+
+CHUNK_SIZE = 2000
+
+
+def missing_orders(after=0):
+    """Orders of registered customers that never earned rewards, oldest first"""
+    return (
+        Order.objects.filter(pk__gt=after, user__isnull=False, amount_paid__gt=0)
+        .exclude(Exists(RewardTransaction.objects.filter(order=OuterRef('pk'), transaction_type='PURCHASE')))
+        .order_by('pk')
+        .values_list('pk', 'user_id', 'amount_paid')
+    )
+
+
+def _chunks(rows, size):
+    chunk = []
+    for row in rows:
+        chunk.append(row)
+        if len(chunk) == size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def _apply_deltas(deltas):
+    """Add points to total and lifetime points of several users in one UPDATE"""
+    RewardAccount.objects.bulk_create([RewardAccount(user_id=user_id) for user_id in deltas], ignore_conflicts=True)
+    delta = Case(
+        *[When(user_id=user_id, then=Value(points)) for user_id, points in deltas.items()],
+        output_field=DecimalField(max_digits=10, decimal_places=2),
+    )
+    RewardAccount.objects.filter(user_id__in=deltas).update(
+        total_points=F('total_points') + delta,
+        lifetime_points=F('lifetime_points') + delta,
+    )
+
+
+def _post_chunk(chunk, schedule):
+    """Award the rewards of one chunk of orders, returns (orders, points)"""
+    # Skip anything awarded since the chunk was read
+    done = set(
+        RewardTransaction.objects.filter(order_id__in=[pk for pk, _, _ in chunk], transaction_type='PURCHASE')
+        .values_list('order_id', flat=True)
+    )
+    chunk = [row for row in chunk if row[0] not in done]
+
+    points = schedule.points_for_many([amount_paid for _, _, amount_paid in chunk])
+    rewards = []
+    deltas = defaultdict(Decimal)
+    for (order_id, user_id, amount_paid), earned in zip(chunk, points):
+        if earned <= 0:
+            continue
+        rewards.append(RewardTransaction(
+            user_id=user_id,
+            order_id=order_id,
+            order_total=amount_paid,
+            points_earned=earned,
+            transaction_type='PURCHASE',
+            description=f'Reward points earned from order #{order_id} (backfilled)',
+        ))
+        deltas[user_id] += earned
+
+    RewardTransaction.objects.bulk_create(rewards)
+    if deltas:
+        _apply_deltas(deltas)
+    return len(rewards), sum(deltas.values(), Decimal('0.00'))
+
+
+def backfill(chunk_size=CHUNK_SIZE, dry_run=False, reset=False, progress=None):
+    """
+    Award the rewards every registered customer's order should have earned
+
+    Args:
+        chunk_size (int): Orders per transaction
+        dry_run (bool): Only count what would be awarded, from the
+            checkpoint on, without writing or moving the checkpoint
+        reset (bool): Start again from the first order
+        progress (callable): Called with (last_pk, orders, points) after
+            every chunk
+
+    Returns:
+        tuple: (orders, points) awarded, or that would be
+    """
+    checkpoint, created = BackfillCheckpoint.objects.get_or_create(name=CHECKPOINT)
+    if reset and not dry_run:
+        checkpoint.last_pk = 0
+        checkpoint.save()
+    after = 0 if reset else checkpoint.last_pk
+
+    schedule = get_schedule()
+    total_orders, total_points = 0, Decimal('0.00')
+    rows = missing_orders(after).iterator(chunk_size=chunk_size)
+    for chunk in _chunks(rows, chunk_size):
+        last_pk = chunk[-1][0]
+        if dry_run:
+            points = [earned for earned in schedule.points_for_many([row[2] for row in chunk]) if earned > 0]
+            orders, earned = len(points), sum(points, Decimal('0.00'))
+        else:
+            with transaction.atomic():
+                orders, earned = _post_chunk(chunk, schedule)
+                BackfillCheckpoint.objects.filter(pk=checkpoint.pk).update(last_pk=last_pk)
+        total_orders += orders
+        total_points += earned
+        if progress:
+            progress(last_pk, total_orders, total_points)
+    return total_orders, total_points
@@ -0,0 +1,112 @@
+"""
+Reward balance recompute
+
+RewardAccount.total_points and lifetime_points are running totals
+kept next to the RewardTransaction ledger. Should they ever drift
+from it, recompute() rebuilds them from the ledger set-based: per
+chunk of accounts, one SELECT finds the accounts whose stored totals
+differ and one UPDATE with correlated subqueries rewrites them.
+
+The ledger stores REDEEMED rows with negative points, so
+    total_points    = sum of every row
+    lifetime_points = sum of the PURCHASE rows
+"""
+
+from decimal import Decimal
+
+from django.contrib.auth.models import User
+from django.db import transaction
+from django.db.models import DecimalField, F, OuterRef, Q, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from .models import RewardAccount, RewardTransaction
+
+
+CHUNK_SIZE = 1000
+
+
+def _ledger_sum(**filters):
+    """Correlated subquery summing the ledger of the outer account's user"""
+    rows = (
+        RewardTransaction.objects.filter(user=OuterRef('user_id'), **filters)
+        .order_by()
+        .values('user')
+        .annotate(total=Sum('points_earned'))
+        .values('total')
+    )
+    output_field = DecimalField(max_digits=10, decimal_places=2)
+    return Coalesce(Subquery(rows, output_field=output_field), Value(Decimal('0.00')), output_field=output_field)
+
+
+def expected_totals():
+    """Expressions for the totals the ledger says an account should have"""
+    return {
+        'total_points': _ledger_sum(),
+        'lifetime_points': _ledger_sum(transaction_type='PURCHASE'),
+    }
+
+
+def find_drift(queryset):
+    """
+    Accounts in queryset whose stored totals disagree with the ledger
+
+    Returns:
+        list: Dicts with 'id', 'user__username', 'total_points',
+        'expected_total', 'lifetime_points' and 'expected_lifetime'
+    """
+    expected = expected_totals()
+    return list(
+        queryset.annotate(expected_total=expected['total_points'], expected_lifetime=expected['lifetime_points'])
+        .filter(~Q(total_points=F('expected_total')) | ~Q(lifetime_points=F('expected_lifetime')))
+        .order_by('id')
+        .values('id', 'user__username', 'total_points', 'expected_total', 'lifetime_points', 'expected_lifetime')
+    )
+
+
+def create_missing_accounts():
+    """
+    Give every user with ledger rows but no RewardAccount an empty one,
+    for recompute() to fill in
+
+    Returns:
+        int: Accounts created
+    """
+    missing = User.objects.filter(reward_account__isnull=True, reward_transactions__isnull=False).distinct()
+    created = RewardAccount.objects.bulk_create(
+        [RewardAccount(user_id=user_id) for user_id in missing.values_list('id', flat=True)],
+        ignore_conflicts=True,
+    )
+    return len(created)
+
+
+def recompute(queryset=None, chunk_size=CHUNK_SIZE, dry_run=False):
+    """
+    Rebuild total_points and lifetime_points from the ledger
+
+    Accounts are handled chunk_size at a time, each chunk in its own
+    transaction, and only the accounts that drifted are written.
+
+    Args:
+        queryset: RewardAccounts to recompute, all of them by default
+        chunk_size (int): Accounts per chunk
+        dry_run (bool): Only report the drift, change nothing
+
+    Returns:
+        list: The drift found, as returned by find_drift()
+    """
+    if queryset is None:
+        queryset = RewardAccount.objects.all()
+    account_ids = list(queryset.order_by('id').values_list('id', flat=True))
+
+    drift = []
+    for start in range(0, len(account_ids), chunk_size):
+        chunk = account_ids[start:start + chunk_size]
+        with transaction.atomic():
+            found = find_drift(RewardAccount.objects.select_for_update().filter(pk__in=chunk))
+            if found and not dry_run:
+                RewardAccount.objects.filter(pk__in=[row['id'] for row in found]).update(
+                    updated_at=timezone.now(), **expected_totals()
+                )
+        drift.extend(found)
+    return drift
@@ -1,10 +1,14 @@
-from django.contrib.auth.forms import UserCreationForm, AuthenticationForm
+from django.contrib.auth.forms import UserCreationForm, AuthenticationForm, PasswordResetForm
 from django.contrib.auth.models import User
 
 from django import forms
 
 from django.forms.widgets import PasswordInput, TextInput
 
+from django.template import loader
+
+from outbox.mail import enqueue
+
 
 # Registration form
 
@@ -95,4 +99,25 @@ class UpdateUserForm(forms.ModelForm):
 
 
         return email
-        
\ No newline at end of file
+
+
+
+# Password reset form
+
+class OutboxPasswordResetForm(PasswordResetForm):
+
+    # Queue the reset email instead of sending it during the request
+
+    def send_mail(self, subject_template_name, email_template_name, context, from_email, to_email, html_email_template_name=None):
+
+        subject = loader.render_to_string(subject_template_name, context)
+
+        # Email subject *must not* contain newlines
+
+        subject = ''.join(subject.splitlines())
+
+        body = loader.render_to_string(email_template_name, context)
+
+        html_body = loader.render_to_string(html_email_template_name, context) if html_email_template_name else ''
+
+        enqueue(subject, body, [to_email], from_email=from_email, html_body=html_body)
@@ -0,0 +1,86 @@
+"""
+Rewards ledger
+
+A customer's RewardTransaction rows, keyset-paginated on
+(created_at, id), with running balances and totals from the database.
+"""
+
+from decimal import Decimal
+
+from django.db.models import Count, F, Q, Sum, Window
+
+from store.pagination import paginate
+
+from .models import RewardTransaction
+
+
+PAGE_SIZE = 20
+
+
+def ledger(user):
+    """All of a user's reward transactions, with their order joined in"""
+    return RewardTransaction.objects.filter(user=user).select_related('order')
+
+
+def _older_than(row):
+    """Rows that sort before row in (created_at, id) order"""
+    return Q(created_at__lt=row.created_at) | Q(created_at=row.created_at, id__lt=row.pk)
+
+
+def annotate_balances(page, user):
+    """
+    Set .balance on every row of a ledger page to the account balance
+    right after that row
+
+    Args:
+        page (KeysetPage): Page of the user's ledger, newest first
+        user: Owner of the ledger
+    """
+    if not page:
+        return
+    # REDEEMED rows are negative, the balance is a plain running SUM()
+    # over the page on top of everything older
+    oldest, newest = page.object_list[-1], page.object_list[0]
+    opening = (
+        RewardTransaction.objects.filter(user=user).filter(_older_than(oldest))
+        .aggregate(total=Sum('points_earned'))['total'] or Decimal('0.00')
+    )
+    balances = dict(
+        RewardTransaction.objects.filter(user=user)
+        .exclude(_older_than(oldest))
+        .filter(Q(created_at__lt=newest.created_at) | Q(created_at=newest.created_at, id__lte=newest.pk))
+        .annotate(balance=Window(Sum('points_earned'), order_by=[F('created_at').asc(), F('id').asc()]))
+        .values_list('id', 'balance')
+    )
+    for row in page:
+        row.balance = opening + balances.get(row.pk, Decimal('0.00'))
+
+
+def totals(user):
+    """
+    Per-type totals of a user's ledger, in one query
+
+    Returns:
+        dict: 'count', 'earned', 'redeemed' and 'adjusted', amounts as
+        Decimal, redeemed as a positive amount
+    """
+    result = RewardTransaction.objects.filter(user=user).aggregate(
+        count=Count('id'),
+        earned=Sum('points_earned', filter=Q(transaction_type='PURCHASE')),
+        redeemed=Sum('points_earned', filter=Q(transaction_type='REDEEMED')),
+        adjusted=Sum('points_earned', filter=Q(transaction_type='ADJUSTMENT')),
+    )
+    zero = Decimal('0.00')
+    return {
+        'count': result['count'],
+        'earned': result['earned'] or zero,
+        'redeemed': -(result['redeemed'] or zero),
+        'adjusted': result['adjusted'] or zero,
+    }
+
+
+def ledger_page(user, request, page_size=PAGE_SIZE):
+    """The page of the user's ledger the request asks for, with balances"""
+    page = paginate(ledger(user), request, page_size=page_size, date_field='created_at')
+    annotate_balances(page, user)
+    return page
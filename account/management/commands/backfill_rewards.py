@@ -0,0 +1,26 @@
+from django.core.management.base import BaseCommand
+
+from account import backfill
+
+
+class Command(BaseCommand):
+    help = 'Award rewards to past orders of registered customers that never earned them'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=backfill.CHUNK_SIZE, help='Orders handled per transaction')
+        parser.add_argument('--dry-run', action='store_true', help='Only report what would be awarded')
+        parser.add_argument('--reset', action='store_true', help='Ignore the checkpoint and start from the first order')
+
+    def handle(self, *args, **options):
+        def progress(last_pk, orders, points):
+            self.stdout.write(f'Up to order #{last_pk}: {orders} order(s), ${points}')
+
+        orders, points = backfill.backfill(
+            chunk_size=options['chunk_size'],
+            dry_run=options['dry_run'],
+            reset=options['reset'],
+            progress=progress,
+        )
+
+        verb = 'Would award' if options['dry_run'] else 'Awarded'
+        self.stdout.write(self.style.SUCCESS(f'{verb} ${points} in rewards on {orders} order(s).'))
@@ -0,0 +1,27 @@
+from django.core.management.base import BaseCommand
+
+from account import balances
+
+
+class Command(BaseCommand):
+    help = 'Rebuild reward account balances from the rewards ledger and report any drift'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=balances.CHUNK_SIZE, help='Accounts recomputed per transaction')
+        parser.add_argument('--dry-run', action='store_true', help='Only report the drift, change nothing')
+
+    def handle(self, *args, **options):
+        if not options['dry_run']:
+            created = balances.create_missing_accounts()
+            if created:
+                self.stdout.write(f'Created {created} missing reward account(s).')
+
+        drift = balances.recompute(chunk_size=options['chunk_size'], dry_run=options['dry_run'])
+        for row in drift:
+            self.stdout.write(
+                f"{row['user__username']}: total {row['total_points']} -> {row['expected_total']}, "
+                f"lifetime {row['lifetime_points']} -> {row['expected_lifetime']}"
+            )
+
+        verb = 'Found' if options['dry_run'] else 'Fixed'
+        self.stdout.write(self.style.SUCCESS(f'{verb} drift in {len(drift)} account(s).'))
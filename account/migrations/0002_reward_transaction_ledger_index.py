@@ -0,0 +1,20 @@
+# Generated by Django 6.0 on 2026-10-16 22:40
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('account', '0001_initial'),
+        ('payment', '0002_order_user_date_index'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='rewardtransaction',
+            index=models.Index(fields=['user', 'created_at', 'id'], name='reward_txn_user_created_idx'),
+        ),
+    ]
@@ -0,0 +1,49 @@
+# Generated by Django 6.0 on 2026-10-16 23:05
+
+from django.db import migrations, models
+
+
+# The schedule calculate_reward_points had hard-coded until now
+DEFAULT_TIERS = (
+    ('10.00', '1.00', None, '0.00'),
+    ('20.00', '2.00', None, '0.00'),
+    ('30.00', '3.00', None, '0.00'),
+    ('40.00', '4.00', None, '0.00'),
+    ('100.00', '5.00', None, '0.00'),
+    ('200.00', '10.00', None, '0.00'),
+    (None, '10.00', '100.00', '5.00'),
+)
+
+
+def seed_tiers(apps, schema_editor):
+    RewardTier = apps.get_model('account', 'RewardTier')
+    RewardTier.objects.bulk_create([
+        RewardTier(up_to=up_to, points=points, step=step, step_points=step_points)
+        for up_to, points, step, step_points in DEFAULT_TIERS
+    ])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('account', '0002_reward_transaction_ledger_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RewardTier',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('up_to', models.DecimalField(blank=True, decimal_places=2, help_text='Highest order total in this tier, leave empty for the top tier', max_digits=10, null=True, unique=True)),
+                ('points', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('step', models.DecimalField(blank=True, decimal_places=2, help_text='Optional, award step points for every started step above the previous tier', max_digits=10, null=True)),
+                ('step_points', models.DecimalField(decimal_places=2, default=0.0, max_digits=10)),
+            ],
+            options={
+                'verbose_name': 'Reward Tier',
+                'verbose_name_plural': 'Reward Tiers',
+                'ordering': ['up_to'],
+            },
+        ),
+        migrations.RunPython(seed_tiers, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,26 @@
+# Generated by Django 6.0 on 2026-10-16 23:40
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('account', '0004_backfillcheckpoint'),
+        ('payment', '0002_order_user_date_index'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='rewardtransaction',
+            name='order',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='reward_transactions', to='payment.order'),
+        ),
+        migrations.AddConstraint(
+            model_name='rewardtransaction',
+            constraint=models.UniqueConstraint(fields=('order', 'transaction_type'), name='unique_reward_per_order_and_type'),
+        ),
+    ]
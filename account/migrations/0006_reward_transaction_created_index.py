@@ -0,0 +1,17 @@
+# Generated by Django 6.0 on 2026-10-16 23:50
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('account', '0005_reward_transaction_per_order_and_type'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='rewardtransaction',
+            index=models.Index(fields=['created_at', 'id'], name='reward_txn_created_idx'),
+        ),
+    ]
@@ -1,4 +1,7 @@
-from django.db import models
+from django.core.exceptions import ValidationError
+from django.db import IntegrityError, models, transaction
+from django.db.models import F
+from django.utils import timezone
 from django.contrib.auth.models import User
 from payment.models import Order
 from decimal import Decimal
@@ -27,7 +30,7 @@ class RewardTransaction(models.Model):
     Records each rewards transaction tied to an order
     """
     user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='reward_transactions')
-    order = models.OneToOneField(Order, on_delete=models.CASCADE, related_name='reward_transaction', null=True, blank=True)
+    order = models.ForeignKey(Order, on_delete=models.CASCADE, related_name='reward_transactions', null=True, blank=True)
     order_total = models.DecimalField(max_digits=10, decimal_places=2)
     points_earned = models.DecimalField(max_digits=10, decimal_places=2)
     transaction_type = models.CharField(max_length=20, choices=[
@@ -45,20 +48,67 @@ class RewardTransaction(models.Model):
         verbose_name = 'Reward Transaction'
         verbose_name_plural = 'Reward Transactions'
         ordering = ['-created_at']
+        indexes = [
+            # Keyset pagination and running balance of a user's ledger
+            models.Index(fields=['user', 'created_at', 'id'], name='reward_txn_user_created_idx'),
+            # Date-range exports of the whole ledger
+            models.Index(fields=['created_at', 'id'], name='reward_txn_created_idx'),
+        ]
+        constraints = [
+            # An order earns and redeems at most once, so retried
+            # postings cannot count twice
+            models.UniqueConstraint(fields=['order', 'transaction_type'], name='unique_reward_per_order_and_type'),
+        ]
+
+
+class RewardTier(models.Model):
+    """
+    One bracket of the reward schedule, see account/tiers.py
+    """
+    up_to = models.DecimalField(max_digits=10, decimal_places=2, unique=True, null=True, blank=True,
+                                help_text='Highest order total in this tier, leave empty for the top tier')
+    points = models.DecimalField(max_digits=10, decimal_places=2)
+    step = models.DecimalField(max_digits=10, decimal_places=2, null=True, blank=True,
+                               help_text='Optional, award step points for every started step above the previous tier')
+    step_points = models.DecimalField(max_digits=10, decimal_places=2, default=0.00)
+
+    def clean(self):
+        if self.up_to is None and RewardTier.objects.filter(up_to__isnull=True).exclude(pk=self.pk).exists():
+            raise ValidationError({'up_to': 'There already is a top tier, give this one an upper bound.'})
+
+    def __str__(self):
+        if self.up_to is None:
+            return f"Above the other tiers - ${self.points}"
+        return f"Up to ${self.up_to} - ${self.points}"
+
+    class Meta:
+        verbose_name = 'Reward Tier'
+        verbose_name_plural = 'Reward Tiers'
+        ordering = ['up_to']
+
+
+class BackfillCheckpoint(models.Model):
+    """
+    How far a resumable backfill job has got
+    """
+    name = models.CharField(max_length=100, unique=True)
+    last_pk = models.BigIntegerField(default=0)  # Every row up to this primary key is done
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.name} - up to #{self.last_pk}"
+
+    class Meta:
+        verbose_name = 'Backfill Checkpoint'
+        verbose_name_plural = 'Backfill Checkpoints'
 
 
 def calculate_reward_points(order_total):
     """
     Calculate reward points based on order total
     
-    Reward Structure:
-    $0 - $10: $1.00 reward
-    $11 - $20: $2.00 reward
-    $21 - $30: $3.00 reward
-    $31 - $40: $4.00 reward
-    $41 - $100: $5.00 reward
-    $101 - $200: $10.00 reward
-    $201+: $10.00 + $5.00 for each additional $100 bracket
+    The tiers are read from the RewardTier table, see account/tiers.py
+    for how they are evaluated and for the default schedule.
     
     Args:
         order_total (Decimal or float): The total order amount
@@ -66,72 +116,145 @@ def calculate_reward_points(order_total):
     Returns:
         Decimal: The reward points to be awarded
     """
-    total = Decimal(str(order_total))
+    from .tiers import get_schedule
     
-    if total <= 0:
-        return Decimal('0.00')
-    elif total <= Decimal('10.00'):
-        return Decimal('1.00')
-    elif total <= Decimal('20.00'):
-        return Decimal('2.00')
-    elif total <= Decimal('30.00'):
-        return Decimal('3.00')
-    elif total <= Decimal('40.00'):
-        return Decimal('4.00')
-    elif total <= Decimal('100.00'):
-        return Decimal('5.00')
-    elif total <= Decimal('200.00'):
-        return Decimal('10.00')
-    else:
-        # For amounts $201+
-        # Base reward for $101-$200
-        base_reward = Decimal('10.00')
-        
-        # Calculate additional $100 brackets beyond $200
-        amount_over_200 = total - Decimal('200.00')
-        additional_brackets = int(amount_over_200 / Decimal('100.00'))
+    return get_schedule().points_for(order_total)
+
+
+class InsufficientRewards(Exception):
+    """
+    Raised when a redemption asks for more points than the account holds
+    """
+
+
+def _apply_balance(user, total_delta, lifetime_delta):
+    """
+    Add to a user's point totals with an F() upsert, so concurrent
+    postings for the same user never overwrite each other
+    """
+    changes = {
+        'total_points': F('total_points') + total_delta,
+        'lifetime_points': F('lifetime_points') + lifetime_delta,
+        'updated_at': timezone.now(),
+    }
+    if RewardAccount.objects.filter(user=user).update(**changes):
+        return
+    try:
+        with transaction.atomic():
+            RewardAccount.objects.create(user=user, total_points=total_delta, lifetime_points=lifetime_delta)
+    except IntegrityError:
+        # Another posting created the account first
+        RewardAccount.objects.filter(user=user).update(**changes)
+
+
+def post_reward(user, order, points, transaction_type, order_total, description=''):
+    """
+    Record a rewards transaction and apply it to the user's balance,
+    as one unit
+    
+    Postings are idempotent per order and transaction type: posting
+    the same order again changes nothing and returns the transaction
+    recorded the first time.
+    
+    Args:
+        user: User object
+        order: Order object, or None for manual adjustments
+        points (Decimal): Points to add, negative for a redemption
+        transaction_type (str): PURCHASE, REDEEMED or ADJUSTMENT
+        order_total (Decimal): The order total the posting is based on
+        description (str): Shown in the rewards history
         
-        # Add $5.00 for each additional $100 bracket
-        additional_reward = Decimal(str(additional_brackets)) * Decimal('5.00')
+    Returns:
+        tuple: (RewardTransaction, created)
         
-        # If there's a partial bracket (e.g., $250 has $50 extra), add $5 for that too
-        if amount_over_200 % Decimal('100.00') > Decimal('0.00'):
-            additional_reward += Decimal('5.00')
+    Raises:
+        InsufficientRewards: A redemption exceeds the balance, nothing
+        was recorded
+    """
+    points = Decimal(str(points))
+    with transaction.atomic():
+        try:
+            with transaction.atomic():
+                reward_transaction = RewardTransaction.objects.create(
+                    user=user,
+                    order=order,
+                    order_total=Decimal(str(order_total)),
+                    points_earned=points,
+                    transaction_type=transaction_type,
+                    description=description
+                )
+        except IntegrityError:
+            if order is None:
+                raise
+            # Already posted, by an earlier attempt
+            return RewardTransaction.objects.get(order=order, transaction_type=transaction_type), False
         
-        return base_reward + additional_reward
+        if points < 0:
+            # Spend only points that are there, checked by the UPDATE itself
+            spent = RewardAccount.objects.filter(user=user, total_points__gte=-points).update(
+                total_points=F('total_points') + points,
+                updated_at=timezone.now()
+            )
+            if not spent:
+                raise InsufficientRewards(f'Not enough rewards to redeem ${-points}.')
+        else:
+            _apply_balance(user, points, points if transaction_type == 'PURCHASE' else Decimal('0.00'))
+    
+    return reward_transaction, True
 
 
 def award_points_for_order(user, order, order_total):
     """
     Award reward points to a user for a successful order
     
+    Safe to call again for the same order, the points are only
+    awarded once.
+    
     Args:
         user: User object
         order: Order object
         order_total: Decimal or float representing the order total
         
     Returns:
-        RewardTransaction: The created transaction object
+        RewardTransaction: The transaction recording the award
     """
-    # Calculate points
     points = calculate_reward_points(order_total)
     
-    # Get or create reward account
-    reward_account, created = RewardAccount.objects.get_or_create(user=user)
+    reward_transaction, created = post_reward(
+        user,
+        order,
+        points,
+        'PURCHASE',
+        order_total,
+        description=f'Reward points earned from order #{order.id if order else "N/A"}'
+    )
     
-    # Update account totals
-    reward_account.total_points += points
-    reward_account.lifetime_points += points
-    reward_account.save()
+    return reward_transaction
+
+
+def redeem_points(user, order, amount, order_total):
+    """
+    Spend reward points on an order
     
-    # Create transaction record
-    transaction = RewardTransaction.objects.create(
-        user=user,
-        order=order,
-        order_total=Decimal(str(order_total)),
-        points_earned=points,
-        transaction_type='PURCHASE',
-        description=f'Reward points earned from order #{order.id if order else "N/A"}'
+    Args:
+        user: User object
+        order: Order object the points are spent on
+        amount (Decimal): Points to spend
+        order_total (Decimal): Order total before the redemption
+        
+    Returns:
+        RewardTransaction: The transaction recording the redemption
+        
+    Raises:
+        InsufficientRewards: The account holds fewer points than amount
+    """
+    reward_transaction, created = post_reward(
+        user,
+        order,
+        -Decimal(str(amount)),
+        'REDEEMED',
+        order_total,
+        description=f'Rewards redeemed on order #{order.id}'
     )
     
-    return transaction
+    return reward_transaction
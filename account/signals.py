@@ -0,0 +1,13 @@
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from . import tiers
+from .models import RewardTier
+
+
+@receiver(post_save, sender=RewardTier)
+@receiver(post_delete, sender=RewardTier)
+def reward_tier_changed(sender, **kwargs):
+    # Every process reloads the schedule once the change is committed
+    transaction.on_commit(tiers.bump_version)
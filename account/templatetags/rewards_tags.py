@@ -49,8 +49,13 @@ def calculate_total_rewards(transactions):
     Usage: {% calculate_total_rewards user.reward_transactions.all %}
     """
     from decimal import Decimal
+    from django.db.models import Sum
+    if hasattr(transactions, 'aggregate'):
+        # Sum in the database rather than loading every row
+        total = transactions.filter(transaction_type='PURCHASE').aggregate(total=Sum('points_earned'))['total']
+        return total or Decimal('0.00')
     total = Decimal('0.00')
     for transaction in transactions:
         if transaction.transaction_type == 'PURCHASE':
             total += transaction.points_earned
-    return total
\ No newline at end of file
+    return total
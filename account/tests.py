@@ -1,3 +1,248 @@
-from django.test import TestCase
+import random
+from datetime import timedelta
+from decimal import Decimal
+from unittest import mock
 
-# Create your tests here.
+from django.contrib.auth.models import User
+from django.test import RequestFactory, TestCase
+from django.utils import timezone
+
+from account import backfill, balances, ledger, tiers
+from account.models import (
+    BackfillCheckpoint, InsufficientRewards, RewardAccount, RewardTier, RewardTransaction, award_points_for_order,
+    calculate_reward_points, post_reward, redeem_points,
+)
+from ecom_model.tests.fixtures import build_catalog
+from payment.models import Order
+from store import synthetic
+
+
+def make_order(user, amount_paid='50.00'):
+    return Order.objects.create(
+        full_name='Test Customer', email=user.email, shipping_address='1 Test Street',
+        amount_paid=Decimal(amount_paid), user=user,
+    )
+
+
+class PostRewardTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('customer', 'customer@example.com', 'password')
+
+    def balance(self):
+        return RewardAccount.objects.get(user=self.user).total_points
+
+    def test_repeated_posting_is_recorded_once(self):
+        order = make_order(self.user)
+
+        first, created = post_reward(self.user, order, Decimal('5.00'), 'PURCHASE', order.amount_paid)
+        self.assertTrue(created)
+        again, created = post_reward(self.user, order, Decimal('5.00'), 'PURCHASE', order.amount_paid)
+        self.assertFalse(created)
+
+        self.assertEqual(again, first)
+        self.assertEqual(RewardTransaction.objects.filter(order=order).count(), 1)
+        self.assertEqual(self.balance(), Decimal('5.00'))
+        self.assertEqual(award_points_for_order(self.user, order, order.amount_paid), first)
+        self.assertEqual(self.balance(), Decimal('5.00'))
+
+    def test_redeeming_spent_balance_fails(self):
+        first, second = make_order(self.user), make_order(self.user)
+        post_reward(self.user, None, Decimal('5.00'), 'ADJUSTMENT', 0)
+        redeem_points(self.user, first, Decimal('5.00'), first.amount_paid)
+
+        with self.assertRaises(InsufficientRewards):
+            redeem_points(self.user, second, Decimal('1.00'), second.amount_paid)
+
+        self.assertEqual(self.balance(), Decimal('0.00'))
+        self.assertFalse(RewardTransaction.objects.filter(order=second).exists())
+
+
+def ladder_points(order_total):
+    """The reward ladder that was hard-coded before RewardTier"""
+    total = Decimal(str(order_total))
+    if total <= 0:
+        return Decimal('0.00')
+    for bound, points in ((10, 1), (20, 2), (30, 3), (40, 4), (100, 5), (200, 10)):
+        if total <= bound:
+            return Decimal(points).quantize(Decimal('0.01'))
+    over = total - Decimal('200.00')
+    points = Decimal('10.00') + int(over / 100) * Decimal('5.00')
+    if over % 100 > 0:
+        points += Decimal('5.00')
+    return points
+
+
+class TierScheduleTests(TestCase):
+
+    BOUNDARIES = [
+        '-5.00', '0.00', '0.01', '10.00', '10.01', '20.00', '20.01', '30.00', '30.01', '40.00', '40.01',
+        '100.00', '100.01', '200.00', '200.01', '250.00', '300.00', '300.01', '400.00', '1234.56',
+    ]
+
+    def test_default_schedule_matches_the_ladder(self):
+        schedule = tiers.TierSchedule(tiers.DEFAULT_TIERS)
+        for total in self.BOUNDARIES:
+            with self.subTest(total=total):
+                self.assertEqual(schedule.points_for(Decimal(total)), ladder_points(total))
+
+    def test_seeded_tiers_match_the_ladder(self):
+        self.assertEqual(RewardTier.objects.count(), len(tiers.DEFAULT_TIERS))
+        for total in self.BOUNDARIES:
+            with self.subTest(total=total):
+                self.assertEqual(calculate_reward_points(Decimal(total)), ladder_points(total))
+
+    def test_many_totals_score_like_one(self):
+        schedule = tiers.TierSchedule(tiers.DEFAULT_TIERS)
+        expected = [ladder_points(total) for total in self.BOUNDARIES]
+        self.assertEqual(schedule.points_for_many(self.BOUNDARIES), expected)
+        with mock.patch.object(tiers, 'numpy', None):
+            self.assertEqual(schedule.points_for_many(self.BOUNDARIES), expected)
+
+    def test_changed_tier_is_picked_up(self):
+        self.assertEqual(calculate_reward_points(Decimal('15.00')), Decimal('2.00'))
+        # The rollback after the test does not reach the cached schedule
+        self.addCleanup(tiers.bump_version)
+        tier = RewardTier.objects.get(up_to=Decimal('20.00'))
+        tier.points = Decimal('2.50')
+        with self.captureOnCommitCallbacks(execute=True):
+            tier.save()
+        self.assertEqual(calculate_reward_points(Decimal('15.00')), Decimal('2.50'))
+
+
+class Stop(Exception):
+    pass
+
+
+class BackfillTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        products = [(product.pk, product.price) for product in build_catalog(5)]
+        cls.users = [User.objects.create_user(f'member{i}', f'member{i}@example.com', 'password') for i in range(3)]
+        synthetic.make_orders(20, [user.pk for user in cls.users], products, random.Random(0), guest_share=0.2)
+
+    def expected_balances(self):
+        balances = {user.pk: Decimal('0.00') for user in self.users}
+        for user_id, amount_paid in Order.objects.filter(user__isnull=False).values_list('user_id', 'amount_paid'):
+            balances[user_id] += calculate_reward_points(amount_paid)
+        return balances
+
+    def balances(self):
+        return dict(RewardAccount.objects.values_list('user_id', 'total_points'))
+
+    def test_awards_every_missing_order_once(self):
+        orders = Order.objects.filter(user__isnull=False).count()
+        self.assertEqual(backfill.backfill(chunk_size=3)[0], orders)
+        self.assertEqual(RewardTransaction.objects.filter(transaction_type='PURCHASE').count(), orders)
+        self.assertEqual(self.balances(), self.expected_balances())
+
+        self.assertEqual(backfill.backfill(chunk_size=3), (0, Decimal('0.00')))
+        self.assertEqual(self.balances(), self.expected_balances())
+
+    def test_stopped_run_resumes_from_its_checkpoint(self):
+        def stop(last_pk, orders, points):
+            raise Stop()
+
+        with self.assertRaises(Stop):
+            backfill.backfill(chunk_size=3, progress=stop)
+        checkpoint = BackfillCheckpoint.objects.get(name=backfill.CHECKPOINT).last_pk
+        self.assertEqual(RewardTransaction.objects.filter(order_id__lte=checkpoint).count(), 3)
+
+        # Orders before the checkpoint are not looked at again
+        RewardTransaction.objects.filter(order_id__lte=checkpoint).first().delete()
+        orders, _ = backfill.backfill(chunk_size=3)
+        self.assertEqual(orders, Order.objects.filter(user__isnull=False, pk__gt=checkpoint).count())
+
+        # Until the backfill starts over
+        self.assertEqual(backfill.backfill(chunk_size=3, reset=True)[0], 1)
+        self.assertEqual(
+            RewardTransaction.objects.filter(transaction_type='PURCHASE').count(),
+            Order.objects.filter(user__isnull=False).count(),
+        )
+
+
+class RecomputeTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user, cls.other = (User.objects.create_user(name, f'{name}@example.com', 'password') for name in ('customer', 'other'))
+        for user in (cls.user, cls.other):
+            order = make_order(user)
+            award_points_for_order(user, order, order.amount_paid)
+            redeem_points(user, order, Decimal('2.00'), order.amount_paid)
+
+    def test_drifted_balance_is_rebuilt_from_the_ledger(self):
+        RewardAccount.objects.filter(user=self.user).update(total_points=Decimal('99.00'), lifetime_points=Decimal('1.00'))
+
+        self.assertEqual([row['user__username'] for row in balances.recompute(dry_run=True)], ['customer'])
+        self.assertEqual(RewardAccount.objects.get(user=self.user).total_points, Decimal('99.00'))
+
+        drift = balances.recompute(chunk_size=1)
+
+        self.assertEqual(len(drift), 1)
+        self.assertEqual(drift[0]['expected_total'], Decimal('3.00'))
+        account = RewardAccount.objects.get(user=self.user)
+        self.assertEqual((account.total_points, account.lifetime_points), (Decimal('3.00'), Decimal('5.00')))
+        self.assertEqual(balances.recompute(), [])
+
+    def test_missing_account_is_created_and_filled(self):
+        RewardAccount.objects.filter(user=self.other).delete()
+
+        self.assertEqual(balances.create_missing_accounts(), 1)
+        balances.recompute()
+
+        account = RewardAccount.objects.get(user=self.other)
+        self.assertEqual((account.total_points, account.lifetime_points), (Decimal('3.00'), Decimal('5.00')))
+
+
+class LedgerTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user, other = (User.objects.create_user(name, f'{name}@example.com', 'password') for name in ('customer', 'other'))
+        start = timezone.now() - timedelta(days=30)
+        kinds = [('PURCHASE', 1), ('REDEEMED', -1), ('ADJUSTMENT', 1)]
+        for i in range(13):
+            transaction_type, sign = kinds[i % 3]
+            for user in (cls.user, other):
+                reward = RewardTransaction.objects.create(
+                    user=user, order_total=Decimal('10.00'), points_earned=sign * Decimal(i + 1),
+                    transaction_type=transaction_type,
+                )
+                # Pairs of rows share a timestamp, their order falls to the id
+                RewardTransaction.objects.filter(pk=reward.pk).update(created_at=start + timedelta(days=i // 2))
+
+    def pages(self, page_size):
+        """Every page of the customer's ledger, following the next links"""
+        pages, query = [], {}
+        while True:
+            page = ledger.ledger_page(self.user, RequestFactory().get('/', query), page_size=page_size)
+            pages.append(page)
+            if not page.next_cursor:
+                return pages
+            query = {'after': page.next_cursor}
+
+    def test_running_balance_matches_the_cumulative_sum(self):
+        rows = RewardTransaction.objects.filter(user=self.user).order_by('created_at', 'id')
+        expected, balance = {}, Decimal('0.00')
+        for row in rows:
+            balance += row.points_earned
+            expected[row.pk] = balance
+
+        pages = self.pages(page_size=4)
+
+        self.assertEqual(len(pages), 4)
+        shown = {row.pk: row.balance for page in pages for row in page}
+        self.assertEqual(shown, expected)
+        # Newest first, so the first row shows the current balance
+        self.assertEqual(pages[0].object_list[0].balance, balance)
+
+    def test_totals_per_type(self):
+        self.assertEqual(ledger.totals(self.user), {
+            'count': 13,
+            'earned': Decimal('35.00'),
+            'redeemed': Decimal('26.00'),
+            'adjusted': Decimal('30.00'),
+        })
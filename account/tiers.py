@@ -0,0 +1,168 @@
+"""
+Reward tier engine
+
+The points an order earns are set by the RewardTier table instead of
+being hard-coded. Each tier covers order totals up to and including
+its up_to bound, above the bound of the tier before it, and earns a
+fixed amount of points, plus step_points for every started step
+beyond the previous bound when the tier has a step. The last tier
+has no bound and covers everything above.
+
+The schedule is evaluated in integer cents: a bisect over the tier
+bounds picks the tier of one order total, and points_for_many()
+scores any number of totals at once, vectorized with NumPy when it
+is installed.
+
+Every process keeps the compiled schedule in memory. Saving or
+deleting a tier bumps a version number in Django's cache (see
+account/signals.py), which makes every process reload it.
+
+The checkout (account.models.calculate_reward_points), backfills and
+simulations of a new schedule all go through TierSchedule.
+"""
+
+import threading
+from bisect import bisect_left
+from decimal import ROUND_HALF_UP, Decimal
+
+from store import catalog
+
+try:
+    import numpy
+except ImportError:  # pragma: no cover - optional dependency
+    numpy = None
+
+
+VERSION_KEY = 'account:reward-tiers-version'
+
+# The schedule used while the RewardTier table is empty, and the one
+# the table is seeded with: (up_to, points, step, step_points)
+DEFAULT_TIERS = (
+    (Decimal('10.00'), Decimal('1.00'), None, Decimal('0.00')),
+    (Decimal('20.00'), Decimal('2.00'), None, Decimal('0.00')),
+    (Decimal('30.00'), Decimal('3.00'), None, Decimal('0.00')),
+    (Decimal('40.00'), Decimal('4.00'), None, Decimal('0.00')),
+    (Decimal('100.00'), Decimal('5.00'), None, Decimal('0.00')),
+    (Decimal('200.00'), Decimal('10.00'), None, Decimal('0.00')),
+    # $201+: $10.00 plus $5.00 for every started $100 above $200
+    (None, Decimal('10.00'), Decimal('100.00'), Decimal('5.00')),
+)
+
+
+def to_cents(amount):
+    """Decimal, float, int or str amount to whole cents"""
+    return int((Decimal(str(amount)) * 100).to_integral_value(rounding=ROUND_HALF_UP))
+
+
+def from_cents(cents):
+    return Decimal(int(cents)).scaleb(-2)
+
+
+class TierSchedule:
+    """
+    A compiled reward tier schedule
+
+    Args:
+        tiers (iterable): (up_to, points, step, step_points) tuples,
+            up_to None for the open-ended top tier, in any order
+    """
+
+    def __init__(self, tiers):
+        tiers = sorted(tiers, key=lambda tier: (tier[0] is None, tier[0] or 0))
+        if not tiers or tiers[-1][0] is not None:
+            # Totals above the highest bound keep that tier's points
+            tiers = list(tiers) + [(None, tiers[-1][1] if tiers else 0, None, 0)]
+        if any(tier[0] is None for tier in tiers[:-1]):
+            raise ValueError('Only one reward tier can be open-ended')
+
+        # bounds[i] is the inclusive upper bound of tier i, the open
+        # tier has none and is found past the end of the list
+        self.bounds = [to_cents(tier[0]) for tier in tiers[:-1]]
+        self.lower = [0] + self.bounds
+        self.points = [to_cents(tier[1]) for tier in tiers]
+        self.step = [to_cents(tier[2]) if tier[2] else 0 for tier in tiers]
+        self.step_points = [to_cents(tier[3] or 0) for tier in tiers]
+
+    def points_for_cents(self, cents):
+        """Points in cents earned by an order total in cents"""
+        if cents <= 0:
+            return 0
+        i = bisect_left(self.bounds, cents)
+        points = self.points[i]
+        if self.step[i]:
+            # Ceiling division, a started step counts as a whole one
+            points += -(-(cents - self.lower[i]) // self.step[i]) * self.step_points[i]
+        return points
+
+    def points_for(self, order_total):
+        """
+        Reward points earned by one order
+
+        Args:
+            order_total (Decimal or float): The total order amount
+
+        Returns:
+            Decimal: The reward points to be awarded
+        """
+        return from_cents(self.points_for_cents(to_cents(order_total)))
+
+    def points_for_many(self, order_totals):
+        """
+        Reward points earned by each of many orders
+
+        Args:
+            order_totals (iterable): Order totals, as Decimal or float
+
+        Returns:
+            list: Decimal points, in the same order
+        """
+        cents = [to_cents(total) for total in order_totals]
+        return [from_cents(points) for points in self.points_for_cents_many(cents)]
+
+    def points_for_cents_many(self, cents):
+        """Points in cents for a sequence of order totals in cents"""
+        if numpy is None:
+            return [self.points_for_cents(total) for total in cents]
+
+        totals = numpy.asarray(cents, dtype=numpy.int64)
+        i = numpy.searchsorted(numpy.asarray(self.bounds, dtype=numpy.int64), totals, side='left')
+        step = numpy.asarray(self.step, dtype=numpy.int64)[i]
+        over = totals - numpy.asarray(self.lower, dtype=numpy.int64)[i]
+        steps = numpy.where(step > 0, -(-over // numpy.maximum(step, 1)), 0)
+        points = numpy.asarray(self.points, dtype=numpy.int64)[i] + steps * numpy.asarray(self.step_points, dtype=numpy.int64)[i]
+        return numpy.where(totals > 0, points, 0).tolist()
+
+
+def load_schedule():
+    """Compile the schedule stored in the RewardTier table"""
+    from .models import RewardTier
+
+    tiers = list(RewardTier.objects.values_list('up_to', 'points', 'step', 'step_points'))
+    return TierSchedule(tiers or DEFAULT_TIERS)
+
+
+def get_version():
+    return catalog.get_version(VERSION_KEY)
+
+
+def bump_version():
+    """Make every process reload the tier schedule"""
+    catalog.incr_version(VERSION_KEY)
+
+
+_lock = threading.Lock()
+_loaded = (None, None)
+
+
+def get_schedule():
+    """The current tier schedule, reloaded only when a tier has changed"""
+    global _loaded
+    version = get_version()
+    loaded_version, schedule = _loaded
+    if schedule is None or loaded_version != version:
+        with _lock:
+            loaded_version, schedule = _loaded
+            if schedule is None or loaded_version != version:
+                schedule = load_schedule()
+                _loaded = (version, schedule)
+    return schedule
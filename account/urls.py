@@ -1,6 +1,7 @@
 from django.urls import path
 from . import views
 from django.contrib.auth import views as auth_views
+from .forms import OutboxPasswordResetForm
 
 urlpatterns = [
     path('register', views.register, name='register'),
@@ -22,7 +23,7 @@ urlpatterns = [
     # Password management urls/views
 
     # 1 ) Submit our email form
-    path('reset_password', auth_views.PasswordResetView.as_view(template_name="account/password/password-reset.html"), name='reset_password'),
+    path('reset_password', auth_views.PasswordResetView.as_view(template_name="account/password/password-reset.html", form_class=OutboxPasswordResetForm), name='reset_password'),
 
     # 2) Success message stating that a password reset email was sent
     path('reset_password_sent', auth_views.PasswordResetDoneView.as_view(template_name="account/password/password-reset-sent.html"), name='password_reset_done'),
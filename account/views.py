@@ -7,9 +7,15 @@ from payment.models import ShippingAddress
 
 from payment.models import Order, OrderItem
 
+from store.pagination import paginate
+
+from django.db.models import Prefetch
+
 # Import rewards models
 from account.models import RewardAccount, RewardTransaction
 
+from account import ledger
+
 
 from django.contrib.auth.models import User
 
@@ -29,6 +35,13 @@ from django.contrib.auth.decorators import login_required
 
 from django.contrib import messages
 
+from outbox.mail import enqueue
+
+
+# Orders shown per page of the order history
+
+ORDER_PAGE_SIZE = 10
+
 
 
 
@@ -63,7 +76,9 @@ def register(request):
             
             })
 
-            user.email_user(subject=subject, message=message)
+            # Queued, the send_outbox worker delivers it
+
+            enqueue(subject, message, [user.email])
 
 
             return redirect('email-verification-sent')
@@ -183,8 +198,8 @@ def dashboard(request):
     # Get or create reward account for the user
     reward_account, created = RewardAccount.objects.get_or_create(user=request.user)
     
-    # Get recent transactions (last 5)
-    recent_transactions = RewardTransaction.objects.filter(user=request.user)[:5]
+    # Get recent transactions (last 5), with their orders
+    recent_transactions = RewardTransaction.objects.filter(user=request.user).select_related('order')[:5]
     
     context = {
         'reward_account': reward_account,
@@ -297,49 +312,46 @@ def manage_shipping(request):
 @login_required(login_url='my-login')
 def track_orders(request):
 
-    try:
+    # Newest first, with the items and rewards prefetched
 
-        orders = OrderItem.objects.filter(user=request.user)
-        
-        # Get reward transactions for each order
-        order_rewards = {}
-        for order_item in orders:
-            try:
-                # Try to get the reward transaction for this order
-                reward_transaction = RewardTransaction.objects.get(
-                    user=request.user,
-                    order=order_item.order
-                )
-                order_rewards[order_item.order.id] = reward_transaction
-            except RewardTransaction.DoesNotExist:
-                order_rewards[order_item.order.id] = None
+    orders = (
+        Order.objects.filter(user=request.user)
+        .prefetch_related(
+            Prefetch('orderitem_set', queryset=OrderItem.objects.select_related('product')),
+            Prefetch('reward_transactions', queryset=RewardTransaction.objects.filter(transaction_type='PURCHASE'), to_attr='purchase_rewards'),
+        )
+    )
 
-        context = {
-            'orders': orders,
-            'order_rewards': order_rewards,
-        }
+    page = paginate(orders, request, page_size=ORDER_PAGE_SIZE, date_field='date_ordered')
 
-        return render(request, 'account/track-orders.html', context=context)
+    for order in page:
 
-    except:
+        order.reward = order.purchase_rewards[0] if order.purchase_rewards else None
+
+    context = {
+        'orders': page,
+        'page': page,
+    }
 
-        return render(request, 'account/track-orders.html')
+    return render(request, 'account/track-orders.html', context=context)
 
 
 @login_required(login_url='my-login')
 def rewards_history(request):
     """
-    View to display complete rewards history for a user
+    View to display the rewards history of a user, a page at a time
     """
     # Get or create reward account
     reward_account, created = RewardAccount.objects.get_or_create(user=request.user)
     
-    # Get all transactions
-    transactions = RewardTransaction.objects.filter(user=request.user).order_by('-created_at')
+    # One page of transactions, with the balance after each
+    page = ledger.ledger_page(request.user, request)
     
     context = {
         'reward_account': reward_account,
-        'transactions': transactions,
+        'transactions': page,
+        'page': page,
+        'totals': ledger.totals(request.user),
     }
     
     return render(request, 'account/rewards_hist.html', context)
\ No newline at end of file
@@ -0,0 +1,32 @@
+from django.contrib import admin
+
+from .models import DailyCategorySales, DailyProductSales
+
+
+@admin.register(DailyProductSales)
+class DailyProductSalesAdmin(admin.ModelAdmin):
+    list_display = ['day', 'product', 'units', 'revenue', 'orders', 'rewards_issued', 'rewards_redeemed']
+    list_select_related = ['product']
+    date_hierarchy = 'day'
+    ordering = ['-day']
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+
+@admin.register(DailyCategorySales)
+class DailyCategorySalesAdmin(admin.ModelAdmin):
+    list_display = ['day', 'category', 'units', 'revenue', 'orders', 'rewards_issued', 'rewards_redeemed']
+    list_select_related = ['category']
+    list_filter = ['category']
+    date_hierarchy = 'day'
+    ordering = ['-day']
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand
+
+from analytics import rollups
+
+
+class Command(BaseCommand):
+    help = 'Add new orders and reward transactions to the daily sales rollups'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=rollups.CHUNK_SIZE, help='Orders or reward transactions per transaction')
+        parser.add_argument('--reset', action='store_true', help='Drop the rollups and rebuild them from the first order')
+
+    def handle(self, *args, **options):
+        def progress(label, last_pk, rows):
+            self.stdout.write(f'{label.capitalize()} up to #{last_pk}: {rows}')
+
+        orders, rewards = rollups.build(chunk_size=options['chunk_size'], reset=options['reset'], progress=progress)
+        self.stdout.write(self.style.SUCCESS(f'Rolled up {orders} order(s) and {rewards} reward transaction(s).'))
@@ -0,0 +1,54 @@
+# Generated by Django 6.0 on 2026-10-16 22:50
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+        ('store', '0009_productranking'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DailyCategorySales',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('units', models.PositiveBigIntegerField(default=0)),
+                ('revenue', models.DecimalField(decimal_places=2, default=0.0, max_digits=12)),
+                ('orders', models.PositiveIntegerField(default=0)),
+                ('rewards_issued', models.DecimalField(decimal_places=2, default=0.0, max_digits=12)),
+                ('rewards_redeemed', models.DecimalField(decimal_places=2, default=0.0, max_digits=12)),
+                ('category', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='+', to='store.category')),
+            ],
+            options={
+                'verbose_name': 'Daily Category Sales',
+                'verbose_name_plural': 'Daily Category Sales',
+                'indexes': [models.Index(fields=['day', 'category'], name='daily_category_sales_day_idx')],
+                'constraints': [models.UniqueConstraint(fields=('category', 'day'), name='unique_daily_category_sales')],
+            },
+        ),
+        migrations.CreateModel(
+            name='DailyProductSales',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('units', models.PositiveBigIntegerField(default=0)),
+                ('revenue', models.DecimalField(decimal_places=2, default=0.0, max_digits=12)),
+                ('orders', models.PositiveIntegerField(default=0)),
+                ('rewards_issued', models.DecimalField(decimal_places=2, default=0.0, max_digits=12)),
+                ('rewards_redeemed', models.DecimalField(decimal_places=2, default=0.0, max_digits=12)),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='store.product')),
+            ],
+            options={
+                'verbose_name': 'Daily Product Sales',
+                'verbose_name_plural': 'Daily Product Sales',
+                'indexes': [models.Index(fields=['day', 'product'], name='daily_product_sales_day_idx')],
+                'constraints': [models.UniqueConstraint(fields=('product', 'day'), name='unique_daily_product_sales')],
+            },
+        ),
+    ]
@@ -0,0 +1,56 @@
+from django.db import models
+
+from store.models import Category, Product
+
+
+class DailyProductSales(models.Model):
+    """
+    One product's sales on one day, maintained by analytics/rollups.py
+    """
+    day = models.DateField()
+    product = models.ForeignKey(Product, related_name='+', on_delete=models.CASCADE)
+    units = models.PositiveBigIntegerField(default=0)
+    revenue = models.DecimalField(max_digits=12, decimal_places=2, default=0.00)
+    orders = models.PositiveIntegerField(default=0)
+    rewards_issued = models.DecimalField(max_digits=12, decimal_places=2, default=0.00)
+    rewards_redeemed = models.DecimalField(max_digits=12, decimal_places=2, default=0.00)
+
+    def __str__(self):
+        return f"{self.product_id} on {self.day} - ${self.revenue}"
+
+    class Meta:
+        verbose_name = 'Daily Product Sales'
+        verbose_name_plural = 'Daily Product Sales'
+        constraints = [
+            models.UniqueConstraint(fields=['product', 'day'], name='unique_daily_product_sales'),
+        ]
+        indexes = [
+            # Date range scans of the dashboard
+            models.Index(fields=['day', 'product'], name='daily_product_sales_day_idx'),
+        ]
+
+
+class DailyCategorySales(models.Model):
+    """
+    One category's sales on one day, no category for uncategorized products
+    """
+    day = models.DateField()
+    category = models.ForeignKey(Category, related_name='+', on_delete=models.CASCADE, null=True, blank=True)
+    units = models.PositiveBigIntegerField(default=0)
+    revenue = models.DecimalField(max_digits=12, decimal_places=2, default=0.00)
+    orders = models.PositiveIntegerField(default=0)
+    rewards_issued = models.DecimalField(max_digits=12, decimal_places=2, default=0.00)
+    rewards_redeemed = models.DecimalField(max_digits=12, decimal_places=2, default=0.00)
+
+    def __str__(self):
+        return f"{self.category_id or 'Uncategorized'} on {self.day} - ${self.revenue}"
+
+    class Meta:
+        verbose_name = 'Daily Category Sales'
+        verbose_name_plural = 'Daily Category Sales'
+        constraints = [
+            models.UniqueConstraint(fields=['category', 'day'], name='unique_daily_category_sales'),
+        ]
+        indexes = [
+            models.Index(fields=['day', 'category'], name='daily_category_sales_day_idx'),
+        ]
@@ -0,0 +1,228 @@
+"""
+Daily sales rollups
+
+Questions like "revenue by category by week" would otherwise scan
+OrderItem. DailyProductSales and DailyCategorySales hold, per product
+or category and day: units sold, revenue, orders, and reward points
+issued and redeemed. The admin dashboard (analytics/views.py) only
+ever reads these two tables.
+
+build() (the build_sales_rollups management command) keeps them up to
+date incrementally, with one checkpoint for orders and one for reward
+transactions, since rewards can be posted after their order (see
+account/backfill.py):
+
+    - the items of the orders placed since the last run are streamed
+      in order id order, and each chunk of orders is added to the rows
+      of the days the orders were placed on
+    - the PURCHASE and REDEEMED reward transactions posted since the
+      last run are streamed the same way and added to the rows of the
+      day they were posted on. An order's points are spread over its
+      products in proportion to their share of its revenue
+
+Every chunk is added to the rollups and moves its checkpoint in one
+transaction, so a stopped run resumes after its last chunk. Runs must
+not overlap.
+"""
+
+from collections import defaultdict
+from decimal import Decimal
+from itertools import batched, groupby
+from operator import itemgetter
+
+from django.db import transaction
+from django.db.models import Max, Q
+from django.utils import timezone
+
+from account.models import BackfillCheckpoint, RewardTransaction
+from payment.models import Order, OrderItem
+
+from .models import DailyCategorySales, DailyProductSales
+
+
+ORDERS_CHECKPOINT = 'sales-rollup-orders'
+REWARDS_CHECKPOINT = 'sales-rollup-rewards'
+
+FIELDS = ('units', 'revenue', 'orders', 'rewards_issued', 'rewards_redeemed')
+
+# Orders or reward transactions folded per transaction
+CHUNK_SIZE = 2000
+
+BATCH_SIZE = 500
+
+CENT = Decimal('0.01')
+
+
+class Deltas:
+    """
+    Amounts to add to the product and category rollups, per day
+    """
+
+    def __init__(self):
+        self.products = defaultdict(lambda: dict.fromkeys(FIELDS, 0))
+        self.categories = defaultdict(lambda: dict.fromkeys(FIELDS, 0))
+
+    def add(self, day, product_id, category_id, **amounts):
+        for key, rows in (((day, product_id), self.products), ((day, category_id), self.categories)):
+            for field, amount in amounts.items():
+                rows[key][field] += amount
+
+    def apply(self):
+        _apply(DailyProductSales, 'product_id', self.products)
+        _apply(DailyCategorySales, 'category_id', self.categories)
+
+
+def _apply(model, key_field, deltas):
+    """Add deltas, keyed (day, key), to the rows of model"""
+    if not deltas:
+        return
+    keys = {key for _, key in deltas}
+    match = Q(**{f'{key_field}__in': keys - {None}})
+    if None in keys:
+        match |= Q(**{key_field: None})
+    existing = {
+        (row.day, getattr(row, key_field)): row
+        for row in model.objects.filter(match, day__in={day for day, _ in deltas})
+    }
+
+    changed, new = [], []
+    for (day, key), amounts in deltas.items():
+        row = existing.get((day, key))
+        if row is None:
+            new.append(model(day=day, **{key_field: key}, **amounts))
+            continue
+        for field, amount in amounts.items():
+            setattr(row, field, getattr(row, field) + amount)
+        changed.append(row)
+    model.objects.bulk_update(changed, FIELDS, batch_size=BATCH_SIZE)
+    model.objects.bulk_create(new, batch_size=BATCH_SIZE)
+
+
+def _order_items(after, upto, chunk_size):
+    """Yield (order_id, rows) of the orders in (after, upto], oldest first"""
+    rows = (
+        OrderItem.objects.filter(order_id__gt=after, order_id__lte=upto, product__isnull=False)
+        .order_by('order_id')
+        .values_list('order_id', 'order__date_ordered', 'product_id', 'product__category_id', 'quantity', 'price')
+        .iterator(chunk_size=chunk_size)
+    )
+    for order_id, items in groupby(rows, key=itemgetter(0)):
+        yield order_id, list(items)
+
+
+def _fold_orders(chunk):
+    deltas = Deltas()
+    for order_id, items in chunk:
+        day = timezone.localdate(items[0][1])
+        products, categories = set(), set()
+        for _, _, product_id, category_id, quantity, price in items:
+            deltas.add(day, product_id, category_id, units=quantity, revenue=quantity * price)
+            products.add(product_id)
+            categories.add(category_id)
+        # An order counts once per product and category it contains
+        for product_id in products:
+            deltas.products[day, product_id]['orders'] += 1
+        for category_id in categories:
+            deltas.categories[day, category_id]['orders'] += 1
+    return deltas
+
+
+def _spread(points, items):
+    """
+    Split points over order items in proportion to their revenue, to
+    the cent, the rounding going to the last item
+
+    Returns:
+        list: (product_id, category_id, points) tuples
+    """
+    revenue = [quantity * price for _, _, quantity, price in items]
+    total = sum(revenue)
+    shares, left = [], points
+    for i, (product_id, category_id, _, _) in enumerate(items):
+        if i == len(items) - 1:
+            share = left
+        elif total:
+            share = (points * revenue[i] / total).quantize(CENT)
+        else:
+            share = (points / len(items)).quantize(CENT)
+        left -= share
+        shares.append((product_id, category_id, share))
+    return shares
+
+
+def _fold_rewards(chunk):
+    deltas = Deltas()
+    items = defaultdict(list)
+    order_ids = {order_id for _, _, order_id, _, _ in chunk}
+    for order_id, product_id, category_id, quantity, price in (
+        OrderItem.objects.filter(order_id__in=order_ids, product__isnull=False)
+        .order_by('pk')
+        .values_list('order_id', 'product_id', 'product__category_id', 'quantity', 'price')
+    ):
+        items[order_id].append((product_id, category_id, quantity, price))
+
+    for _, created_at, order_id, transaction_type, points in chunk:
+        if not items[order_id]:
+            continue
+        field = 'rewards_issued' if transaction_type == 'PURCHASE' else 'rewards_redeemed'
+        day = timezone.localdate(created_at)
+        for product_id, category_id, share in _spread(abs(points), items[order_id]):
+            deltas.add(day, product_id, category_id, **{field: share})
+    return deltas
+
+
+def _run(checkpoint, chunks, fold, progress, label):
+    """Fold chunks of (pk, ...) rows, moving checkpoint past each one"""
+    folded = 0
+    for chunk in chunks:
+        last_pk = chunk[-1][0]
+        with transaction.atomic():
+            fold(chunk).apply()
+            BackfillCheckpoint.objects.filter(pk=checkpoint.pk).update(last_pk=last_pk)
+        folded += len(chunk)
+        if progress:
+            progress(label, last_pk, folded)
+    return folded
+
+
+def build(chunk_size=CHUNK_SIZE, reset=False, progress=None):
+    """
+    Add the orders and reward transactions since the last run to the
+    daily rollups
+
+    Args:
+        chunk_size (int): Orders or reward transactions per transaction
+        reset (bool): Drop the rollups and rebuild them from the start
+        progress (callable): Called with (label, last_pk, rows) after
+            every chunk
+
+    Returns:
+        tuple: (orders, reward transactions) folded in
+    """
+    orders_checkpoint, _ = BackfillCheckpoint.objects.get_or_create(name=ORDERS_CHECKPOINT)
+    rewards_checkpoint, _ = BackfillCheckpoint.objects.get_or_create(name=REWARDS_CHECKPOINT)
+    if reset:
+        with transaction.atomic():
+            DailyProductSales.objects.all().delete()
+            DailyCategorySales.objects.all().delete()
+            BackfillCheckpoint.objects.filter(pk__in=[orders_checkpoint.pk, rewards_checkpoint.pk]).update(last_pk=0)
+        orders_checkpoint.last_pk = rewards_checkpoint.last_pk = 0
+
+    # Orders placed while this runs are left for the next run
+    upto = Order.objects.aggregate(last=Max('pk'))['last'] or 0
+    orders = _run(
+        orders_checkpoint,
+        batched(_order_items(orders_checkpoint.last_pk, upto, chunk_size), chunk_size),
+        _fold_orders, progress, 'orders',
+    )
+
+    rewards = (
+        RewardTransaction.objects.filter(
+            pk__gt=rewards_checkpoint.last_pk, order__isnull=False, transaction_type__in=['PURCHASE', 'REDEEMED'],
+        )
+        .order_by('pk')
+        .values_list('pk', 'created_at', 'order_id', 'transaction_type', 'points_earned')
+        .iterator(chunk_size=chunk_size)
+    )
+    rewards = _run(rewards_checkpoint, batched(rewards, chunk_size), _fold_rewards, progress, 'rewards')
+    return orders, rewards
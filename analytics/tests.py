@@ -0,0 +1,109 @@
+import random
+from decimal import Decimal
+
+from django.db.models import Count, F, Sum
+from django.db.models.functions import TruncDate
+from django.test import TestCase
+
+from account.models import RewardTransaction
+from ecom_model.tests.fixtures import build_catalog, build_customer, build_order_history
+from payment.models import Order, OrderItem
+from store import synthetic
+from store.models import Category, Product
+
+from . import rollups
+from .models import DailyCategorySales, DailyProductSales
+
+
+def rollup_rows(model, key):
+    return {
+        (row['day'], row[key]): {field: row[field] for field in rollups.FIELDS}
+        for row in model.objects.values('day', key, *rollups.FIELDS)
+    }
+
+
+def snapshot():
+    return rollup_rows(DailyProductSales, 'product_id'), rollup_rows(DailyCategorySales, 'category_id')
+
+
+class RollupTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.products = build_catalog(12)
+        cls.customer = build_customer()
+        build_order_history(cls.customer, cls.products, orders=20)
+        products = [(product.pk, product.price) for product in cls.products]
+        synthetic.make_orders(15, [], products, random.Random(1), guest_share=1)
+
+    def expected(self, key):
+        """The rollup of key, aggregated straight from the order tables"""
+        rows = (
+            OrderItem.objects.values(key, day=TruncDate('order__date_ordered'))
+            .annotate(units=Sum('quantity'), revenue=Sum(F('quantity') * F('price')), orders=Count('order', distinct=True))
+        )
+        # SQLite multiplies the decimals as floats
+        return {(row['day'], row[key]): (row['units'], row['revenue'].quantize(rollups.CENT), row['orders']) for row in rows}
+
+    def actual(self, model, key):
+        # Days with rewards but no sales have rows too
+        return {
+            (row['day'], row[key]): (row['units'], row['revenue'], row['orders'])
+            for row in model.objects.exclude(orders=0).values('day', key, 'units', 'revenue', 'orders')
+        }
+
+    def test_totals_match_the_order_tables(self):
+        rollups.build(chunk_size=4)
+        self.assertEqual(self.actual(DailyProductSales, 'product_id'), self.expected('product_id'))
+        self.assertEqual(self.actual(DailyCategorySales, 'category_id'), self.expected('product__category_id'))
+
+    def test_rerun_is_idempotent(self):
+        self.assertEqual(rollups.build(chunk_size=4), (Order.objects.count(), RewardTransaction.objects.count()))
+        built = snapshot()
+        self.assertEqual(rollups.build(chunk_size=4), (0, 0))
+        self.assertEqual(snapshot(), built)
+
+    def test_incremental_run_matches_a_rebuild(self):
+        rollups.build(chunk_size=4)
+        products = [(product.pk, product.price) for product in self.products]
+        synthetic.make_orders(10, [], products, random.Random(2), guest_share=1)
+        self.assertEqual(rollups.build(chunk_size=4)[0], 10)
+        incremental = snapshot()
+        rollups.build(chunk_size=4, reset=True)
+        self.assertEqual(snapshot(), incremental)
+
+    def test_rewards_add_up_per_category(self):
+        rollups.build(chunk_size=4)
+        rewards = RewardTransaction.objects.filter(order__isnull=False)
+        issued = rewards.filter(transaction_type='PURCHASE').aggregate(total=Sum('points_earned'))['total']
+        redeemed = -rewards.filter(transaction_type='REDEEMED').aggregate(total=Sum('points_earned'))['total']
+        totals = DailyCategorySales.objects.aggregate(issued=Sum('rewards_issued'), redeemed=Sum('rewards_redeemed'))
+        self.assertEqual(totals['issued'], issued)
+        self.assertEqual(totals['redeemed'], redeemed)
+
+
+class RewardSpreadTests(TestCase):
+
+    def test_points_follow_revenue_across_categories(self):
+        games, cards = Category.objects.create(name='Games', slug='games'), Category.objects.create(name='Cards', slug='cards')
+        game = Product.objects.create(category=games, title='Game', slug='game', price=Decimal('15.00'), image='images/game.png')
+        deck = Product.objects.create(category=cards, title='Deck', slug='deck', price=Decimal('10.00'), image='images/deck.png')
+        user = build_customer()
+        order = Order.objects.create(full_name='Test', email='t@example.com', shipping_address='-', amount_paid=Decimal('40.00'), user=user)
+        OrderItem.objects.create(order=order, product=game, quantity=2, price=Decimal('15.00'))
+        OrderItem.objects.create(order=order, product=deck, quantity=1, price=Decimal('10.00'))
+        RewardTransaction.objects.create(user=user, order=order, order_total=Decimal('40.00'), points_earned=Decimal('4.00'), transaction_type='PURCHASE')
+        RewardTransaction.objects.create(user=user, order=order, order_total=Decimal('40.00'), points_earned=Decimal('-2.00'), transaction_type='REDEEMED')
+
+        rollups.build()
+
+        rows = {row.category_id: row for row in DailyCategorySales.objects.all()}
+        self.assertEqual(rows[games.pk].rewards_issued, Decimal('3.00'))
+        self.assertEqual(rows[cards.pk].rewards_issued, Decimal('1.00'))
+        self.assertEqual(rows[games.pk].rewards_redeemed, Decimal('1.50'))
+        self.assertEqual(rows[cards.pk].rewards_redeemed, Decimal('0.50'))
+
+    def test_rounding_goes_to_the_last_item(self):
+        items = [(1, 1, 1, Decimal('5.00')), (2, 1, 1, Decimal('5.00')), (3, 1, 1, Decimal('5.00'))]
+        shares = [share for _, _, share in rollups._spread(Decimal('1.00'), items)]
+        self.assertEqual(shares, [Decimal('0.33'), Decimal('0.33'), Decimal('0.34')])
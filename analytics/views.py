@@ -0,0 +1,84 @@
+from datetime import timedelta
+
+from django.contrib import admin
+from django.contrib.admin.views.decorators import staff_member_required
+from django.db.models import F, Sum
+from django.db.models.functions import TruncMonth, TruncWeek
+from django.shortcuts import render
+from django.utils import timezone
+
+from .models import DailyCategorySales, DailyProductSales
+
+
+PERIODS = {
+    'day': None,
+    'week': TruncWeek,
+    'month': TruncMonth,
+}
+
+# Named apart from the fields they sum, which annotations may not shadow
+TOTALS = {
+    'total_units': Sum('units'),
+    'total_revenue': Sum('revenue'),
+    'total_orders': Sum('orders'),
+    'total_rewards_issued': Sum('rewards_issued'),
+    'total_rewards_redeemed': Sum('rewards_redeemed'),
+}
+
+TOP_PRODUCTS = 10
+
+
+def _with_bars(rows, field='total_revenue'):
+    """Give every row a bar width, in percent of the largest value of field"""
+    largest = max((row[field] or 0 for row in rows), default=0)
+    for row in rows:
+        row['bar'] = round(100 * (row[field] or 0) / largest) if largest else 0
+    return rows
+
+
+@staff_member_required
+def sales_dashboard(request):
+    """
+    Sales over the last ?days= days, by ?period= and by category, read
+    only from the daily rollups of analytics/rollups.py
+    """
+    try:
+        days = min(max(int(request.GET.get('days', 30)), 1), 731)
+    except ValueError:
+        days = 30
+    period = request.GET.get('period', 'day')
+    if period not in PERIODS:
+        period = 'day'
+    since = timezone.localdate() - timedelta(days=days - 1)
+
+    categories = DailyCategorySales.objects.filter(day__gte=since)
+    # Every product is in exactly one category row, so the category
+    # rollup also gives the shop totals
+    if PERIODS[period] is None:
+        timeline = categories.values(start=F('day'))
+    else:
+        timeline = categories.annotate(start=PERIODS[period]('day')).values('start')
+    timeline = list(timeline.annotate(**TOTALS).order_by('start'))
+
+    by_category = list(
+        categories.values('category__name').annotate(**TOTALS).order_by('-total_revenue')
+    )
+    top_products = list(
+        DailyProductSales.objects.filter(day__gte=since)
+        .values('product_id', 'product__title').annotate(**TOTALS).order_by('-total_revenue')[:TOP_PRODUCTS]
+    )
+    totals = categories.aggregate(**TOTALS)
+
+    context = {
+        **admin.site.each_context(request),
+        'title': 'Sales',
+        'days': days,
+        'period': period,
+        'periods': list(PERIODS),
+        'since': since,
+        'totals': totals,
+        'timeline': _with_bars(timeline),
+        'by_category': _with_bars(by_category),
+        'top_products': _with_bars(top_products),
+    }
+    return render(request, 'analytics/sales-dashboard.html', context)
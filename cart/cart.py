@@ -1,5 +1,5 @@
 from decimal import Decimal
-from store.models import Product
+from store import product_cache
 
 class Cart():
     def __init__(self, request):
@@ -10,6 +10,15 @@ class Cart():
         if 'session_key' not in request.session:
             cart = self.session['session_key'] = {}
         self.cart = cart
+        # Resolved line items, quantity and total, memoized for this request
+        self._invalidate()
+        # Share this instance with the cart context processor
+        request.cart = self
+
+    def _invalidate(self):
+        self._items = None
+        self._qty = None
+        self._total = None
 
     def add(self, product, product_qty):
         product_id = str(product.id)
@@ -18,12 +27,14 @@ class Cart():
         else:
             self.cart[product_id] = {'price': str(product.price), 'qty': product_qty}
         self.session.modified = True
+        self._invalidate()
 
     def delete(self, product):
         product_id = str(product)
         if product_id in self.cart:
             del self.cart[product_id]
         self.session.modified = True
+        self._invalidate()
 
     def update(self, product, qty):
         product_id = str(product)
@@ -32,27 +43,50 @@ class Cart():
             self.cart[product_id]['qty'] = product_quantity
 
         self.session.modified = True
+        self._invalidate()
 
     def __len__(self):
-        return sum(item['qty'] for item in self.cart.values())
+        if self._qty is None:
+            self._qty = sum(item['qty'] for item in self.cart.values())
+        return self._qty
 
-    def __iter__(self):
-        all_product_ids = self.cart.keys()
-        products = Product.objects.filter(id__in=all_product_ids)
-        cart = self.cart.copy()
-        for product in products:
-            cart[str(product.id)]['product'] = product
+    def line_items(self):
+        """
+        Return the cart lines with their products, fetched in one query
+        at most
 
-        for item in cart.values():
-            item['price'] = Decimal(item['price'])
-            item['total'] = item['price'] * item['qty']
-            yield item    
+        Each line is a new dict, so the session data only ever holds
+        the JSON-serializable price strings and quantities.
+        """
+        if self._items is None:
+            # Served from the product cache, misses are read in one query
+            products = product_cache.get_many([int(product_id) for product_id in self.cart])
+            items = []
+            for product_id, item in self.cart.items():
+                product = products.get(int(product_id))
+                # Skip products deleted since they were added
+                if product is None:
+                    continue
+                price = Decimal(item['price'])
+                items.append({
+                    'product': product,
+                    'qty': item['qty'],
+                    'price': price,
+                    'total': price * item['qty'],
+                })
+            self._items = items
+        return self._items
+
+    def __iter__(self):
+        return iter(self.line_items())
 
     def get_total(self):
-        return sum(Decimal(item['price']) * item['qty'] for item in self.cart.values())
+        if self._total is None:
+            # Over the same lines an order records, deleted products left out
+            self._total = sum((line['total'] for line in self.line_items()), Decimal('0.00'))
+        return self._total
 
 
 
 
   
-
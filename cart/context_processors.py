@@ -1,5 +1,9 @@
 from .cart import Cart
 
 def cart(request):
-    return {'cart': Cart(request)}
+    # Reuse the Cart the view already built, along with its memoized lines
+    cart = getattr(request, 'cart', None)
+    if cart is None:
+        cart = Cart(request)
+    return {'cart': cart}
 
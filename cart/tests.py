@@ -1,3 +1,37 @@
+from decimal import Decimal
+
 from django.test import TestCase
+from django.urls import reverse
+
+from ecom_model.tests.fixtures import build_catalog, fill_cart
+
+from .cart import Cart
+
+
+class CartTotalTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.products = build_catalog(2)
+
+    def cart(self):
+        request = self.client.get(reverse('cart-summary')).wsgi_request
+        return Cart(request)
+
+    def test_total_covers_the_lines(self):
+        fill_cart(self.client, self.products, quantity=2)
+        cart = self.cart()
+        self.assertEqual(cart.get_total(), 2 * sum(product.price for product in self.products))
+        self.assertEqual(cart.get_total(), sum(line['total'] for line in cart.line_items()))
+
+    def test_deleted_product_is_not_charged(self):
+        fill_cart(self.client, self.products)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.products[1].delete()
+
+        cart = self.cart()
+        self.assertEqual([line['product'].pk for line in cart.line_items()], [self.products[0].pk])
+        self.assertEqual(cart.get_total(), self.products[0].price)
 
-# Create your tests here.
+    def test_empty_cart(self):
+        self.assertEqual(self.cart().get_total(), Decimal('0.00'))
@@ -1,7 +1,6 @@
 from django.shortcuts import render
 from .cart import Cart
-from store.models import Product
-from django.shortcuts import get_object_or_404
+from store import inventory, product_cache
 from django.http import JsonResponse
 
 
@@ -13,9 +12,11 @@ def cart_summary(request):
 def cart_add(request):
     cart = Cart(request)
     if request.POST.get('action') == 'post':
+        # The cart is changing, release any stock held for checkout
+        inventory.release_holds(request)
         product_id = int(request.POST.get('product_id'))
         product_quantity = int(request.POST.get('product_quantity'))
-        product = get_object_or_404(Product, id=product_id)
+        product = product_cache.get_or_404(product_id)
         
         # Check if enough stock is available
         if not product.can_fulfill_order(product_quantity):
@@ -48,6 +49,8 @@ def cart_add(request):
 def cart_delete(request):
     cart = Cart(request)
     if request.POST.get('action') == 'post':
+        # The cart is changing, release any stock held for checkout
+        inventory.release_holds(request)
         product_id = int(request.POST.get('product_id'))
         cart.delete(product=product_id)
         cart_quantity = cart.__len__()
@@ -59,11 +62,13 @@ def cart_delete(request):
 def cart_update(request):
     cart = Cart(request)
     if request.POST.get('action') == 'post':
+        # The cart is changing, release any stock held for checkout
+        inventory.release_holds(request)
         product_id = int(request.POST.get('product_id'))
         product_quantity = int(request.POST.get('product_quantity'))
         
         # Validate stock availability
-        product = get_object_or_404(Product, id=product_id)
+        product = product_cache.get_or_404(product_id)
         if not product.can_fulfill_order(product_quantity):
             response = JsonResponse({
                 'error': True,
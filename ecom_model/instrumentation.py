@@ -0,0 +1,217 @@
+"""
+Per-request instrumentation
+
+RequestInstrumentationMiddleware measures, for every request:
+
+    - the wall time
+    - the number of SQL queries and the time spent in them, through a
+      connection.execute_wrapper()
+    - the time spent rendering templates
+
+A request over REQUEST_TIME_BUDGET_MS or REQUEST_QUERY_BUDGET is
+logged as a warning on the 'ecom_model.requests' logger, together
+with the queries it ran more than once, which is usually an N+1.
+Every request is also counted into per-URL-name histograms, kept in
+memory by each process, which staff can read as JSON from the
+request_metrics view.
+
+The overhead is a few clock reads per query and per render plus one
+dict update per request, so it is meant to stay on in production.
+Set REQUEST_INSTRUMENTATION = False to take it out altogether.
+"""
+
+import logging
+import threading
+import time
+from bisect import bisect_left
+from collections import Counter
+from contextlib import ExitStack
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.contrib.admin.views.decorators import staff_member_required
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+from django.http import JsonResponse
+from django.template.backends.django import Template as DjangoTemplate
+
+
+logger = logging.getLogger('ecom_model.requests')
+
+TIME_BUDGET_MS = getattr(settings, 'REQUEST_TIME_BUDGET_MS', 500)
+QUERY_BUDGET = getattr(settings, 'REQUEST_QUERY_BUDGET', 25)
+
+# Upper bounds of the histogram buckets, the last bucket is open
+TIME_BUCKETS_MS = (5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000)
+QUERY_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100)
+
+# How many repeated queries a slow request log shows
+DUPLICATES_LOGGED = 5
+
+
+class RequestStats:
+    """What one request has spent so far"""
+
+    __slots__ = ('queries', 'sql_time', 'template_time', 'template_depth', 'statements')
+
+    def __init__(self):
+        self.queries = 0
+        self.sql_time = 0.0
+        self.template_time = 0.0
+        self.template_depth = 0
+        self.statements = Counter()
+
+    def __call__(self, execute, sql, params, many, context):
+        """execute_wrapper hook, times every query the request runs"""
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.sql_time += time.perf_counter() - start
+            self.queries += 1
+            self.statements[sql] += 1
+
+    def duplicates(self):
+        return [(sql, count) for sql, count in self.statements.most_common(DUPLICATES_LOGGED) if count > 1]
+
+
+_current = ContextVar('request_stats', default=None)
+
+
+def current_stats():
+    """Stats of the request being handled, None outside of one"""
+    return _current.get()
+
+
+def _timed_render(render):
+    def wrapper(self, context=None, request=None):
+        stats = _current.get()
+        if stats is None:
+            return render(self, context, request)
+        # Only the outermost render is timed, templates rendered from
+        # inside another one are already part of its time
+        stats.template_depth += 1
+        start = time.perf_counter()
+        try:
+            return render(self, context, request)
+        finally:
+            stats.template_depth -= 1
+            if not stats.template_depth:
+                stats.template_time += time.perf_counter() - start
+    wrapper.instrumented = True
+    return wrapper
+
+
+class Histogram:
+    """Bucketed counts plus a running total"""
+
+    __slots__ = ('bounds', 'counts', 'total', 'count')
+
+    def __init__(self, bounds):
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)
+        self.total = 0.0
+        self.count = 0
+
+    def add(self, value):
+        self.counts[bisect_left(self.bounds, value)] += 1
+        self.total += value
+        self.count += 1
+
+    def as_dict(self):
+        labels = [f'<={bound}' for bound in self.bounds] + [f'>{self.bounds[-1]}']
+        return {
+            'buckets': dict(zip(labels, self.counts)),
+            'mean': round(self.total / self.count, 2) if self.count else 0,
+        }
+
+
+class Metrics:
+    """Per-URL-name histograms of this process"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._routes = {}
+
+    def record(self, route, wall_ms, sql_ms, template_ms, queries):
+        with self._lock:
+            histograms = self._routes.get(route)
+            if histograms is None:
+                histograms = self._routes[route] = {
+                    'wall_ms': Histogram(TIME_BUCKETS_MS),
+                    'sql_ms': Histogram(TIME_BUCKETS_MS),
+                    'template_ms': Histogram(TIME_BUCKETS_MS),
+                    'queries': Histogram(QUERY_BUCKETS),
+                }
+            histograms['wall_ms'].add(wall_ms)
+            histograms['sql_ms'].add(sql_ms)
+            histograms['template_ms'].add(template_ms)
+            histograms['queries'].add(queries)
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                route: dict(requests=histograms['wall_ms'].count,
+                            **{name: histogram.as_dict() for name, histogram in histograms.items()})
+                for route, histograms in sorted(self._routes.items())
+            }
+
+    def reset(self):
+        with self._lock:
+            self._routes.clear()
+
+
+metrics = Metrics()
+
+
+class RequestInstrumentationMiddleware:
+    """
+    Time every request and its queries and templates, see the module
+    docstring
+    """
+
+    def __init__(self, get_response):
+        if not getattr(settings, 'REQUEST_INSTRUMENTATION', True):
+            raise MiddlewareNotUsed()
+        self.get_response = get_response
+        if not getattr(DjangoTemplate.render, 'instrumented', False):
+            DjangoTemplate.render = _timed_render(DjangoTemplate.render)
+
+    def __call__(self, request):
+        stats = RequestStats()
+        token = _current.set(stats)
+        start = time.perf_counter()
+        try:
+            with ExitStack() as stack:
+                for connection in connections.all():
+                    stack.enter_context(connection.execute_wrapper(stats))
+                response = self.get_response(request)
+        finally:
+            _current.reset(token)
+        wall_ms = (time.perf_counter() - start) * 1000
+
+        match = request.resolver_match
+        route = (match.view_name if match else None) or 'unresolved'
+        sql_ms = stats.sql_time * 1000
+        template_ms = stats.template_time * 1000
+        metrics.record(route, wall_ms, sql_ms, template_ms, stats.queries)
+
+        if wall_ms > TIME_BUDGET_MS or stats.queries > QUERY_BUDGET:
+            self.log_over_budget(request, route, response, wall_ms, sql_ms, template_ms, stats)
+        return response
+
+    def log_over_budget(self, request, route, response, wall_ms, sql_ms, template_ms, stats):
+        message = (
+            f'{request.method} {request.path} ({route}) {response.status_code} over budget: '
+            f'{wall_ms:.0f}ms, {stats.queries} queries in {sql_ms:.0f}ms, templates {template_ms:.0f}ms'
+        )
+        duplicates = stats.duplicates()
+        if duplicates:
+            message += '\nRepeated queries:' + ''.join(f'\n  {count}x {sql}' for sql, count in duplicates)
+        logger.warning(message)
+
+
+@staff_member_required
+def request_metrics(request):
+    """Per-URL-name request histograms of the process serving this request"""
+    return JsonResponse({'routes': metrics.snapshot()})
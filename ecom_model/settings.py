@@ -44,6 +44,8 @@ INSTALLED_APPS = [
     'cart',
     'account',
     'payment',
+    'outbox',
+    'analytics',
     #mathfilters,
     'mathfilters',
     #crispy_forms,
@@ -60,6 +62,8 @@ SECURE_CROSS_ORIGIN_OPENER_POLICY='same-origin-allow-popups'
 CRISPY_TEMPLATE_PACK = 'bootstrap5'
 
 MIDDLEWARE = [
+    # First, so that its timings cover all the other middleware
+    'ecom_model.instrumentation.RequestInstrumentationMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -104,6 +108,29 @@ DATABASES = {
 }
 
 
+# Cache
+# https://docs.djangoproject.com/en/6.0/topics/cache/
+# The catalog caches in store/catalog.py are invalidated through a version
+# number kept here, so processes only see each other's catalog changes when
+# they share a cache. Point this at Redis or Memcached when running more
+# than one worker process.
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'ecom-model',
+    }
+}
+
+
+# Request instrumentation, see ecom_model/instrumentation.py
+# Requests slower or with more queries than this are logged as warnings
+
+REQUEST_INSTRUMENTATION = True
+REQUEST_TIME_BUDGET_MS = 500
+REQUEST_QUERY_BUDGET = 25
+
+
 # Password validation
 # https://docs.djangoproject.com/en/6.0/ref/settings/#auth-password-validators
 
@@ -0,0 +1,74 @@
+"""
+Test fixtures
+
+Builders for a realistic shop to test against: a catalog, customers
+with a shipping address, an order history with the rewards it earned
+and a redemption, and a filled cart. They reuse the bulk writers of
+store/synthetic.py, so a larger data set stays cheap to build.
+"""
+
+import random
+
+from django.contrib.auth.models import User
+from django.urls import reverse
+
+from account import backfill
+from account.models import RewardAccount, redeem_points
+from payment.models import Order, ShippingAddress
+from store import catalog, synthetic
+from store.models import Product
+
+
+PASSWORD = 'fixture-password'
+
+
+def build_catalog(products, categories=3, brands=4, seed=0):
+    """Create products spread over categories and brands, all in stock"""
+    rng = random.Random(seed)
+    token = synthetic.run_token()
+    category_objects = synthetic.make_categories(categories, token)
+    brand_names = synthetic.make_brands(brands, rng)
+    rows = synthetic.make_products(products, category_objects, brand_names, token, rng)
+    Product.objects.filter(pk__in=[pk for pk, _ in rows]).update(quantity_available=1000)
+    catalog.bump_version()
+    return list(Product.objects.filter(pk__in=[pk for pk, _ in rows]).order_by('pk'))
+
+
+def build_customer(username='customer', staff=False):
+    """An active customer with a shipping address"""
+    user = User.objects.create_user(username, f'{username}@example.com', PASSWORD, is_staff=staff, is_superuser=staff)
+    ShippingAddress.objects.create(
+        user=user, full_name='Test Customer', email=user.email,
+        address1='1 Test Street', address2='', city='Testville', state='TS', zipcode='00000',
+    )
+    return user
+
+
+def build_order_history(user, products, orders, max_items=3, seed=0):
+    """
+    Give user orders placed with products, the rewards they earned,
+    and a redemption on the latest one
+    """
+    rng = random.Random(seed)
+    synthetic.make_orders(orders, [user.pk], [(product.pk, product.price) for product in products], rng,
+                          max_items=max_items, guest_share=0)
+    backfill.backfill(reset=True)
+    latest = Order.objects.filter(user=user).order_by('-date_ordered', '-id').first()
+    balance = RewardAccount.objects.get(user=user).total_points
+    if latest and balance > 0:
+        redeem_points(user, latest, min(balance, 1), latest.amount_paid)
+
+
+def build_reward_accounts(count):
+    """count customers that have a reward account with some history"""
+    products = list(Product.objects.all()[:3]) or build_catalog(3)
+    for i in range(count):
+        build_order_history(build_customer(f'member{i}'), products, orders=2, seed=i)
+
+
+def fill_cart(client, products, quantity=1):
+    """Put each of products in the client's cart"""
+    for product in products:
+        client.post(reverse('cart-add'), {
+            'action': 'post', 'product_id': product.pk, 'product_quantity': quantity,
+        }, headers={'X-Requested-With': 'XMLHttpRequest'})
@@ -0,0 +1,324 @@
+"""
+Query budgets
+
+Every URL name of the store, cart, account and payment apps, and the
+admin pages with per-row columns, has an upper bound on the SQL
+queries one request may run. Each bound is checked against a small
+and a large data set, so a query issued per product, order or cart
+line (an N+1) breaks the bound on the large one.
+
+A view that legitimately needs more queries gets its budget raised
+here, in the same change.
+"""
+
+from django.contrib.auth.models import User
+from django.contrib.auth.tokens import default_token_generator
+from django.core.cache import cache
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import URLPattern, URLResolver, get_resolver, reverse
+from django.utils.encoding import force_bytes
+from django.utils.http import urlsafe_base64_encode
+
+from account.token import user_tokenizer_generate
+from analytics import rollups
+from payment.models import Order
+from store import rankings
+
+from .fixtures import build_catalog, build_customer, build_order_history, build_reward_accounts, fill_cart
+
+
+# Most queries one request to each URL name may run, with a cold cache
+BUDGETS = {
+    # store
+    'store': 6,
+    'product-info': 7,
+    'list-category': 7,
+    'list-brand': 6,
+    'search-products': 7,
+    # cart
+    'cart-summary': 3,
+    'cart-add': 5,
+    'cart-delete': 4,
+    'cart-update': 5,
+    # account
+    'register': 5,
+    'email-verification': 2,
+    'email-verification-sent': 5,
+    'email-verification-success': 1,
+    'email-verification-failed': 1,
+    'my-login': 5,
+    'user-logout': 4,
+    'dashboard': 8,
+    'profile-management': 6,
+    'delete-account': 7,
+    'reset_password': 5,
+    'password_reset_done': 1,
+    'password_reset_confirm': 5,
+    'password_reset_complete': 1,
+    'manage-shipping': 7,
+    'track-orders': 9,
+    'rewards-history': 11,
+    # payment
+    'checkout': 12,
+    # Includes the savepoint the reward award runs in
+    'complete-order': 25,
+    'payment-success': 6,
+    'payment-failed': 6,
+    # admin
+    'admin:account_rewardaccount_changelist': 8,
+    'admin:account_rewardtransaction_changelist': 10,
+    # Also includes the first-request cart session write, see sales-dashboard
+    'admin:payment_order_changelist': 9,
+    'admin:payment_orderitem_changelist': 7,
+    # Includes the SAVEPOINT, UPDATE django_session and RELEASE of the
+    # cart context processor storing an empty cart on the staff
+    # session's first request
+    'sales-dashboard': 9,
+}
+
+# Most queries streaming the export of every order may run, with the
+# orders, their items and their rewards read one chunk at a time
+EXPORT_BUDGET = 10
+
+SMALL = {'products': 3, 'orders': 1, 'cart': 1, 'accounts': 1}
+LARGE = {'products': 40, 'orders': 25, 'cart': 10, 'accounts': 12}
+
+
+def url_names(patterns, namespace=None):
+    for pattern in patterns:
+        if isinstance(pattern, URLResolver):
+            if pattern.namespace is None:
+                yield from url_names(pattern.url_patterns, namespace)
+        elif isinstance(pattern, URLPattern) and pattern.name:
+            yield f'{namespace}:{pattern.name}' if namespace else pattern.name
+
+
+class QueryBudgetTestMixin:
+    size = None
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.products = build_catalog(cls.size['products'])
+        cls.customer = build_customer()
+        build_order_history(cls.customer, cls.products, cls.size['orders'])
+        cls.staff = build_customer('staff', staff=True)
+        build_reward_accounts(cls.size['accounts'])
+        rankings.build()
+        rollups.build()
+        cls.product = cls.products[0]
+        cls.cart = cls.products[:cls.size['cart']]
+
+    def setUp(self):
+        cache.clear()
+
+    def login(self, user=None):
+        self.client.force_login(user or self.customer)
+
+    def assertWithinBudget(self, url_name, method='get', path=None, data=None, ajax=False):
+        budget = BUDGETS[url_name]
+        headers = {'X-Requested-With': 'XMLHttpRequest'} if ajax else {}
+        with CaptureQueriesContext(connection) as queries:
+            response = getattr(self.client, method)(path or reverse(url_name), data or {}, headers=headers)
+        self.assertLess(response.status_code, 500)
+        self.assertLessEqual(
+            len(queries), budget,
+            f'{url_name} ran {len(queries)} queries with {self.size}, over its budget of {budget}:\n'
+            + '\n'.join(query['sql'] for query in queries)
+        )
+        return response
+
+    # store
+
+    def test_store(self):
+        self.assertWithinBudget('store')
+
+    def test_product_info(self):
+        self.assertWithinBudget('product-info', path=self.product.get_absolute_url())
+
+    def test_store_ranked(self):
+        for sort in ('best-sellers', 'trending'):
+            self.assertWithinBudget('store', data={'sort': sort})
+
+    def test_list_category(self):
+        self.assertWithinBudget('list-category', path=self.product.category.get_absolute_url())
+
+    def test_list_category_ranked(self):
+        self.assertWithinBudget('list-category', path=self.product.category.get_absolute_url(), data={'sort': 'trending'})
+
+    def test_list_brand(self):
+        self.assertWithinBudget('list-brand', path=reverse('list-brand', args=[self.product.brand]))
+
+    def test_search_products(self):
+        self.assertWithinBudget('search-products', data={'q': self.product.title.split()[0]})
+
+    def test_search_suggestions(self):
+        self.assertWithinBudget('search-products', data={'q': self.product.title[:3], 'ajax': '1', 'format': 'json'})
+
+    # cart
+
+    def test_cart_summary(self):
+        fill_cart(self.client, self.cart)
+        self.assertWithinBudget('cart-summary')
+
+    def test_cart_add(self):
+        fill_cart(self.client, self.cart)
+        self.assertWithinBudget('cart-add', 'post', data={
+            'action': 'post', 'product_id': self.products[-1].pk, 'product_quantity': 1,
+        }, ajax=True)
+
+    def test_cart_delete(self):
+        fill_cart(self.client, self.cart)
+        self.assertWithinBudget('cart-delete', 'post', data={'action': 'post', 'product_id': self.product.pk}, ajax=True)
+
+    def test_cart_update(self):
+        fill_cart(self.client, self.cart)
+        self.assertWithinBudget('cart-update', 'post', data={
+            'action': 'post', 'product_id': self.product.pk, 'product_quantity': 2,
+        }, ajax=True)
+
+    # account
+
+    def test_register(self):
+        self.assertWithinBudget('register')
+
+    def test_email_verification(self):
+        user = User.objects.create_user('pending', 'pending@example.com', 'x', is_active=False)
+        uid = urlsafe_base64_encode(force_bytes(user.pk))
+        token = user_tokenizer_generate.make_token(user)
+        self.assertWithinBudget('email-verification', path=reverse('email-verification', args=[uid, token]))
+
+    def test_email_verification_pages(self):
+        for url_name in ('email-verification-sent', 'email-verification-success', 'email-verification-failed'):
+            self.assertWithinBudget(url_name)
+
+    def test_my_login(self):
+        self.assertWithinBudget('my-login')
+
+    def test_user_logout(self):
+        self.login()
+        self.assertWithinBudget('user-logout')
+
+    def test_dashboard(self):
+        self.login()
+        self.assertWithinBudget('dashboard')
+
+    def test_profile_management(self):
+        self.login()
+        self.assertWithinBudget('profile-management')
+
+    def test_delete_account(self):
+        self.login()
+        self.assertWithinBudget('delete-account')
+
+    def test_password_reset_pages(self):
+        for url_name in ('reset_password', 'password_reset_done', 'password_reset_complete'):
+            self.assertWithinBudget(url_name)
+
+    def test_password_reset_confirm(self):
+        uid = urlsafe_base64_encode(force_bytes(self.customer.pk))
+        token = default_token_generator.make_token(self.customer)
+        self.assertWithinBudget('password_reset_confirm', path=reverse('password_reset_confirm', args=[uid, token]))
+
+    def test_manage_shipping(self):
+        self.login()
+        self.assertWithinBudget('manage-shipping')
+
+    def test_track_orders(self):
+        self.login()
+        self.assertWithinBudget('track-orders')
+
+    def test_rewards_history(self):
+        self.login()
+        self.assertWithinBudget('rewards-history')
+
+    # payment
+
+    def test_checkout(self):
+        self.login()
+        fill_cart(self.client, self.cart)
+        self.assertWithinBudget('checkout')
+
+    def test_complete_order(self):
+        self.login()
+        fill_cart(self.client, self.cart)
+        self.client.get(reverse('checkout'))
+        response = self.assertWithinBudget('complete-order', 'post', data={
+            'action': 'post', 'name': 'Test Customer', 'email': 'customer@example.com',
+            'address1': '1 Test Street', 'address2': '', 'city': 'Testville', 'state': 'TS', 'zipcode': '00000',
+            'rewards_applied': '0',
+        }, ajax=True)
+        self.assertTrue(response.json()['success'])
+
+    def test_payment_success(self):
+        self.login()
+        self.assertWithinBudget('payment-success')
+
+    def test_payment_failed(self):
+        self.login()
+        self.assertWithinBudget('payment-failed')
+
+    # admin
+
+    def test_reward_account_admin(self):
+        self.login(self.staff)
+        self.assertWithinBudget('admin:account_rewardaccount_changelist')
+
+    def test_reward_transaction_admin(self):
+        self.login(self.staff)
+        self.assertWithinBudget('admin:account_rewardtransaction_changelist')
+
+    def test_order_admin(self):
+        self.login(self.staff)
+        self.assertWithinBudget('admin:payment_order_changelist')
+
+    def test_order_item_admin(self):
+        self.login(self.staff)
+        self.assertWithinBudget('admin:payment_orderitem_changelist')
+
+    def test_order_export(self):
+        self.login(self.staff)
+        orders = list(Order.objects.values_list('pk', flat=True))
+        for action in ('export_orders_csv', 'export_orders_jsonl'):
+            with CaptureQueriesContext(connection) as queries:
+                response = self.client.post(reverse('admin:payment_order_changelist'), {
+                    'action': action, '_selected_action': orders,
+                })
+                content = b''.join(response.streaming_content)
+            self.assertEqual(response.status_code, 200)
+            self.assertIn(str(orders[-1]).encode(), content)
+            self.assertLessEqual(
+                len(queries), EXPORT_BUDGET,
+                f'{action} ran {len(queries)} queries with {self.size}:\n' + '\n'.join(query['sql'] for query in queries)
+            )
+
+    def test_sales_dashboard(self):
+        self.login(self.staff)
+        for period in ('day', 'week', 'month'):
+            with CaptureQueriesContext(connection) as queries:
+                self.assertWithinBudget('sales-dashboard', data={'period': period, 'days': 365})
+            # Only the rollups, never the raw order tables
+            for query in queries:
+                self.assertNotIn('"payment_order', query['sql'])
+
+
+class SmallDataQueryBudgetTests(QueryBudgetTestMixin, TestCase):
+    size = SMALL
+
+
+class LargeDataQueryBudgetTests(QueryBudgetTestMixin, TestCase):
+    size = LARGE
+
+
+class BudgetCoverageTests(TestCase):
+
+    def test_every_url_name_has_a_budget(self):
+        resolver = get_resolver()
+        app_patterns = [
+            pattern for pattern in resolver.url_patterns
+            if isinstance(pattern, URLResolver)
+            and getattr(pattern.urlconf_name, '__name__', None) in ('store.urls', 'cart.urls', 'account.urls', 'payment.urls')
+        ]
+        missing = set(url_names(app_patterns)) - set(BUDGETS)
+        self.assertFalse(missing, f'URL names without a query budget: {sorted(missing)}')
@@ -19,8 +19,14 @@ from django.urls import path, include
 from django.conf import settings
 from django.conf.urls.static import static
 
+from analytics.views import sales_dashboard
+
+from .instrumentation import request_metrics
+
 urlpatterns = [
     # Admin url
+    path('admin/metrics/requests/', request_metrics, name='request-metrics'),
+    path('admin/analytics/sales/', sales_dashboard, name='sales-dashboard'),
     path('admin/', admin.site.urls),
     # Store app
     path('', include('store.urls')),
@@ -0,0 +1,129 @@
+"""
+DB-backed email outbox
+
+Views never talk to the SMTP server. enqueue() only inserts an
+OutboxEmail row, inside whatever transaction the caller has open, so
+an order and its confirmation email are committed or rolled back
+together. The send_outbox management command drains the outbox in
+batches over one reused connection to EMAIL_BACKEND, retrying
+failures with exponential backoff.
+"""
+
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.mail import EmailMultiAlternatives, get_connection
+from django.db import transaction
+from django.utils import timezone
+
+from .models import OutboxEmail
+
+
+MAX_ATTEMPTS = getattr(settings, 'OUTBOX_MAX_ATTEMPTS', 8)
+
+# Retry delay after the first failure, doubled after every further one
+BACKOFF_SECONDS = 60
+MAX_BACKOFF_SECONDS = 60 * 60
+
+# How long a claimed batch stays invisible to other workers
+LEASE_SECONDS = 5 * 60
+
+
+def enqueue(subject, body, recipient_list, from_email=None, html_body=''):
+    """
+    Queue an email for the send_outbox worker
+
+    Args:
+        subject (str): Email subject
+        body (str): Plain text body
+        recipient_list (list): Recipient addresses
+        from_email (str): Sender, defaults to EMAIL_HOST_USER
+        html_body (str): Optional HTML alternative to body
+
+    Returns:
+        OutboxEmail: The queued row
+    """
+    return OutboxEmail.objects.create(
+        subject=subject,
+        body=body,
+        html_body=html_body,
+        from_email=from_email or settings.EMAIL_HOST_USER,
+        to=list(recipient_list),
+    )
+
+
+def backoff(attempts):
+    """Delay before retrying an email that has failed attempts times"""
+    return timedelta(seconds=min(BACKOFF_SECONDS * 2 ** (attempts - 1), MAX_BACKOFF_SECONDS))
+
+
+def claim_batch(batch_size):
+    """
+    Claim up to batch_size due emails for this worker
+
+    Claimed rows get their next attempt pushed out by the lease, so a
+    second worker skips them, and a worker that dies mid-batch only
+    delays them instead of losing them.
+    """
+    now = timezone.now()
+    with transaction.atomic():
+        batch = list(
+            OutboxEmail.objects.select_for_update(skip_locked=True)
+            .filter(status=OutboxEmail.PENDING, next_attempt_at__lte=now)
+            .order_by('next_attempt_at', 'id')[:batch_size]
+        )
+        OutboxEmail.objects.filter(pk__in=[email.pk for email in batch]).update(
+            next_attempt_at=now + timedelta(seconds=LEASE_SECONDS)
+        )
+    return batch
+
+
+def send_batch(batch_size=100, connection=None):
+    """
+    Send one batch of due emails over a single connection
+
+    Returns:
+        tuple: (sent, failed) counts
+    """
+    batch = claim_batch(batch_size)
+    if not batch:
+        return 0, 0
+
+    connection = connection or get_connection()
+    sent = failed = 0
+    try:
+        connection.open()
+    except Exception as e:
+        # Server unreachable, the whole batch is retried later
+        for email in batch:
+            _record_failure(email, e)
+        return 0, len(batch)
+
+    try:
+        for email in batch:
+            message = EmailMultiAlternatives(email.subject, email.body, email.from_email, email.to, connection=connection)
+            if email.html_body:
+                message.attach_alternative(email.html_body, 'text/html')
+            try:
+                connection.send_messages([message])
+            except Exception as e:
+                _record_failure(email, e)
+                failed += 1
+            else:
+                OutboxEmail.objects.filter(pk=email.pk).update(
+                    status=OutboxEmail.SENT, sent_at=timezone.now(), attempts=email.attempts + 1, last_error=''
+                )
+                sent += 1
+    finally:
+        connection.close()
+    return sent, failed
+
+
+def _record_failure(email, error):
+    attempts = email.attempts + 1
+    update = {'attempts': attempts, 'last_error': str(error)}
+    if attempts >= MAX_ATTEMPTS:
+        update['status'] = OutboxEmail.FAILED
+    else:
+        update['next_attempt_at'] = timezone.now() + backoff(attempts)
+    OutboxEmail.objects.filter(pk=email.pk).update(**update)
@@ -0,0 +1,29 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from outbox import mail
+
+
+class Command(BaseCommand):
+    help = 'Send queued outbox emails in batches over one SMTP connection'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=100, help='Emails sent per connection')
+        parser.add_argument('--loop', type=int, default=0, metavar='SECONDS', help='Keep polling every SECONDS instead of draining once')
+
+    def handle(self, *args, **options):
+        while True:
+            total_sent = total_failed = 0
+            # Drain everything that is due, one batch per connection
+            while True:
+                sent, failed = mail.send_batch(batch_size=options['batch_size'])
+                total_sent += sent
+                total_failed += failed
+                if sent + failed < options['batch_size']:
+                    break
+            if total_sent or total_failed or not options['loop']:
+                self.stdout.write(self.style.SUCCESS(f'Sent {total_sent} email(s), {total_failed} failed.'))
+            if not options['loop']:
+                return
+            time.sleep(options['loop'])
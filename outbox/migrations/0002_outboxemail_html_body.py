@@ -0,0 +1,18 @@
+# Generated by Django 6.0 on 2026-10-16 23:55
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('outbox', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='outboxemail',
+            name='html_body',
+            field=models.TextField(blank=True, help_text='Optional HTML alternative to the plain text body'),
+        ),
+    ]
@@ -0,0 +1,99 @@
+from datetime import timedelta
+
+from django.contrib.auth.models import User
+from django.core import mail as django_mail
+from django.db import transaction
+from django.test import TestCase
+from django.utils import timezone
+
+from account.forms import OutboxPasswordResetForm
+
+from . import mail
+from .models import OutboxEmail
+
+
+class FailingConnection:
+    """Email backend whose every send fails"""
+
+    def open(self):
+        pass
+
+    def close(self):
+        pass
+
+    def send_messages(self, messages):
+        raise ConnectionError('Mail server said no')
+
+
+class OutboxTests(TestCase):
+
+    def test_rolled_back_enqueue_sends_nothing(self):
+        with self.assertRaises(RuntimeError):
+            with transaction.atomic():
+                mail.enqueue('Order', 'Thanks', ['customer@example.com'])
+                raise RuntimeError('checkout failed')
+
+        self.assertFalse(OutboxEmail.objects.exists())
+        self.assertEqual(mail.send_batch(), (0, 0))
+        self.assertEqual(django_mail.outbox, [])
+
+    def test_send_batch_delivers(self):
+        mail.enqueue('Order', 'Thanks', ['customer@example.com'], from_email='shop@example.com')
+        mail.enqueue('Welcome', 'Hello', ['other@example.com'], html_body='<p>Hello</p>')
+
+        self.assertEqual(mail.send_batch(), (2, 0))
+
+        self.assertEqual([message.subject for message in django_mail.outbox], ['Order', 'Welcome'])
+        self.assertEqual(django_mail.outbox[0].to, ['customer@example.com'])
+        self.assertEqual(django_mail.outbox[1].alternatives[0].content, '<p>Hello</p>')
+        self.assertFalse(OutboxEmail.objects.exclude(status=OutboxEmail.SENT).exists())
+        # Sent emails are never claimed again
+        self.assertEqual(mail.send_batch(), (0, 0))
+
+    def test_claim_batch_leases_the_rows(self):
+        email = mail.enqueue('Order', 'Thanks', ['customer@example.com'])
+
+        self.assertEqual(mail.claim_batch(10), [email])
+        self.assertEqual(mail.claim_batch(10), [])
+        email.refresh_from_db()
+        self.assertGreater(email.next_attempt_at, timezone.now() + timedelta(seconds=mail.LEASE_SECONDS - 5))
+
+    def test_failure_backs_off(self):
+        email = mail.enqueue('Order', 'Thanks', ['customer@example.com'])
+
+        before = timezone.now()
+        self.assertEqual(mail.send_batch(connection=FailingConnection()), (0, 1))
+
+        email.refresh_from_db()
+        self.assertEqual(email.status, OutboxEmail.PENDING)
+        self.assertEqual(email.attempts, 1)
+        self.assertEqual(email.last_error, 'Mail server said no')
+        self.assertGreaterEqual(email.next_attempt_at, before + mail.backoff(1))
+        self.assertEqual(mail.backoff(2), 2 * mail.backoff(1))
+        # Not due again until the backoff has passed
+        self.assertEqual(mail.send_batch(), (0, 0))
+
+    def test_last_attempt_marks_failed(self):
+        email = mail.enqueue('Order', 'Thanks', ['customer@example.com'])
+        OutboxEmail.objects.filter(pk=email.pk).update(attempts=mail.MAX_ATTEMPTS - 1)
+
+        mail.send_batch(connection=FailingConnection())
+
+        email.refresh_from_db()
+        self.assertEqual(email.status, OutboxEmail.FAILED)
+        self.assertEqual(email.attempts, mail.MAX_ATTEMPTS)
+
+    def test_password_reset_queues_html_alternative(self):
+        User.objects.create_user('customer', 'customer@example.com', 'password')
+        form = OutboxPasswordResetForm({'email': 'customer@example.com'})
+        self.assertTrue(form.is_valid())
+
+        form.save(
+            domain_override='shop.example.com',
+            email_template_name='registration/password_reset_email.html',
+            html_email_template_name='registration/password_reset_email.html',
+        )
+
+        email = OutboxEmail.objects.get()
+        self.assertEqual(email.to, ['customer@example.com'])
+        self.assertIn('shop.example.com', email.html_body)
@@ -0,0 +1,34 @@
+from datetime import date
+
+from django.core.management.base import BaseCommand
+
+from account.models import RewardTransaction
+from payment import export
+from payment.models import Order
+
+
+class Command(BaseCommand):
+    help = 'Stream orders with their items and rewards, or the reward ledger, as CSV or JSON Lines'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--format', choices=list(export.FORMATS), default='csv', help='Output format')
+        parser.add_argument('--start', type=date.fromisoformat, help='First day to export, YYYY-MM-DD')
+        parser.add_argument('--end', type=date.fromisoformat, help='Last day to export, YYYY-MM-DD')
+        parser.add_argument('--output', help='File to write to, standard output by default')
+        parser.add_argument('--ledger', action='store_true', help='Export the reward ledger instead of orders')
+        parser.add_argument('--chunk-size', type=int, default=export.CHUNK_SIZE, help='Rows read per query')
+
+    def handle(self, *args, **options):
+        if options['ledger']:
+            transactions = export.in_date_range(RewardTransaction.objects.all(), options['start'], options['end'], 'created_at')
+            lines = export.ledger_lines(transactions, options['format'], options['chunk_size'])
+        else:
+            orders = export.in_date_range(Order.objects.all(), options['start'], options['end'])
+            lines = export.export_lines(orders, options['format'], options['chunk_size'])
+
+        if not options['output']:
+            for line in lines:
+                self.stdout.write(line, ending='')
+            return
+        with open(options['output'], 'w', newline='', encoding='utf-8') as output:
+            output.writelines(lines)
@@ -0,0 +1,19 @@
+# Generated by Django 6.0 on 2026-10-16 22:20
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('payment', '0001_initial'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(fields=['user', 'date_ordered', 'id'], name='order_user_date_id_idx'),
+        ),
+    ]
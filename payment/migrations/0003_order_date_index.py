@@ -0,0 +1,17 @@
+# Generated by Django 6.0 on 2026-10-16 23:50
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('payment', '0002_order_user_date_index'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(fields=['date_ordered', 'id'], name='order_date_id_idx'),
+        ),
+    ]
@@ -68,6 +68,22 @@ class Order(models.Model):
 
 
 
+    class Meta:
+
+        indexes = [
+
+            # Keyset pagination of a customer's order history
+
+            models.Index(fields=['user', 'date_ordered', 'id'], name='order_user_date_id_idx'),
+
+            # Date-range exports and the admin changelist
+
+            models.Index(fields=['date_ordered', 'id'], name='order_date_id_idx'),
+
+        ]
+
+
+
     def __str__(self):
 
         return 'Order - #' + str(self.id)
@@ -0,0 +1,180 @@
+"""
+Order placement
+
+place_order() turns a cart into an Order in a single transaction:
+one conditional UPDATE that takes the stock and records the sale
+for every product at once, one INSERT for the order and one bulk
+INSERT for its items. The UPDATE only touches products that still
+have enough stock, so if another checkout got there first the row
+count comes up short and the whole order is rolled back.
+
+Units the customer reserved when opening the checkout (see
+store/inventory.py) are claimed in the same transaction and are not
+taken from the stock a second time.
+"""
+
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import Case, DecimalField, F, IntegerField, Value, When
+from django.utils import timezone
+
+from store import inventory, product_cache
+from store.models import Product
+
+from .models import Order, OrderItem
+
+
+class InsufficientStock(Exception):
+    """
+    Raised when the cart asks for more units than are in stock
+
+    Args:
+        shortages (list): Dicts with 'product', 'requested' and 'available'
+    """
+
+    def __init__(self, shortages):
+        self.shortages = shortages
+        super().__init__(self.message())
+
+    def message(self):
+        error_message = "Unable to complete order. Insufficient stock for: "
+        error_details = ", ".join([
+            f"{item['product']} (requested: {item['requested']}, available: {item['available']})"
+            for item in self.shortages
+        ])
+        return error_message + error_details
+
+
+def find_shortages(lines, held=None):
+    """
+    Return the cart lines that cannot be filled from current stock
+    plus the units the customer already holds
+    """
+    held = held or {}
+    shortages = []
+    for line in lines:
+        product = line['product']
+        available = product.quantity_available + held.get(product.pk, 0)
+        if line['qty'] > available:
+            shortages.append({
+                'product': product.title,
+                'requested': line['qty'],
+                'available': available,
+            })
+    return shortages
+
+
+def record_sales(lines, held=None):
+    """
+    Take stock and record the sale for every cart line in one UPDATE
+
+    Units in held were already taken out of stock by a reservation,
+    only the rest of each line is taken now.
+
+    Must run inside a transaction. Raises InsufficientStock, which
+    rolls that transaction back, if any product ran short. The
+    shortages are left for the caller to work out once the partial
+    UPDATE has been rolled back.
+    """
+    if not lines:
+        return
+    held = held or {}
+    quantity = Case(
+        *[When(pk=line['product'].pk, then=Value(line['qty'])) for line in lines],
+        output_field=IntegerField(),
+    )
+    unheld = Case(
+        *[When(pk=line['product'].pk, then=Value(max(line['qty'] - held.get(line['product'].pk, 0), 0))) for line in lines],
+        output_field=IntegerField(),
+    )
+    revenue = Case(
+        *[When(pk=line['product'].pk, then=Value(Decimal(line['total']))) for line in lines],
+        output_field=DecimalField(max_digits=10, decimal_places=2),
+    )
+    product_ids = [line['product'].pk for line in lines]
+    updated = Product.objects.filter(pk__in=product_ids, quantity_available__gte=unheld).update(
+        quantity_available=F('quantity_available') - unheld,
+        quantity_sold=F('quantity_sold') + quantity,
+        total_price_sold=F('total_price_sold') + revenue,
+        last_sold_date=timezone.now(),
+        payment_successful=True,
+    )
+    if updated != len(product_ids):
+        raise InsufficientStock([])
+    product_cache.invalidate(product_ids)
+    # Held units the cart no longer needs go back on the shelf
+    ordered = {line['product'].pk: line['qty'] for line in lines}
+    inventory.return_stock({
+        product_id: units - ordered.get(product_id, 0) for product_id, units in held.items()
+    })
+
+
+def refresh_stock(lines):
+    """Reload the stock of every product in the cart lines"""
+    current = Product.objects.in_bulk([line['product'].pk for line in lines])
+    for line in lines:
+        product = current.get(line['product'].pk)
+        line['product'].quantity_available = product.quantity_available if product else 0
+
+
+def place_order(lines, full_name, email, shipping_address, amount_paid, user=None, hold_key=None):
+    """
+    Create an order with its items and take the stock, as one unit
+
+    Args:
+        lines (list): Cart line items, as produced by Cart.line_items()
+        full_name (str): Customer name
+        email (str): Customer email
+        shipping_address (str): All-in-one shipping address
+        amount_paid (Decimal): Final amount charged
+        user: Authenticated user, or None for guests
+        hold_key (str): Session key whose stock holds this order claims
+
+    Returns:
+        Order: The committed order
+
+    Raises:
+        InsufficientStock: Nothing was saved
+    """
+    attempts = 3
+    while True:
+        attempts -= 1
+        try:
+            return _place_order(lines, full_name, email, shipping_address, amount_paid, user, hold_key)
+        except inventory.HoldsChanged:
+            # A hold expired and was swept mid-claim, its units are back
+            # in stock, so simply try again
+            if not attempts:
+                raise
+
+
+def _place_order(lines, full_name, email, shipping_address, amount_paid, user, hold_key):
+    try:
+        with transaction.atomic():
+            held = inventory.claim_holds(hold_key) if hold_key else {}
+            # Stock first, so a lost race fails before anything is inserted
+            record_sales(lines, held)
+            order = Order.objects.create(
+                full_name=full_name,
+                email=email,
+                shipping_address=shipping_address,
+                amount_paid=amount_paid,
+                user=user
+            )
+            OrderItem.objects.bulk_create([
+                OrderItem(
+                    order=order,
+                    product=line['product'],
+                    quantity=line['qty'],
+                    price=line['price'],
+                    user=user
+                )
+                for line in lines
+            ])
+    except InsufficientStock:
+        # Rolled back by now, so this reads the stock other checkouts left
+        refresh_stock(lines)
+        held = inventory.held_quantities(hold_key)
+        raise InsufficientStock(find_shortages(lines, held)) from None
+    return order
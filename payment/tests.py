@@ -1,3 +1,48 @@
+from unittest import mock
+
+from django.db import IntegrityError
 from django.test import TestCase
+from django.urls import reverse
+
+from account import backfill
+from account.models import RewardTransaction
+from ecom_model.tests.fixtures import PASSWORD, build_catalog, build_customer, fill_cart
+from outbox.models import OutboxEmail
+
+from .models import Order
+
+
+ORDER_FORM = {
+    'action': 'post', 'name': 'Test Customer', 'email': 'customer@example.com',
+    'address1': '1 Test Street', 'address2': '', 'city': 'Testville', 'state': 'TS', 'zipcode': '00000',
+    'rewards_applied': '0',
+}
+
+
+class CompleteOrderTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.products = build_catalog(2)
+        cls.customer = build_customer()
+
+    def complete_order(self):
+        self.client.login(username=self.customer.username, password=PASSWORD)
+        fill_cart(self.client, self.products)
+        self.client.get(reverse('checkout'))
+        return self.client.post(reverse('complete-order'), ORDER_FORM, headers={'X-Requested-With': 'XMLHttpRequest'})
+
+    def test_failed_award_keeps_the_paid_order(self):
+        with mock.patch('payment.views.award_points_for_order', side_effect=IntegrityError('award failed')):
+            with self.assertLogs('payment.views', 'ERROR'):
+                response = self.complete_order()
+
+        self.assertTrue(response.json()['success'])
+        order = Order.objects.get()
+        self.assertEqual(order.orderitem_set.count(), 2)
+        self.assertFalse(RewardTransaction.objects.filter(order=order).exists())
+        self.assertTrue(OutboxEmail.objects.exists())
 
-# Create your tests here.
+        # The backfill posts the missing award
+        self.assertEqual(backfill.backfill()[0], 1)
+        self.assertTrue(RewardTransaction.objects.filter(order=order, transaction_type='PURCHASE').exists())
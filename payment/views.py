@@ -1,15 +1,20 @@
+import logging
+
 from django.shortcuts import render
-from django.contrib.auth.decorators import login_required
-from . models import ShippingAddress, Order, OrderItem
 from cart.cart import Cart
 from django.http import JsonResponse
-from django.core.mail import send_mail
+from django.db import transaction
+from outbox.mail import enqueue
 from django.conf import settings
-from store.models import Product
+from .orders import InsufficientStock, find_shortages, place_order, refresh_stock
+from store import inventory
 from decimal import Decimal
-from account.models import award_points_for_order, RewardAccount, RewardTransaction
+from account.models import award_points_for_order, redeem_points, InsufficientRewards, RewardAccount
 from django.contrib import messages
 
+
+logger = logging.getLogger(__name__)
+
 '''
 def checkout(request):
     # Users with accounts -- Pre-fill the form
@@ -39,6 +44,21 @@ def checkout(request):
     """
     cart = Cart(request)
     cart_total = cart.get_total()
+
+    # Hold the stock for a signed-in customer's checkout, so no one else
+    # can buy it from under them while they fill in the form. Guests,
+    # crawlers included, hold nothing, their order takes the stock when
+    # it is placed
+    lines = cart.line_items()
+    if request.user.is_authenticated:
+        in_stock = inventory.hold_cart(request, lines)
+    else:
+        in_stock = not find_shortages(lines)
+    if not in_stock:
+        refresh_stock(lines)
+        shortages = find_shortages(lines)
+        if shortages:
+            messages.error(request, InsufficientStock(shortages).message())
     
     context = {
         'cart': cart,
@@ -129,145 +149,85 @@ def complete_order(request):
             total_cost = Decimal('0.00')
         # ══════════════════════════════════════════════════════════════
 
-        # Initialize product list and validation
-        product_list = []
-        insufficient_stock = []
-
         # STEP 1: Validate stock availability for all items BEFORE processing
-        for item in cart:
-            product = item['product']
-            quantity = item['qty']
-            
-            if not product.can_fulfill_order(quantity):
-                insufficient_stock.append({
-                    'product': product.title,
-                    'requested': quantity,
-                    'available': product.quantity_available
-                })
-        
-        # If any product has insufficient stock, return error
+        # Units held for this checkout are already out of quantity_available
+        hold_key = inventory.hold_key(request)
+        lines = cart.line_items()
+        product_list = [line['product'].title for line in lines]
+        held = inventory.held_quantities(hold_key)
+        insufficient_stock = find_shortages(lines, held)
         if insufficient_stock:
-            error_message = "Unable to complete order. Insufficient stock for: "
-            error_details = ", ".join([
-                f"{item['product']} (requested: {item['requested']}, available: {item['available']})"
-                for item in insufficient_stock
-            ])
-            
-            response = JsonResponse({
-                'success': False,
-                'error': error_message + error_details
-            })
-            return response
+            # The cart's products may come from the cache, check the
+            # shortage against the current stock before giving up
+            refresh_stock(lines)
+            insufficient_stock = find_shortages(lines, held)
 
-        # STEP 2: Create order (stock is available for all items)
-        if request.user.is_authenticated:
-            order = Order.objects.create(
-                full_name=name, 
-                email=email, 
-                shipping_address=shipping_address,
-                amount_paid=total_cost,  # Final amount after rewards
-                user=request.user
-            )
-            order_id = order.pk
-
-            # Create order items and update product inventory
-            for item in cart:
-                product = item['product']
-                quantity = item['qty']
-                price = item['price']
-                
-                # Create order item
-                OrderItem.objects.create(
-                    order_id=order_id, 
-                    product=product, 
-                    quantity=quantity,
-                    price=price, 
-                    user=request.user
-                )
-                
-                # Update product inventory and sales tracking
-                total_item_price = Decimal(str(price)) * quantity
-                product.process_sale(quantity, total_item_price)
-                product_list.append(product.title)
-
-            # ══════════════════════════════════════════════════════════════
-            # REWARDS PROCESSING
-            # ══════════════════════════════════════════════════════════════
-            try:
-                # STEP 1: Redeem rewards if any were applied
-                if rewards_redeemed > 0:
-                    reward_account = RewardAccount.objects.get(user=request.user)
-                    
-                    # Deduct rewards from account
-                    reward_account.total_points -= rewards_redeemed
-                    reward_account.save()
-                    
-                    # Create redemption transaction (negative)
-                    RewardTransaction.objects.create(
-                        user=request.user,
-                        order=order,
-                        order_total=original_total,
-                        points_earned=-rewards_redeemed,  # Negative for redemption
-                        transaction_type='REDEEMED',
-                        description=f'Rewards redeemed on order #{order.id}'
-                    )
-                    
-                    print(f"✓ Rewards redeemed: ${rewards_redeemed} from {request.user.username}")
-                
-                # STEP 2: Award new rewards based on FINAL total (after redemption)
-                if total_cost > 0:
-                    reward_transaction = award_points_for_order(
-                        user=request.user,
-                        order=order,
-                        order_total=total_cost  # Calculate rewards on reduced amount
+        # The order, its rewards and its confirmation email are committed
+        # together
+        with transaction.atomic():
+            # STEP 2: Create order, order items and take the stock as one unit.
+            # The stock is re-checked by the UPDATE itself, in case another
+            # checkout took it after STEP 1
+            if not insufficient_stock:
+                try:
+                    order = place_order(
+                        lines,
+                        full_name=name,
+                        email=email,
+                        shipping_address=shipping_address,
+                        # Guests pay full price, account users after rewards
+                        amount_paid=total_cost if request.user.is_authenticated else original_total,
+                        user=request.user if request.user.is_authenticated else None,
+                        hold_key=hold_key
                     )
-                    
-                    print(f"✓ New rewards awarded: ${reward_transaction.points_earned} to {request.user.username}")
-                    rewards_earned = float(reward_transaction.points_earned)
-                else:
-                    # Order was fully paid with rewards
-                    rewards_earned = 0
-                
-            except Exception as e:
-                print(f"✗ Error processing rewards: {e}")
-                rewards_earned = 0
-            # ══════════════════════════════════════════════════════════════
+                    # Spend the rewards in the order's transaction, a
+                    # balance spent meanwhile by another order fails both
+                    if rewards_redeemed > 0:
+                        redeem_points(request.user, order, rewards_redeemed, original_total)
+                    inventory.holds_claimed(request)
+                except InsufficientStock as e:
+                    insufficient_stock = e.shortages
+                except InsufficientRewards as e:
+                    transaction.set_rollback(True)
+                    return JsonResponse({'success': False, 'error': str(e)})
+
+            # If any product has insufficient stock, return error
+            if insufficient_stock:
+                response = JsonResponse({
+                    'success': False,
+                    'error': InsufficientStock(insufficient_stock).message()
+                })
+                return response
 
-        else:
-            # Guest users - no rewards
-            order = Order.objects.create(
-                full_name=name, 
-                email=email, 
-                shipping_address=shipping_address,
-                amount_paid=original_total  # Guests pay full price
-            )
             order_id = order.pk
 
-            # Create order items and update product inventory
-            for item in cart:
-                product = item['product']
-                quantity = item['qty']
-                price = item['price']
-                
-                # Create order item
-                OrderItem.objects.create(
-                    order_id=order_id, 
-                    product=product, 
-                    quantity=quantity,
-                    price=price
-                )
-                
-                # Update product inventory and sales tracking
-                total_item_price = Decimal(str(price)) * quantity
-                product.process_sale(quantity, total_item_price)
-                product_list.append(product.title)
-            
-            # No rewards for guest users
-            rewards_earned = 0
-            rewards_redeemed = 0
+            if request.user.is_authenticated:
+                # ══════════════════════════════════════════════════════════════
+                # REWARDS PROCESSING
+                # ══════════════════════════════════════════════════════════════
+                # Award new rewards based on FINAL total (after redemption).
+                # The order is already paid for, so a failed award only
+                # rolls back its savepoint, backfill_rewards posts it later
+                rewards_earned = 0
+                if total_cost > 0:
+                    try:
+                        with transaction.atomic():
+                            reward_transaction = award_points_for_order(
+                                user=request.user,
+                                order=order,
+                                order_total=total_cost  # Calculate rewards on reduced amount
+                            )
+                        rewards_earned = float(reward_transaction.points_earned)
+                    except Exception:
+                        logger.exception('Could not award rewards for order %s', order.pk)
+                # ══════════════════════════════════════════════════════════════
 
-        # Send confirmation email
-        try:
+            else:
+                # No rewards for guest users
+                rewards_earned = 0
+                rewards_redeemed = 0
+
+            # Queue the confirmation email, the send_outbox worker sends it
             # Enhanced email with rewards info
             email_body = (
                 'Hi! ' + '\n\n' + 
@@ -275,7 +235,7 @@ def complete_order(request):
                 'Please see your order below: ' + '\n\n' + 
                 str(product_list) + '\n\n'
             )
-            
+        
             # Add order totals
             if rewards_redeemed > 0:
                 email_body += (
@@ -285,7 +245,7 @@ def complete_order(request):
                 )
             else:
                 email_body += f'Total paid: ${total_cost}\n\n'
-            
+        
             # Add new rewards info
             if request.user.is_authenticated and rewards_earned > 0:
                 email_body += (
@@ -293,16 +253,8 @@ def complete_order(request):
                     '🎁 REWARDS EARNED: $' + f"{rewards_earned:.2f}" + '\n' +
                     'Check your dashboard to see your rewards balance!'
                 )
-            
-            send_mail(
-                'Order received', 
-                email_body,
-                settings.EMAIL_HOST_USER, 
-                [email], 
-                fail_silently=False
-            )
-        except Exception as e:
-            print(f"Email sending failed: {e}")
+        
+            enqueue('Order received', email_body, [email])
 
         order_success = True
         
@@ -361,4 +313,6 @@ def paypal_client_id(request):
     }
 
 def payment_failed(request):
+    # Put any stock held for the failed checkout back on sale
+    inventory.release_holds(request)
     return render(request, 'payment/payment-failed.html')
\ No newline at end of file
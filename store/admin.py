@@ -1,5 +1,6 @@
 from django.contrib import admin
-from . models import Category, Product
+from . models import Category, Product, StockReservation
+from . import thumbnails
 
 
 @admin.register(Category)
@@ -71,10 +72,23 @@ class ProductAdmin(admin.ModelAdmin):
             return "❌ Out of Stock"
     
     stock_status.short_description = 'Stock Status'
+
+    def save_model(self, request, obj, form, change):
+        # New image: drop the old variants and resize in the background
+        image_changed = 'image' in form.changed_data
+        if image_changed:
+            obj.image_variants = {}
+        super().save_model(request, obj, form, change)
+        if image_changed:
+            thumbnails.schedule(obj)
     
     # Order by most recently added by default
     ordering = ['-date_uploaded']
 
 
-
-
+@admin.register(StockReservation)
+class StockReservationAdmin(admin.ModelAdmin):
+    list_display = ['product', 'quantity', 'session_key', 'created_at', 'expires_at']
+    list_select_related = ['product']
+    readonly_fields = ['product', 'quantity', 'session_key', 'created_at', 'expires_at']
+    ordering = ['expires_at']
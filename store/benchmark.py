@@ -0,0 +1,342 @@
+"""
+Benchmark harness
+
+Drives the main customer journeys through the full Django stack and
+reports latency percentiles and query counts per scenario. Each
+scenario is a measured request, preceded by unmeasured setup requests
+where it needs them (a cart before the checkout, for instance).
+
+Requests go either through the Django test client, in process, or
+over HTTP to a local WSGI server started for the run, which adds the
+cost of a real request cycle. Query counts are taken with a
+connection.execute_wrapper() in both cases.
+
+Run it against a database filled by the generate_synthetic_data
+command, never against live data: the checkout scenarios place real
+orders, which take stock and queue emails.
+
+results() are plain dicts, so a run can be saved as JSON and compared
+with a run of another commit by compare().
+"""
+
+import http.client
+import json
+import platform
+import subprocess
+import threading
+import time
+from contextlib import ExitStack
+from datetime import datetime, timezone as dt_timezone
+from http.cookies import SimpleCookie
+from urllib.parse import urlencode
+from wsgiref.simple_server import WSGIRequestHandler, make_server
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.handlers.wsgi import WSGIHandler
+from django.db import connections
+from django.db.models import Count
+from django.test import Client, modify_settings
+from django.urls import reverse
+
+from ecom_model.instrumentation import RequestStats
+
+from . import product_cache
+from .models import Category, Product
+
+
+# Used as the CSRF cookie and header of WSGI requests
+CSRF_SECRET = 'b' * 32
+
+
+def _count_queries(stats):
+    stack = ExitStack()
+    for connection in connections.all():
+        stack.enter_context(connection.execute_wrapper(stats))
+    return stack
+
+
+class ClientDriver:
+    """Sends requests through the Django test client"""
+
+    def __init__(self, user=None):
+        self.client = Client()
+        if user is not None:
+            self.client.force_login(user)
+
+    def request(self, method, path, data=None, ajax=False):
+        """Returns (status, seconds, queries)"""
+        headers = {'X-Requested-With': 'XMLHttpRequest'} if ajax else {}
+        stats = RequestStats()
+        with _count_queries(stats):
+            start = time.perf_counter()
+            if method == 'POST':
+                response = self.client.post(path, data or {}, headers=headers)
+            else:
+                response = self.client.get(path, data or {}, headers=headers)
+            elapsed = time.perf_counter() - start
+        return response.status_code, elapsed, stats.queries
+
+
+class _QuietHandler(WSGIRequestHandler):
+    def log_message(self, format, *args):
+        pass
+
+
+def _counting_app(app):
+    """Wrap a WSGI app to report each request's query count in a header"""
+    def counted(environ, start_response):
+        stats = RequestStats()
+        with _count_queries(stats):
+            def start(status, headers, exc_info=None):
+                return start_response(status, [*headers, ('X-Query-Count', str(stats.queries))], exc_info)
+            return app(environ, start)
+    return counted
+
+
+class WSGIServer:
+    """This project served on a free local port, in a background thread"""
+
+    def __init__(self):
+        self.server = make_server('127.0.0.1', 0, _counting_app(WSGIHandler()), handler_class=_QuietHandler)
+        self.host, self.port = self.server.server_address
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+class WSGIDriver:
+    """Sends requests over HTTP to a WSGIServer"""
+
+    def __init__(self, server, user=None):
+        self.server = server
+        self.cookies = {settings.CSRF_COOKIE_NAME: CSRF_SECRET}
+        if user is not None:
+            # Borrow a logged in session from the test client
+            client = Client()
+            client.force_login(user)
+            self.cookies[settings.SESSION_COOKIE_NAME] = client.cookies[settings.SESSION_COOKIE_NAME].value
+
+    def request(self, method, path, data=None, ajax=False):
+        """Returns (status, seconds, queries)"""
+        headers = {
+            'Cookie': '; '.join(f'{name}={value}' for name, value in self.cookies.items()),
+            'X-CSRFToken': CSRF_SECRET,
+        }
+        body = None
+        if method == 'POST':
+            body = urlencode(data or {})
+            headers['Content-Type'] = 'application/x-www-form-urlencoded'
+        elif data:
+            path = f'{path}?{urlencode(data)}'
+        if ajax:
+            headers['X-Requested-With'] = 'XMLHttpRequest'
+
+        connection = http.client.HTTPConnection(self.server.host, self.server.port)
+        try:
+            start = time.perf_counter()
+            connection.request(method, path, body=body, headers=headers)
+            response = connection.getresponse()
+            response.read()
+            elapsed = time.perf_counter() - start
+        finally:
+            connection.close()
+
+        for header in response.headers.get_all('Set-Cookie') or []:
+            for name, morsel in SimpleCookie(header).items():
+                self.cookies[name] = morsel.value
+        return response.status, elapsed, int(response.getheader('X-Query-Count', -1))
+
+
+class BenchData:
+    """The rows the scenarios browse and buy"""
+
+    def __init__(self):
+        self.product = Product.objects.filter(quantity_available__gt=0).order_by('-quantity_available').first()
+        if self.product is None:
+            raise ValueError('No product in stock, run generate_synthetic_data first.')
+        # Keep the product buyable for the whole run
+        Product.objects.filter(pk=self.product.pk).update(quantity_available=1_000_000)
+        product_cache.invalidate([self.product.pk])
+        category = Category.objects.filter(product__isnull=False).first()
+        self.category_slug = category.slug if category else None
+        self.brand = self.product.brand
+        self.term = self.product.title.split()[0]
+        self.customer = (
+            User.objects.annotate(order_count=Count('order')).filter(order_count__gt=0)
+            .order_by('-order_count').first()
+        ) or User.objects.first()
+
+
+def _add_to_cart(driver, data):
+    driver.request('POST', reverse('cart-add'), {'action': 'post', 'product_id': data.product.pk, 'product_quantity': 1}, ajax=True)
+
+
+def _checkout(driver, data):
+    _add_to_cart(driver, data)
+    driver.request('GET', reverse('checkout'))
+
+
+ORDER_FORM = {
+    'action': 'post', 'name': 'Bench Customer', 'email': 'bench@example.com',
+    'address1': '1 Bench Street', 'address2': '', 'city': 'Benchville', 'state': 'BS', 'zipcode': '00000',
+}
+
+
+# name: (logged in, fresh session per request, setup, measured request)
+SCENARIOS = {
+    'store': (False, False, None, lambda data: ('GET', reverse('store'), None, False)),
+    'product_info': (False, False, None, lambda data: ('GET', data.product.get_absolute_url(), None, False)),
+    'list_category': (False, False, None, lambda data: ('GET', reverse('list-category', args=[data.category_slug]), None, False)),
+    'list_brand': (False, False, None, lambda data: ('GET', reverse('list-brand', args=[data.brand]), None, False)),
+    'search': (False, False, None, lambda data: ('GET', reverse('search-products'), {'q': data.term}, False)),
+    'suggest': (False, False, None, lambda data: ('GET', reverse('search-products'), {'q': data.term[:3], 'ajax': '1', 'format': 'json'}, True)),
+    'cart_add': (False, True, None, lambda data: ('POST', reverse('cart-add'), {'action': 'post', 'product_id': data.product.pk, 'product_quantity': 1}, True)),
+    'cart_summary': (False, True, _add_to_cart, lambda data: ('GET', reverse('cart-summary'), None, False)),
+    'checkout': (True, True, _add_to_cart, lambda data: ('GET', reverse('checkout'), None, False)),
+    'complete_order': (True, True, _checkout, lambda data: ('POST', reverse('complete-order'), ORDER_FORM, True)),
+    'track_orders': (True, False, None, lambda data: ('GET', reverse('track-orders'), None, False)),
+    'rewards_history': (True, False, None, lambda data: ('GET', reverse('rewards-history'), None, False)),
+}
+
+
+def percentile(values, pct):
+    """Nearest-rank percentile of a list of numbers"""
+    ordered = sorted(values)
+    rank = max(1, -(-len(ordered) * pct // 100))
+    return ordered[int(rank) - 1]
+
+
+def summarize(timings, queries, statuses):
+    ms = [seconds * 1000 for seconds in timings]
+    return {
+        'requests': len(ms),
+        'errors': sum(1 for status in statuses if status >= 400),
+        'p50_ms': round(percentile(ms, 50), 3),
+        'p95_ms': round(percentile(ms, 95), 3),
+        'p99_ms': round(percentile(ms, 99), 3),
+        'mean_ms': round(sum(ms) / len(ms), 3),
+        'max_ms': round(max(ms), 3),
+        'queries_min': min(queries),
+        'queries_max': max(queries),
+        'queries_p50': percentile(queries, 50),
+    }
+
+
+def run_scenario(name, data, make_driver, requests=50, warmup=5):
+    """Run one scenario requests times after warmup unmeasured runs"""
+    logged_in, fresh, setup, measured = SCENARIOS[name]
+    user = data.customer if logged_in else None
+    driver = None
+    timings, queries, statuses = [], [], []
+    for i in range(warmup + requests):
+        if driver is None or fresh:
+            driver = make_driver(user)
+        if setup:
+            setup(driver, data)
+        method, path, params, ajax = measured(data)
+        status, elapsed, count = driver.request(method, path, params, ajax)
+        if i >= warmup:
+            timings.append(elapsed)
+            queries.append(count)
+            statuses.append(status)
+    return summarize(timings, queries, statuses)
+
+
+def _commit():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], cwd=settings.BASE_DIR,
+            capture_output=True, text=True, check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run(scenarios=None, requests=50, warmup=5, mode='client', progress=None):
+    """
+    Run the benchmark
+
+    Args:
+        scenarios (list): Scenario names, all of SCENARIOS by default
+        requests (int): Measured requests per scenario
+        warmup (int): Unmeasured requests before them
+        mode (str): 'client' for the test client, 'wsgi' for HTTP to a
+            local WSGI server
+        progress (callable): Called with (name, summary) per scenario
+
+    Returns:
+        dict: 'meta' about the run and 'scenarios' with one summary each
+    """
+    scenarios = scenarios or list(SCENARIOS)
+    data = BenchData()
+    results = {
+        'meta': {
+            'commit': _commit(),
+            'started_at': datetime.now(dt_timezone.utc).isoformat(),
+            'mode': mode,
+            'requests': requests,
+            'warmup': warmup,
+            'debug': settings.DEBUG,
+            'database': connections['default'].vendor,
+            'python': platform.python_version(),
+            'products': Product.objects.count(),
+        },
+        'scenarios': {},
+    }
+
+    with ExitStack() as stack:
+        if mode == 'wsgi':
+            server = stack.enter_context(WSGIServer())
+            make_driver = lambda user: WSGIDriver(server, user)
+        else:
+            # The test client's host, allowed for the run only
+            stack.enter_context(modify_settings(ALLOWED_HOSTS={'append': 'testserver'}))
+            make_driver = ClientDriver
+        for name in scenarios:
+            summary = run_scenario(name, data, make_driver, requests=requests, warmup=warmup)
+            results['scenarios'][name] = summary
+            if progress:
+                progress(name, summary)
+    return results
+
+
+def compare(baseline, current, tolerance=0.2):
+    """
+    Compare two runs
+
+    Args:
+        baseline (dict): Earlier results()
+        current (dict): Results of this run
+        tolerance (float): How much slower p95 may get, 0.2 for 20%
+
+    Returns:
+        list: (scenario, message) for every regression, more queries
+        than before or a p95 beyond the tolerance
+    """
+    regressions = []
+    for name, now in current['scenarios'].items():
+        before = baseline.get('scenarios', {}).get(name)
+        if not before:
+            continue
+        if now['queries_max'] > before['queries_max']:
+            regressions.append((name, f"queries {before['queries_max']} -> {now['queries_max']}"))
+        if before['p95_ms'] and now['p95_ms'] > before['p95_ms'] * (1 + tolerance):
+            regressions.append((name, f"p95 {before['p95_ms']:.1f}ms -> {now['p95_ms']:.1f}ms"))
+    return regressions
+
+
+def load(path):
+    with open(path) as f:
+        return json.load(f)
+
+
+def save(results, path):
+    with open(path, 'w') as f:
+        json.dump(results, f, indent=2)
@@ -0,0 +1,108 @@
+"""
+Catalog version and cached navigation data
+
+The catalog version is a counter kept in Django's cache. The signal
+handlers in store/signals.py bump it whenever a Category or Product
+is saved or deleted. Everything derived from the catalog is cached
+under a key that includes the version, so a bump invalidates all of
+it at once, in every process sharing the cache, without having to
+know which keys exist. Stale entries simply expire.
+
+The time of the last bump is kept next to the version, for the
+Last-Modified header of the catalog pages (see store/conditional.py).
+"""
+
+import time
+from datetime import datetime, timezone as dt_timezone
+
+from django.core.cache import cache
+from django.db.models import Min
+
+from .models import Category, Product
+
+
+VERSION_KEY = 'store:catalog-version'
+MODIFIED_KEY = 'store:catalog-modified'
+
+# Lifetime of entries derived from a given catalog version
+CACHE_TIMEOUT = 60 * 60
+
+
+def get_version(key=VERSION_KEY):
+    """Return the current value of a version counter, the catalog's by default"""
+    version = cache.get(key)
+    if version is None:
+        # Seed from the clock, so that a cache restart can never hand
+        # out a version number that old entries were stored under
+        cache.add(key, int(time.time() * 1000), timeout=None)
+        version = cache.get(key)
+    return version
+
+
+def incr_version(key=VERSION_KEY):
+    """Move a version counter on, the catalog's by default"""
+    try:
+        cache.incr(key)
+    except ValueError:
+        # Key missing or evicted
+        get_version(key)
+
+
+def bump_version():
+    """Invalidate everything cached against the current catalog"""
+    cache.set(MODIFIED_KEY, time.time(), timeout=None)
+    incr_version()
+
+
+def last_modified():
+    """Return when the catalog last changed, as an aware datetime"""
+    modified = cache.get(MODIFIED_KEY)
+    if modified is None:
+        # Unknown after a cache restart, so assume it just changed
+        cache.add(MODIFIED_KEY, time.time(), timeout=None)
+        modified = cache.get(MODIFIED_KEY)
+    return datetime.fromtimestamp(modified, dt_timezone.utc)
+
+
+def cached(name, builder):
+    """
+    Return builder() cached against the current catalog version
+
+    Args:
+        name (str): Short name of the cached value
+        builder (callable): Computes the value on a cache miss
+    """
+    key = f'store:{name}:{get_version()}'
+    value = cache.get(key)
+    if value is None:
+        value = builder()
+        cache.set(key, value, CACHE_TIMEOUT)
+    return value
+
+
+def _build_categories():
+    return list(Category.objects.all())
+
+
+def _build_brands():
+    """
+    One entry per brand slug, read off the brand_slug index
+
+    Returns:
+        list: Dicts with the brand 'slug' and a display 'name'
+    """
+    all_brands = (
+        Product.objects.exclude(brand_slug__in=['', 'un-branded'])
+        .values('brand_slug')
+        .annotate(name=Min('brand'))
+        .order_by('brand_slug')
+    )
+    return [{'slug': brand['brand_slug'], 'name': brand['name']} for brand in all_brands]
+
+
+def get_categories():
+    return cached('categories', _build_categories)
+
+
+def get_brands():
+    return cached('brands', _build_brands)
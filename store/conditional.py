@@ -0,0 +1,96 @@
+"""
+Conditional GET for the catalog pages
+
+The store, category, brand and product pages only change when the
+catalog does, which store/catalog.py tracks with a version number
+and a modification time. Their ETag is derived from that version,
+so a browser revalidating a page it already has gets an empty 304
+back without the page being queried or rendered again.
+
+Parts of every page belong to the visitor rather than the catalog:
+the login and logout links and the cart count in the nav, and any
+flash messages. The ETag therefore also covers the user and the
+cart count, and pages with messages waiting are never answered
+with a 304, since the messages would not be shown. Last-Modified
+cannot tell one visitor's copy from another's, so it is only sent
+to anonymous visitors with an empty cart, whose pages are all alike.
+
+Stock levels change on every checkout without bumping the catalog
+version, so the product page adds the product's stock to its ETag.
+
+The responses are marked private, no-cache and Vary: Cookie, so
+shared caches never hand one visitor's page to another and browsers
+revalidate before every reuse.
+"""
+
+import hashlib
+
+from django.contrib.messages import get_messages
+from django.views.decorators.cache import cache_control
+from django.views.decorators.http import condition
+from django.views.decorators.vary import vary_on_cookie
+
+from cart.cart import Cart
+
+from . import catalog, product_cache
+
+
+def _visitor(request):
+    """
+    Return the per-visitor parts of a page, None when it has messages
+    waiting and must not be revalidated
+    """
+    if get_messages(request):
+        return None
+    cart = getattr(request, 'cart', None) or Cart(request)
+    return request.user.pk or 0, len(cart)
+
+
+def _etag(*parts):
+    digest = hashlib.md5(':'.join(map(str, parts)).encode(), usedforsecurity=False).hexdigest()
+    # Weak, as the CSRF token makes every rendering differ byte for byte
+    return f'W/"{digest}"'
+
+
+def page_product(request, product_slug):
+    """The product of a product page, read once for its ETag and the view"""
+    product = getattr(request, 'product', None)
+    if product is None or product.slug != product_slug:
+        product = request.product = product_cache.get_or_404(slug=product_slug)
+    return product
+
+
+def catalog_etag(request, *args, **kwargs):
+    visitor = _visitor(request)
+    if visitor is None:
+        return None
+    return _etag(catalog.get_version(), *visitor)
+
+
+def catalog_last_modified(request, *args, **kwargs):
+    if _visitor(request) != (0, 0):
+        return None
+    return catalog.last_modified()
+
+
+def product_etag(request, product_slug):
+    visitor = _visitor(request)
+    if visitor is None:
+        return None
+    product = page_product(request, product_slug)
+    return _etag(catalog.get_version(), *visitor, product.pk, product.quantity_available)
+
+
+def conditional_page(etag_func, last_modified_func=None):
+    """
+    Decorator answering conditional GETs of a view from etag_func and
+    last_modified_func, see the module docstring
+    """
+    def decorator(view):
+        view = condition(etag_func=etag_func, last_modified_func=last_modified_func)(view)
+        return vary_on_cookie(cache_control(private=True, no_cache=True)(view))
+    return decorator
+
+
+catalog_page = conditional_page(catalog_etag, catalog_last_modified)
+product_page = conditional_page(product_etag)
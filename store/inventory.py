@@ -0,0 +1,204 @@
+"""
+Inventory reservations
+
+When a signed-in customer opens the checkout, the units in their
+cart are moved out of Product.quantity_available into StockReservation
+rows that expire after HOLD_MINUTES. Guests hold nothing, so anonymous
+traffic cannot lock up stock. Two checkouts can therefore never
+both count on the same units: whoever holds the stock first gets it,
+the other sees the shortage straight away.
+
+A hold ends in one of three ways:
+    - complete_order claims it, the order keeps the units
+    - it is released, the cart changed or the payment failed
+    - it expires and the release_expired_reservations sweeper hands
+      the units back
+
+Every change to the stock is a conditional F() UPDATE, and a hold
+only returns its units after its own row was deleted, so a hold can
+never be both claimed and released, or released twice.
+"""
+
+from collections import defaultdict
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Case, F, IntegerField, Value, When
+from django.utils import timezone
+
+from . import product_cache
+from .models import Product, StockReservation
+
+
+HOLD_MINUTES = getattr(settings, 'STOCK_HOLD_MINUTES', 15)
+
+# Session flag, so that sessions without holds skip the release query
+SESSION_FLAG = 'stock_held'
+
+
+class HoldsChanged(Exception):
+    """A hold expired and was swept while it was being claimed"""
+
+
+def _quantity_case(quantities):
+    return Case(
+        *[When(pk=product_id, then=Value(quantity)) for product_id, quantity in quantities.items()],
+        output_field=IntegerField(),
+    )
+
+
+def take_stock(quantities):
+    """
+    Take stock for several products in one guarded UPDATE
+
+    Args:
+        quantities (dict): product id -> units
+
+    Returns:
+        bool: False if any product is short, in which case the caller
+        must roll back the partial UPDATE
+    """
+    quantities = {product_id: quantity for product_id, quantity in quantities.items() if quantity > 0}
+    if not quantities:
+        return True
+    quantity = _quantity_case(quantities)
+    updated = Product.objects.filter(pk__in=quantities, quantity_available__gte=quantity).update(
+        quantity_available=F('quantity_available') - quantity
+    )
+    product_cache.invalidate(quantities)
+    return updated == len(quantities)
+
+
+def return_stock(quantities):
+    """Put units back in stock, in one UPDATE"""
+    quantities = {product_id: quantity for product_id, quantity in quantities.items() if quantity > 0}
+    if not quantities:
+        return
+    Product.objects.filter(pk__in=quantities).update(
+        quantity_available=F('quantity_available') + _quantity_case(quantities)
+    )
+    product_cache.invalidate(quantities)
+
+
+def _release(reservations):
+    """Delete the given holds and return the units of those this call deleted"""
+    returned = defaultdict(int)
+    for reservation in reservations:
+        # Only the caller that actually deletes the row gives the units back
+        if StockReservation.objects.filter(pk=reservation.pk).delete()[0]:
+            returned[reservation.product_id] += reservation.quantity
+    return_stock(returned)
+    return sum(returned.values())
+
+
+def _session_key(request):
+    """The session key, saving a brand new session so that it has one"""
+    if not request.session.session_key:
+        request.session.save()
+    return request.session.session_key
+
+
+def hold_key(request):
+    """The key this session's holds are stored under, or None without holds"""
+    if not request.session.get(SESSION_FLAG):
+        return None
+    return request.session.session_key
+
+
+def release_holds(request):
+    """Hand back every unit held by this session"""
+    key = hold_key(request)
+    if key is None:
+        return 0
+    with transaction.atomic():
+        released = _release(StockReservation.objects.select_for_update().filter(session_key=key))
+    del request.session[SESSION_FLAG]
+    return released
+
+
+def hold_cart(request, lines):
+    """
+    Hold stock for every cart line, replacing any earlier holds
+
+    Args:
+        request: Current request
+        lines (list): Cart line items
+
+    Returns:
+        bool: True if the whole cart is held, False if something is
+        short, in which case nothing is held
+    """
+    release_holds(request)
+    quantities = {line['product'].pk: line['qty'] for line in lines}
+    if not quantities:
+        return True
+    key = _session_key(request)
+    expires_at = timezone.now() + timedelta(minutes=HOLD_MINUTES)
+    with transaction.atomic():
+        if not take_stock(quantities):
+            transaction.set_rollback(True)
+            return False
+        StockReservation.objects.bulk_create([
+            StockReservation(product_id=product_id, session_key=key, quantity=quantity, expires_at=expires_at)
+            for product_id, quantity in quantities.items()
+        ])
+    request.session[SESSION_FLAG] = True
+    return True
+
+
+def holds_claimed(request):
+    """Forget the session's holds once an order has claimed them"""
+    request.session.pop(SESSION_FLAG, None)
+
+
+def held_quantities(key):
+    """Units currently held under a session key, by product id"""
+    if key is None:
+        return {}
+    return dict(StockReservation.objects.filter(session_key=key).values_list('product_id', 'quantity'))
+
+
+def claim_holds(key):
+    """
+    Consume the holds of a session for the order being placed
+
+    Holds past their expiry are claimed too, as long as the sweeper
+    has not released them yet their units are still out of stock.
+    Must run inside the order's transaction, so a failed order puts
+    the holds back. Raises HoldsChanged if the sweeper released one
+    of them meanwhile, the caller should then roll back and retry.
+
+    Args:
+        key (str): Session key the holds were made under
+
+    Returns:
+        dict: product id -> units that are already out of stock
+    """
+    reservations = list(StockReservation.objects.select_for_update().filter(session_key=key))
+    if not reservations:
+        return {}
+    deleted = StockReservation.objects.filter(pk__in=[reservation.pk for reservation in reservations]).delete()[0]
+    if deleted != len(reservations):
+        raise HoldsChanged()
+    return {reservation.product_id: reservation.quantity for reservation in reservations}
+
+
+def release_expired(batch_size=500):
+    """
+    Hand back the units of every expired hold
+
+    Returns:
+        int: Units put back in stock
+    """
+    released = 0
+    while True:
+        with transaction.atomic():
+            batch = list(
+                StockReservation.objects.select_for_update(skip_locked=True)
+                .filter(expires_at__lte=timezone.now())
+                .order_by('expires_at')[:batch_size]
+            )
+            released += _release(batch)
+        if len(batch) < batch_size:
+            return released
@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from store import rankings
+
+
+class Command(BaseCommand):
+    help = 'Decay the best-seller and trending scores and fold in new orders'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--reset', action='store_true', help='Rebuild the scores from every order')
+
+    def handle(self, *args, **options):
+        products = rankings.build(reset=options['reset'])
+        self.stdout.write(self.style.SUCCESS(f'Updated the rankings, {products} product(s) had new sales.'))
@@ -0,0 +1,28 @@
+from django.core.management.base import BaseCommand
+
+from store import recommendations
+
+
+class Command(BaseCommand):
+    help = 'Fold new orders into the "frequently bought together" recommendations'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=recommendations.CHUNK_SIZE, help='Orders folded in per transaction')
+        parser.add_argument('--metric', choices=recommendations.METRICS, default=recommendations.METRIC, help='How pairs of products are scored')
+        parser.add_argument('--top', type=int, default=recommendations.TOP_K, help='Recommendations kept per product')
+        parser.add_argument('--rescore-all', action='store_true', help='Rescore every product, not only the ones new orders affect')
+        parser.add_argument('--reset', action='store_true', help='Drop the pair counts and start again from the first order')
+
+    def handle(self, *args, **options):
+        def progress(last_order_id, orders):
+            self.stdout.write(f'Up to order #{last_order_id}: {orders} order(s)')
+
+        orders, written = recommendations.build(
+            chunk_size=options['chunk_size'],
+            reset=options['reset'],
+            rescore_all=options['rescore_all'],
+            metric=options['metric'],
+            top_k=options['top'],
+            progress=progress,
+        )
+        self.stdout.write(self.style.SUCCESS(f'Folded in {orders} order(s), wrote {written} recommendation(s).'))
@@ -0,0 +1,41 @@
+from concurrent.futures import as_completed
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from store import catalog, thumbnails
+from store.models import Product
+
+
+class Command(BaseCommand):
+    help = 'Generate responsive image variants for products that have none'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--all', action='store_true', help='Regenerate variants for every product')
+
+    def handle(self, *args, **options):
+        products = Product.objects.exclude(image='')
+        if not options['all']:
+            products = products.filter(image_variants={})
+
+        executor = thumbnails.get_executor()
+        futures = {}
+        for product_id, image_name in products.values_list('id', 'image').iterator():
+            source_path = Product._meta.get_field('image').storage.path(image_name)
+            future = executor.submit(thumbnails.render_variants, source_path, str(settings.MEDIA_ROOT))
+            futures[future] = (product_id, image_name)
+
+        done = 0
+        for future in as_completed(futures):
+            product_id, image_name = futures[future]
+            try:
+                variants = future.result()
+            except Exception as e:
+                self.stderr.write(f'Product {product_id}: {e}')
+                continue
+            Product.objects.filter(pk=product_id, image=image_name).update(image_variants=variants)
+            done += 1
+
+        if done:
+            catalog.bump_version()
+        self.stdout.write(self.style.SUCCESS(f'Generated image variants for {done} product(s).'))
@@ -0,0 +1,36 @@
+from django.core.management.base import BaseCommand
+
+from store import synthetic
+
+
+class Command(BaseCommand):
+    help = 'Fill the database with a synthetic catalog, customers and order history for load testing'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--products', type=int, default=1000, help='Products to create')
+        parser.add_argument('--categories', type=int, default=20, help='Categories to spread them over')
+        parser.add_argument('--brands', type=int, default=50, help='Distinct brands')
+        parser.add_argument('--users', type=int, default=200, help='Registered customers')
+        parser.add_argument('--orders', type=int, default=2000, help='Orders, about a fifth of them by guests')
+        parser.add_argument('--max-items', type=int, default=5, help='Most items per order')
+        parser.add_argument('--seed', type=int, default=None, help='Random seed, for a reproducible data set')
+        parser.add_argument('--batch-size', type=int, default=synthetic.BATCH_SIZE, help='Rows per INSERT')
+        parser.add_argument('--no-rewards', action='store_true', help='Do not award rewards for the orders')
+
+    def handle(self, *args, **options):
+        summary = synthetic.generate(
+            products=options['products'],
+            categories=options['categories'],
+            brands=options['brands'],
+            users=options['users'],
+            orders=options['orders'],
+            max_items=options['max_items'],
+            seed=options['seed'],
+            batch_size=options['batch_size'],
+            rewards=not options['no_rewards'],
+            progress=self.stdout.write,
+        )
+        self.stdout.write(self.style.SUCCESS(
+            f"Run {summary['token']}: created {summary['products']} products, {summary['users']} users, "
+            f"{summary['orders']} orders. Customers log in with password '{synthetic.PASSWORD}'."
+        ))
@@ -0,0 +1,21 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from store import inventory
+
+
+class Command(BaseCommand):
+    help = 'Put the stock of expired checkout reservations back on sale'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500, help='Reservations released per transaction')
+        parser.add_argument('--loop', type=int, default=0, metavar='SECONDS', help='Keep sweeping every SECONDS instead of running once')
+
+    def handle(self, *args, **options):
+        while True:
+            released = inventory.release_expired(batch_size=options['batch_size'])
+            self.stdout.write(self.style.SUCCESS(f'Released {released} held unit(s).'))
+            if not options['loop']:
+                return
+            time.sleep(options['loop'])
@@ -0,0 +1,53 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from store import benchmark
+
+
+class Command(BaseCommand):
+    help = 'Benchmark the main views and report latency percentiles and query counts'
+
+    def add_arguments(self, parser):
+        parser.add_argument('scenarios', nargs='*', help=f"Scenarios to run, all by default: {', '.join(benchmark.SCENARIOS)}")
+        parser.add_argument('--requests', type=int, default=50, help='Measured requests per scenario')
+        parser.add_argument('--warmup', type=int, default=5, help='Unmeasured requests before them')
+        parser.add_argument('--wsgi', action='store_true', help='Send requests over HTTP to a local WSGI server instead of the test client')
+        parser.add_argument('--json', metavar='PATH', help='Write the results as JSON to PATH')
+        parser.add_argument('--compare', metavar='PATH', help='Fail on regressions against the JSON results in PATH')
+        parser.add_argument('--tolerance', type=float, default=0.2, help='p95 slowdown tolerated by --compare, 0.2 for 20%%')
+
+    def handle(self, *args, **options):
+        unknown = set(options['scenarios']) - set(benchmark.SCENARIOS)
+        if unknown:
+            raise CommandError(f"Unknown scenario(s): {', '.join(sorted(unknown))}")
+
+        self.stdout.write(f"{'scenario':<16} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'queries':>9} {'errors':>7}")
+
+        def progress(name, summary):
+            queries = summary['queries_max'] if summary['queries_min'] == summary['queries_max'] else f"{summary['queries_min']}-{summary['queries_max']}"
+            self.stdout.write(
+                f"{name:<16} {summary['p50_ms']:>9.2f} {summary['p95_ms']:>9.2f} {summary['p99_ms']:>9.2f} "
+                f"{queries:>9} {summary['errors']:>7}"
+            )
+
+        try:
+            results = benchmark.run(
+                scenarios=options['scenarios'],
+                requests=options['requests'],
+                warmup=options['warmup'],
+                mode='wsgi' if options['wsgi'] else 'client',
+                progress=progress,
+            )
+        except ValueError as e:
+            raise CommandError(str(e))
+
+        if options['json']:
+            benchmark.save(results, options['json'])
+            self.stdout.write(f"Results written to {options['json']}")
+
+        if options['compare']:
+            regressions = benchmark.compare(benchmark.load(options['compare']), results, options['tolerance'])
+            for name, message in regressions:
+                self.stderr.write(f'{name}: {message}')
+            if regressions:
+                raise CommandError(f'{len(regressions)} regression(s) against {options["compare"]}')
+            self.stdout.write(self.style.SUCCESS('No regressions.'))
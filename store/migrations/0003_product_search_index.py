@@ -0,0 +1,39 @@
+from django.db import migrations
+
+
+# FTS5 copy of each product's title, brand and description, kept in
+# sync by the triggers of migration 0010
+FORWARDS = [
+    "CREATE VIRTUAL TABLE store_product_fts USING fts5("
+    "title, brand, description, "
+    "tokenize='unicode61 remove_diacritics 2', prefix='2 3')",
+    "INSERT INTO store_product_fts(rowid, title, brand, description) "
+    "SELECT id, title, brand, description FROM store_product",
+]
+
+BACKWARDS = [
+    "DROP TABLE IF EXISTS store_product_fts",
+]
+
+
+class SQLiteRunSQL(migrations.RunSQL):
+    """RunSQL that other database backends skip, they search with icontains"""
+
+    def database_forwards(self, app_label, schema_editor, from_state, to_state):
+        if schema_editor.connection.vendor == 'sqlite':
+            super().database_forwards(app_label, schema_editor, from_state, to_state)
+
+    def database_backwards(self, app_label, schema_editor, from_state, to_state):
+        if schema_editor.connection.vendor == 'sqlite':
+            super().database_backwards(app_label, schema_editor, from_state, to_state)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('store', '0002_product_date_uploaded_product_last_sold_date_and_more'),
+    ]
+
+    operations = [
+        SQLiteRunSQL(FORWARDS, BACKWARDS),
+    ]
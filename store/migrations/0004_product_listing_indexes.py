@@ -0,0 +1,21 @@
+# Generated by Django 6.0 on 2026-10-16 20:52
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('store', '0003_product_search_index'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(fields=['date_uploaded', 'id'], name='product_uploaded_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(fields=['category', 'date_uploaded', 'id'], name='product_cat_uploaded_id_idx'),
+        ),
+    ]
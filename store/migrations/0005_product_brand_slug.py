@@ -0,0 +1,30 @@
+# Generated by Django 6.0 on 2026-10-16 20:52
+
+from django.db import migrations, models
+from django.utils.text import slugify
+
+
+def populate_brand_slug(apps, schema_editor):
+    Product = apps.get_model('store', 'Product')
+    for brand in Product.objects.values_list('brand', flat=True).distinct():
+        Product.objects.filter(brand=brand).update(brand_slug=slugify(brand))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('store', '0004_product_listing_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='product',
+            name='brand_slug',
+            field=models.SlugField(default='', editable=False, help_text='Normalized brand used in brand URLs, set on save', max_length=250),
+        ),
+        migrations.RunPython(populate_brand_slug, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(fields=['brand_slug', 'date_uploaded', 'id'], name='product_brand_uploaded_id_idx'),
+        ),
+    ]
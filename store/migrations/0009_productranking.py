@@ -0,0 +1,32 @@
+# Generated by Django 6.0 on 2026-10-16 22:30
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('store', '0008_productpaircount_productrecommendation'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ProductRanking',
+            fields=[
+                ('product', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='ranking', serialize=False, to='store.product')),
+                ('best_seller', models.FloatField(default=0)),
+                ('trending', models.FloatField(default=0)),
+                ('category', models.ForeignKey(null=True, on_delete=django.db.models.deletion.CASCADE, related_name='+', to='store.category')),
+            ],
+            options={
+                'verbose_name_plural': 'product rankings',
+                'indexes': [
+                    models.Index(fields=['best_seller', 'product'], name='ranking_best_seller_idx'),
+                    models.Index(fields=['trending', 'product'], name='ranking_trending_idx'),
+                    models.Index(fields=['category', 'best_seller', 'product'], name='ranking_cat_best_seller_idx'),
+                    models.Index(fields=['category', 'trending', 'product'], name='ranking_cat_trending_idx'),
+                ],
+            },
+        ),
+    ]
@@ -0,0 +1,54 @@
+# Generated by Django 6.0 on 2026-10-16 23:58
+
+from django.db import migrations
+
+
+# Keep store_product_fts in step with every write to store_product,
+# bulk writes and raw SQL included. SQLite drops a table's triggers
+# when a migration rebuilds it, so a later migration that alters
+# store_product has to create them again
+FORWARDS = [
+    "DELETE FROM store_product_fts",
+    "INSERT INTO store_product_fts(rowid, title, brand, description) "
+    "SELECT id, title, brand, description FROM store_product",
+    "CREATE TRIGGER store_product_fts_insert AFTER INSERT ON store_product BEGIN "
+    "INSERT INTO store_product_fts(rowid, title, brand, description) "
+    "VALUES (new.id, new.title, new.brand, new.description); "
+    "END",
+    "CREATE TRIGGER store_product_fts_update AFTER UPDATE OF title, brand, description ON store_product BEGIN "
+    "UPDATE store_product_fts SET title = new.title, brand = new.brand, description = new.description "
+    "WHERE rowid = new.id; "
+    "END",
+    "CREATE TRIGGER store_product_fts_delete AFTER DELETE ON store_product BEGIN "
+    "DELETE FROM store_product_fts WHERE rowid = old.id; "
+    "END",
+]
+
+BACKWARDS = [
+    "DROP TRIGGER IF EXISTS store_product_fts_delete",
+    "DROP TRIGGER IF EXISTS store_product_fts_update",
+    "DROP TRIGGER IF EXISTS store_product_fts_insert",
+]
+
+
+class SQLiteRunSQL(migrations.RunSQL):
+    """RunSQL that other database backends skip, they search with icontains"""
+
+    def database_forwards(self, app_label, schema_editor, from_state, to_state):
+        if schema_editor.connection.vendor == 'sqlite':
+            super().database_forwards(app_label, schema_editor, from_state, to_state)
+
+    def database_backwards(self, app_label, schema_editor, from_state, to_state):
+        if schema_editor.connection.vendor == 'sqlite':
+            super().database_backwards(app_label, schema_editor, from_state, to_state)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('store', '0009_productranking'),
+    ]
+
+    operations = [
+        SQLiteRunSQL(FORWARDS, BACKWARDS),
+    ]
@@ -1,6 +1,7 @@
 from django.db import models
 from django.urls import reverse
 from django.utils import timezone
+from django.utils.text import slugify
 
 
 class Category(models.Model):
@@ -30,10 +31,12 @@ class Product(models.Model):
     category = models.ForeignKey(Category, related_name='product', on_delete=models.CASCADE, null=True)
     title = models.CharField(max_length=250)
     brand = models.CharField(max_length=250, default='un-branded')
+    brand_slug = models.SlugField(max_length=250, default='', editable=False, help_text="Normalized brand used in brand URLs, set on save")
     description = models.TextField(blank=True)
     slug = models.SlugField(max_length=255)
     price = models.DecimalField(max_digits=4, decimal_places=2)
     image = models.ImageField(upload_to='images/')
+    image_variants = models.JSONField(default=dict, blank=True, editable=False, help_text="Resized copies of the image, filled in by store/thumbnails.py")
 
     '''
     The variable image can be done in one of two ways.
@@ -53,12 +56,26 @@ class Product(models.Model):
 
     class Meta:
         verbose_name_plural = 'products'
+        indexes = [
+            # Keyset pagination of listings, newest first
+            models.Index(fields=['date_uploaded', 'id'], name='product_uploaded_id_idx'),
+            models.Index(fields=['category', 'date_uploaded', 'id'], name='product_cat_uploaded_id_idx'),
+            models.Index(fields=['brand_slug', 'date_uploaded', 'id'], name='product_brand_uploaded_id_idx'),
+        ]
 
     def __str__(self):
         return self.title
 
     def get_absolute_url(self):
         return reverse('product-info', args=[self.slug])
+
+    def save(self, *args, **kwargs):
+        # Keep the indexed brand key in step with the brand name
+        self.brand_slug = slugify(self.brand)
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and 'brand' in update_fields:
+            kwargs['update_fields'] = {*update_fields, 'brand_slug'}
+        super().save(*args, **kwargs)
     
     def is_in_stock(self):
         """Check if product is in stock"""
@@ -69,14 +86,115 @@ class Product(models.Model):
         return self.quantity_available >= requested_quantity
     
     def process_sale(self, quantity, total_amount):
-        """Update product after a successful sale"""
-        if self.can_fulfill_order(quantity):
-            self.quantity_available -= quantity
-            self.quantity_sold += quantity
-            self.total_price_sold += total_amount
-            self.last_sold_date = timezone.now()
-            self.payment_successful = True
-            self.save()
+        """
+        Update product after a successful sale
+
+        A single conditional UPDATE, so concurrent sales can neither
+        overwrite each other's counters nor take the stock below zero.
+        """
+        now = timezone.now()
+        updated = Product.objects.filter(pk=self.pk, quantity_available__gte=quantity).update(
+            quantity_available=models.F('quantity_available') - quantity,
+            quantity_sold=models.F('quantity_sold') + quantity,
+            total_price_sold=models.F('total_price_sold') + total_amount,
+            last_sold_date=now,
+            payment_successful=True,
+        )
+        if updated:
+            from .product_cache import invalidate
+            invalidate([self.pk])
+            self.refresh_from_db(fields=['quantity_available', 'quantity_sold', 'total_price_sold', 'last_sold_date', 'payment_successful'])
             return True
         return False
 
+
+class StockReservation(models.Model):
+    """
+    Stock held back for a checkout in progress
+
+    The held units are already taken out of Product.quantity_available,
+    they are either claimed by the order or handed back when the hold
+    is released or expires. See store/inventory.py.
+    """
+    product = models.ForeignKey(Product, related_name='reservations', on_delete=models.CASCADE)
+    session_key = models.CharField(max_length=40, db_index=True)
+    quantity = models.PositiveIntegerField()
+    created_at = models.DateTimeField(auto_now_add=True)
+    expires_at = models.DateTimeField(db_index=True)
+
+    class Meta:
+        verbose_name_plural = 'stock reservations'
+        constraints = [
+            models.UniqueConstraint(fields=['session_key', 'product'], name='unique_session_product_reservation'),
+        ]
+
+    def __str__(self):
+        return f'{self.quantity} x {self.product_id} held for {self.session_key}'
+
+
+class ProductPairCount(models.Model):
+    """
+    How many orders contained both products, for product_id <= other_id
+
+    The diagonal, product == other, counts the orders that contained the
+    product at all. Maintained by store/recommendations.py.
+    """
+    product = models.ForeignKey(Product, related_name='+', on_delete=models.CASCADE)
+    other = models.ForeignKey(Product, related_name='+', on_delete=models.CASCADE)
+    orders = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        verbose_name_plural = 'product pair counts'
+        constraints = [
+            models.UniqueConstraint(fields=['product', 'other'], name='unique_product_pair'),
+        ]
+
+    def __str__(self):
+        return f'{self.product_id} + {self.other_id} in {self.orders} order(s)'
+
+
+class ProductRecommendation(models.Model):
+    """
+    A product frequently bought together with another, best first by rank
+    """
+    product = models.ForeignKey(Product, related_name='recommendations', on_delete=models.CASCADE)
+    recommended = models.ForeignKey(Product, related_name='+', on_delete=models.CASCADE)
+    rank = models.PositiveSmallIntegerField()
+    score = models.FloatField()
+
+    class Meta:
+        verbose_name_plural = 'product recommendations'
+        constraints = [
+            # Also the index product_info reads the top K through
+            models.UniqueConstraint(fields=['product', 'rank'], name='unique_product_recommendation_rank'),
+        ]
+
+    def __str__(self):
+        return f'#{self.rank} for {self.product_id}: {self.recommended_id}'
+
+
+class ProductRanking(models.Model):
+    """
+    Time-decayed popularity of a product, maintained by store/rankings.py
+
+    best_seller and trending are units sold, each unit weighted down by
+    half for every half-life that has passed since its order, a long
+    one for best_seller and a short one for trending.
+    """
+    product = models.OneToOneField(Product, primary_key=True, related_name='ranking', on_delete=models.CASCADE)
+    # Copy of product.category, so category pages rank off these indexes
+    category = models.ForeignKey(Category, related_name='+', on_delete=models.CASCADE, null=True)
+    best_seller = models.FloatField(default=0)
+    trending = models.FloatField(default=0)
+
+    class Meta:
+        verbose_name_plural = 'product rankings'
+        indexes = [
+            models.Index(fields=['best_seller', 'product'], name='ranking_best_seller_idx'),
+            models.Index(fields=['trending', 'product'], name='ranking_trending_idx'),
+            models.Index(fields=['category', 'best_seller', 'product'], name='ranking_cat_best_seller_idx'),
+            models.Index(fields=['category', 'trending', 'product'], name='ranking_cat_trending_idx'),
+        ]
+
+    def __str__(self):
+        return f'{self.product_id}: best seller {self.best_seller:.2f}, trending {self.trending:.2f}'
@@ -0,0 +1,124 @@
+"""
+Keyset (cursor) pagination for listings
+
+Product listings are ordered newest first by (date_uploaded, id).
+Instead of a page number, the next / previous links carry an opaque
+cursor that encodes the (date_uploaded, id) of the last / first
+product shown, and the following page is fetched with a range
+condition on those two columns. Every page therefore costs one
+indexed range scan of page_size + 1 rows, however deep it is, with
+no OFFSET and no COUNT(*).
+
+Other listings page the same way on their own timestamp column, see
+the date_field argument of paginate(). Listings sorted by a score
+(see store/rankings.py) pass the score as date_field, with float as
+the parse function for its cursors.
+"""
+
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+from django.utils.encoding import force_bytes, force_str
+from django.utils.http import urlsafe_base64_decode, urlsafe_base64_encode
+
+
+PAGE_SIZE = 20
+
+
+def encode_cursor(obj, date_field='date_uploaded'):
+    value = getattr(obj, date_field)
+    value = value.isoformat() if hasattr(value, 'isoformat') else repr(value)
+    return urlsafe_base64_encode(force_bytes(f'{value}|{obj.pk}'))
+
+
+def decode_cursor(cursor, parse=parse_datetime):
+    """Return (timestamp, id) from a cursor, or None if it is malformed"""
+    try:
+        date_value, pk = force_str(urlsafe_base64_decode(cursor)).split('|')
+        timestamp = parse(date_value)
+        pk = int(pk)
+    except (TypeError, ValueError):
+        return None
+    if timestamp is None:
+        return None
+    return timestamp, pk
+
+
+class KeysetPage:
+    """
+    One page of a keyset-paginated listing
+    """
+
+    def __init__(self, object_list, has_next, has_previous, date_field='date_uploaded', query=''):
+        self.object_list = object_list
+        self.has_next = has_next
+        self.has_previous = has_previous
+        self.date_field = date_field
+        # The request's other query parameters, such as the sort, for
+        # the next / previous links to keep
+        self.query = query
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def __bool__(self):
+        return bool(self.object_list)
+
+    @property
+    def next_cursor(self):
+        if self.has_next and self.object_list:
+            return encode_cursor(self.object_list[-1], self.date_field)
+        return None
+
+    @property
+    def previous_cursor(self):
+        if self.has_previous and self.object_list:
+            return encode_cursor(self.object_list[0], self.date_field)
+        return None
+
+
+def paginate(queryset, request, page_size=PAGE_SIZE, date_field='date_uploaded', parse=parse_datetime):
+    """
+    Return the KeysetPage of queryset selected by the request's
+    'after' or 'before' cursor, newest first
+
+    Args:
+        queryset: Queryset, already filtered
+        request: Current request
+        page_size (int): Rows per page
+        date_field (str): Timestamp the rows are ordered by, ties are
+            broken on the primary key
+        parse (callable): Reads the date_field value of a cursor back
+    """
+    after = decode_cursor(request.GET.get('after', ''), parse)
+    before = None if after else decode_cursor(request.GET.get('before', ''), parse)
+    params = request.GET.copy()
+    params.pop('after', None)
+    params.pop('before', None)
+    query = params.urlencode()
+
+    if before:
+        # Walk backwards from the cursor, then flip the rows back into
+        # display order
+        timestamp, pk = before
+        rows = list(
+            queryset.filter(**{f'{date_field}__gte': timestamp})
+            .filter(Q(**{f'{date_field}__gt': timestamp}) | Q(**{date_field: timestamp, 'id__gt': pk}))
+            .order_by(date_field, 'id')[:page_size + 1]
+        )
+        has_previous = len(rows) > page_size
+        rows = rows[:page_size]
+        rows.reverse()
+        return KeysetPage(rows, has_next=True, has_previous=has_previous, date_field=date_field, query=query)
+
+    queryset = queryset.order_by(f'-{date_field}', '-id')
+    if after:
+        timestamp, pk = after
+        queryset = (
+            queryset.filter(**{f'{date_field}__lte': timestamp})
+            .filter(Q(**{f'{date_field}__lt': timestamp}) | Q(**{date_field: timestamp, 'id__lt': pk}))
+        )
+    rows = list(queryset[:page_size + 1])
+    return KeysetPage(rows[:page_size], has_next=len(rows) > page_size, has_previous=bool(after), date_field=date_field, query=query)
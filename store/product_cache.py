@@ -0,0 +1,99 @@
+"""
+Read-through Product cache
+
+Product pages, the cart views and cart resolution look products up
+by slug or id on every request, mostly the same few popular ones.
+get(), get_by_slug() and get_many() answer those lookups from
+Django's cache and only read the products they miss, get_many() in
+one query for all of them.
+
+Products are cached under their id and the catalog version (see
+store/catalog.py), and slugs map to ids, so a product is stored once
+however it is looked up. Saving or deleting a product or a category
+bumps the catalog version, which drops every cached product at once.
+Stock changes are conditional UPDATEs that skip save() and leave the
+version alone: the functions making them call invalidate() for the
+products they touched.
+
+A cached product can be a little behind the database, by up to
+PRODUCT_CACHE_TIMEOUT seconds when processes do not share the cache.
+That is fine for display and for the early stock checks of the cart,
+but the stock itself is only ever taken by guarded UPDATEs, never on
+the strength of a cached quantity.
+"""
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.http import Http404
+
+from . import catalog
+from .models import Product
+
+
+TIMEOUT = getattr(settings, 'PRODUCT_CACHE_TIMEOUT', 5 * 60)
+
+
+def _key(version, pk):
+    return f'store:product:{version}:{pk}'
+
+
+def _slug_key(version, slug):
+    return f'store:product-slug:{version}:{slug}'
+
+
+def get_many(ids):
+    """
+    Return the products with the given ids, reading only the ones
+    missing from the cache, in one query
+
+    Args:
+        ids (iterable): Product ids
+
+    Returns:
+        dict: id -> Product, without the ids that do not exist
+    """
+    version = catalog.get_version()
+    keys = {_key(version, pk): pk for pk in ids}
+    products = {keys[key]: product for key, product in cache.get_many(keys).items()}
+    missing = [pk for pk in keys.values() if pk not in products]
+    if missing:
+        fetched = Product.objects.in_bulk(missing)
+        cache.set_many({_key(version, pk): product for pk, product in fetched.items()}, TIMEOUT)
+        products.update(fetched)
+    return products
+
+
+def get(pk):
+    """Return the product with the given id, or None"""
+    return get_many([pk]).get(pk)
+
+
+def get_by_slug(slug):
+    """Return the product with the given slug, or None"""
+    version = catalog.get_version()
+    pk = cache.get(_slug_key(version, slug))
+    if pk is not None:
+        product = get(pk)
+        # The slug may have moved to another product since
+        if product is not None and product.slug == slug:
+            return product
+    product = Product.objects.filter(slug=slug).first()
+    if product is not None:
+        cache.set_many({_slug_key(version, slug): product.pk, _key(version, product.pk): product}, TIMEOUT)
+    return product
+
+
+def get_or_404(pk=None, slug=None):
+    """get() or get_by_slug(), raising Http404 for a missing product"""
+    product = get(pk) if slug is None else get_by_slug(slug)
+    if product is None:
+        raise Http404('No Product matches the given query.')
+    return product
+
+
+def invalidate(ids):
+    """Drop the given products from the cache once the current transaction commits"""
+    ids = list(ids)
+    if ids:
+        transaction.on_commit(lambda: cache.delete_many([_key(catalog.get_version(), pk) for pk in ids]))
@@ -0,0 +1,163 @@
+"""
+Best-seller and trending rankings
+
+Sorting a listing by Product.quantity_sold would ignore when the
+units were sold, so a product that sold well years ago stays on top
+forever. ProductRanking instead keeps two time-decayed unit counts
+per product: every unit counts for half as much for every half-life
+that has passed since it was ordered, BEST_SELLER_HALF_LIFE days for
+best_seller and TRENDING_HALF_LIFE days for trending.
+
+Exponential decay can be applied incrementally, so build() (the
+build_rankings management command) never rereads old orders. Each
+run, in one transaction:
+
+    - multiplies every stored score by the decay for the time since
+      the last run, in one UPDATE that also refreshes the category
+      copied from the product
+    - adds a zero row for every product that has none yet
+    - adds the decayed units of the orders placed since the last run,
+      summed per product and day in one grouped query
+    - moves the checkpoint to the newest order it folded in
+
+and then bumps the catalog version, so cached and conditional pages
+pick the new order up.
+
+The store and category pages sort by a score with ?sort=best-sellers
+or ?sort=trending, see ranked(). The page is read in index order from
+ProductRanking, keyset-paginated on (score, product id) like the
+newest-first listings. Products added since the last run are not in
+the ranked listings until the next one.
+"""
+
+from datetime import datetime, time, timezone as dt_timezone
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Exists, F, Max, OuterRef, Subquery, Sum
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from account.models import BackfillCheckpoint
+from payment.models import Order, OrderItem
+
+from . import catalog
+from .models import Product, ProductRanking
+from .pagination import paginate
+
+
+CHECKPOINT = 'product-rankings'
+
+BEST_SELLER_HALF_LIFE = getattr(settings, 'RANKING_BEST_SELLER_HALF_LIFE_DAYS', 30)
+TRENDING_HALF_LIFE = getattr(settings, 'RANKING_TRENDING_HALF_LIFE_DAYS', 3)
+
+# ?sort= value -> ProductRanking score
+SORTS = {
+    'best-sellers': 'best_seller',
+    'trending': 'trending',
+}
+
+BATCH_SIZE = 500
+
+
+def decay(days, half_life):
+    """Weight of a unit sold days ago"""
+    return 0.5 ** (max(days, 0) / half_life)
+
+
+def _new_sales(after, upto, now):
+    """
+    Decayed units per product of the orders in (after, upto]
+
+    Returns:
+        dict: product_id -> (best_seller, trending)
+    """
+    rows = (
+        OrderItem.objects.filter(order_id__gt=after, order_id__lte=upto, product__isnull=False)
+        .values('product_id', day=TruncDate('order__date_ordered'))
+        .annotate(units=Sum('quantity'))
+        .order_by()
+    )
+    sales = {}
+    for row in rows.iterator(chunk_size=BATCH_SIZE * 4):
+        # Units of a day count as sold at its midday
+        midday = datetime.combine(row['day'], time(12), tzinfo=dt_timezone.utc)
+        days = (now - midday).total_seconds() / 86400
+        best_seller, trending = sales.get(row['product_id'], (0.0, 0.0))
+        sales[row['product_id']] = (
+            best_seller + row['units'] * decay(days, BEST_SELLER_HALF_LIFE),
+            trending + row['units'] * decay(days, TRENDING_HALF_LIFE),
+        )
+    return sales
+
+
+def build(reset=False):
+    """
+    Decay the stored scores to now and fold in the orders placed since
+    the last run
+
+    Args:
+        reset (bool): Drop the scores and rebuild them from every order
+
+    Returns:
+        int: Products whose scores got new sales
+    """
+    now = timezone.now()
+    checkpoint, created = BackfillCheckpoint.objects.get_or_create(name=CHECKPOINT)
+    after = 0 if reset else checkpoint.last_pk
+    upto = Order.objects.aggregate(last=Max('pk'))['last'] or 0
+
+    with transaction.atomic():
+        if reset:
+            ProductRanking.objects.all().delete()
+        elif not created:
+            days = (now - checkpoint.updated_at).total_seconds() / 86400
+            ProductRanking.objects.update(
+                best_seller=F('best_seller') * decay(days, BEST_SELLER_HALF_LIFE),
+                trending=F('trending') * decay(days, TRENDING_HALF_LIFE),
+                category=Subquery(Product.objects.filter(pk=OuterRef('product')).values('category')[:1]),
+            )
+
+        unranked = Product.objects.exclude(Exists(ProductRanking.objects.filter(product=OuterRef('pk'))))
+        ProductRanking.objects.bulk_create(
+            [
+                ProductRanking(product_id=product_id, category_id=category_id)
+                for product_id, category_id in unranked.values_list('pk', 'category_id').iterator(chunk_size=BATCH_SIZE * 4)
+            ],
+            batch_size=BATCH_SIZE,
+        )
+
+        sales = _new_sales(after, upto, now)
+        if sales:
+            current = ProductRanking.objects.in_bulk(list(sales))
+            for product_id, (best_seller, trending) in sales.items():
+                ranking = current.get(product_id)
+                if ranking is not None:
+                    ranking.best_seller += best_seller
+                    ranking.trending += trending
+            ProductRanking.objects.bulk_update(current.values(), ['best_seller', 'trending'], batch_size=BATCH_SIZE)
+
+        # update() skips auto_now, the decay of the next run counts from now
+        BackfillCheckpoint.objects.filter(pk=checkpoint.pk).update(last_pk=upto, updated_at=now)
+        transaction.on_commit(catalog.bump_version)
+    return len(sales)
+
+
+def ranked(request, category=None):
+    """
+    Return the KeysetPage of products for the request's ?sort=, or None
+    when it does not ask for a ranked sort
+
+    Args:
+        request: Current request
+        category (Category): Only rank the products of this category
+    """
+    field = SORTS.get(request.GET.get('sort'))
+    if field is None:
+        return None
+    products = Product.objects.annotate(score=F(f'ranking__{field}'))
+    if category is None:
+        products = products.filter(ranking__isnull=False)
+    else:
+        products = products.filter(ranking__category=category)
+    return paginate(products, request, date_field='score', parse=float)
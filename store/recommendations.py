@@ -0,0 +1,300 @@
+"""
+"Frequently bought together" recommendations
+
+Computing these while a product page renders would mean a self-join
+of OrderItem per request, so they are precomputed by a batch job,
+build() (the build_recommendations management command):
+
+    - OrderItem rows of the orders placed since the last run are
+      streamed in order id order and grouped into baskets, the set of
+      products of each order
+    - each chunk of baskets is turned into a product co-occurrence
+      matrix, as the sparse product X.T @ X of the order x product
+      incidence matrix X when SciPy is installed
+    - the counts are added to ProductPairCount, which keeps the upper
+      triangle of the matrix for every order folded in so far, and
+      the checkpoint moves past the chunk, in one transaction
+    - the products whose counts changed, and their neighbours, whose
+      scores depend on them, are rescored and their top K written to
+      ProductRecommendation
+
+Pairs are scored by cosine similarity, n(a, b) / sqrt(n(a) n(b)), or
+by lift, n(a, b) N / (n(a) n(b)), where n counts orders and N is the
+number of orders folded in. Pairs seen in fewer than
+RECOMMENDATION_MIN_ORDERS orders are ignored, a single shared order
+says little. Scoring is vectorized with NumPy when it is installed.
+
+product_info reads the top K of a product with one indexed query,
+cached against the catalog version, which build() bumps when it has
+written new recommendations.
+
+Runs must not overlap. A run that is stopped keeps the counts it has
+committed; rerun with rescore_all=True (--rescore-all) to rescore
+the products it did not get to.
+"""
+
+import heapq
+import math
+from collections import defaultdict
+from itertools import batched, groupby
+from operator import itemgetter
+
+from django.conf import settings
+from django.db import transaction
+
+from account.models import BackfillCheckpoint
+from payment.models import Order, OrderItem
+
+from . import catalog
+from .models import ProductPairCount, ProductRecommendation
+
+try:
+    import numpy
+except ImportError:  # pragma: no cover - optional dependency
+    numpy = None
+
+try:
+    from scipy import sparse
+except ImportError:  # pragma: no cover - optional dependency
+    sparse = None
+
+
+CHECKPOINT = 'product-recommendations'
+
+METRICS = ('cosine', 'lift')
+
+METRIC = getattr(settings, 'RECOMMENDATION_METRIC', 'cosine')
+TOP_K = getattr(settings, 'RECOMMENDATIONS_PER_PRODUCT', 6)
+MIN_ORDERS = getattr(settings, 'RECOMMENDATION_MIN_ORDERS', 2)
+
+# Orders folded per transaction
+CHUNK_SIZE = 2000
+
+# Rows per INSERT and ids per IN list
+BATCH_SIZE = 500
+
+
+def baskets(after=0, chunk_size=CHUNK_SIZE):
+    """
+    Yield (order_id, product_ids) for every order after the given id,
+    oldest first, streaming the OrderItem rows
+    """
+    rows = (
+        OrderItem.objects.filter(order_id__gt=after, product__isnull=False)
+        .order_by('order_id')
+        .values_list('order_id', 'product_id')
+        .iterator(chunk_size=chunk_size)
+    )
+    for order_id, items in groupby(rows, key=itemgetter(0)):
+        yield order_id, sorted({product_id for _, product_id in items})
+
+
+def cooccurrence(product_baskets):
+    """
+    Count the baskets each pair of products appears in together
+
+    Args:
+        product_baskets (list): Lists of distinct product ids
+
+    Returns:
+        dict: (a, b) -> baskets with both, for a <= b, the diagonal
+            (a, a) counting the baskets with a
+    """
+    if numpy is None or sparse is None:
+        counts = defaultdict(int)
+        for basket in product_baskets:
+            for i, a in enumerate(basket):
+                for b in basket[i:]:
+                    counts[a, b] += 1
+        return counts
+
+    ids = numpy.unique(numpy.fromiter((pk for basket in product_baskets for pk in basket), dtype=numpy.int64))
+    columns = numpy.searchsorted(ids, numpy.fromiter((pk for basket in product_baskets for pk in basket), dtype=numpy.int64))
+    rows = numpy.repeat(numpy.arange(len(product_baskets)), [len(basket) for basket in product_baskets])
+    incidence = sparse.csr_matrix(
+        (numpy.ones(len(columns), dtype=numpy.int32), (rows, columns)),
+        shape=(len(product_baskets), len(ids)),
+    )
+    matrix = sparse.triu(incidence.T @ incidence).tocoo()
+    return dict(zip(zip(ids[matrix.row].tolist(), ids[matrix.col].tolist()), matrix.data.tolist()))
+
+
+def _fold(counts):
+    """Add a chunk's pair counts to ProductPairCount"""
+    existing = dict(
+        ((product_id, other_id), orders)
+        for product_id, other_id, orders in ProductPairCount.objects.filter(
+            product_id__in={a for a, _ in counts}, other_id__in={b for _, b in counts},
+        ).values_list('product_id', 'other_id', 'orders')
+    )
+    ProductPairCount.objects.bulk_create(
+        [ProductPairCount(product_id=a, other_id=b, orders=existing.get((a, b), 0) + n) for (a, b), n in counts.items()],
+        batch_size=BATCH_SIZE,
+        update_conflicts=True,
+        unique_fields=['product', 'other'],
+        update_fields=['orders'],
+    )
+
+
+def _score(together, support_a, support_b, orders, metric):
+    if metric == 'lift':
+        return together * orders / (support_a * support_b)
+    return together / math.sqrt(support_a * support_b)
+
+
+def _top_k(pairs, affected, orders, metric, top_k, min_orders):
+    """
+    Pick the top_k neighbours of every affected product
+
+    Args:
+        pairs (list): (a, b, orders) rows of ProductPairCount
+        affected (set): Product ids to rank neighbours for, None for all
+
+    Returns:
+        list: (product_id, recommended_id, rank, score) tuples
+    """
+    if numpy is None:
+        support = {a: n for a, b, n in pairs if a == b}
+        neighbours = defaultdict(list)
+        for a, b, n in pairs:
+            if a == b or n < min_orders:
+                continue
+            score = _score(n, support[a], support[b], orders, metric)
+            neighbours[a].append((score, -b, b))
+            neighbours[b].append((score, -a, a))
+        return [
+            (product_id, other_id, rank, score)
+            for product_id, candidates in neighbours.items() if affected is None or product_id in affected
+            for rank, (score, _, other_id) in enumerate(heapq.nlargest(top_k, candidates), 1)
+        ]
+
+    a, b, n = (numpy.asarray(column, dtype=numpy.int64) for column in zip(*pairs))
+    diagonal = a == b
+    ids, support = a[diagonal], n[diagonal].astype(numpy.float64)
+    keep = ~diagonal & (n >= min_orders)
+    # Both directions of every pair
+    source = numpy.concatenate([a[keep], b[keep]])
+    target = numpy.concatenate([b[keep], a[keep]])
+    together = numpy.concatenate([n[keep], n[keep]]).astype(numpy.float64)
+    if affected is not None:
+        wanted = numpy.isin(source, numpy.fromiter(affected, dtype=numpy.int64))
+        source, target, together = source[wanted], target[wanted], together[wanted]
+
+    support_source = support[numpy.searchsorted(ids, source)]
+    support_target = support[numpy.searchsorted(ids, target)]
+    if metric == 'lift':
+        scores = together * orders / (support_source * support_target)
+    else:
+        scores = together / numpy.sqrt(support_source * support_target)
+
+    # Group by source, best score first, ties to the lower id
+    order = numpy.lexsort((target, -scores, source))
+    source, target, scores = source[order], target[order], scores[order]
+    ranks = numpy.arange(len(source)) - numpy.searchsorted(source, source, side='left') + 1
+    top = ranks <= top_k
+    return list(zip(source[top].tolist(), target[top].tolist(), ranks[top].tolist(), scores[top].tolist()))
+
+
+def rescore(product_ids=None, metric=METRIC, top_k=TOP_K, min_orders=MIN_ORDERS):
+    """
+    Rewrite the recommendations of the given products, and of every
+    product that was bought with one of them, from ProductPairCount
+
+    Args:
+        product_ids (iterable): Products whose counts changed, None
+            to rescore every product
+
+    Returns:
+        int: Recommendations written
+    """
+    if metric not in METRICS:
+        raise ValueError(f'Unknown recommendation metric {metric!r}, expected one of {METRICS}')
+
+    pairs = list(ProductPairCount.objects.values_list('product_id', 'other_id', 'orders').iterator(chunk_size=BATCH_SIZE * 10))
+    checkpoint = BackfillCheckpoint.objects.filter(name=CHECKPOINT).values_list('last_pk', flat=True).first() or 0
+    orders = Order.objects.filter(pk__lte=checkpoint).count()
+
+    affected = None
+    if product_ids is not None:
+        touched = set(product_ids)
+        affected = set(touched)
+        for a, b, _ in pairs:
+            if a in touched or b in touched:
+                affected.update((a, b))
+
+    rows = _top_k(pairs, affected, orders, metric, top_k, min_orders) if pairs else []
+    with transaction.atomic():
+        if affected is None:
+            ProductRecommendation.objects.all().delete()
+        else:
+            for batch in batched(affected, BATCH_SIZE):
+                ProductRecommendation.objects.filter(product_id__in=batch).delete()
+        ProductRecommendation.objects.bulk_create(
+            [
+                ProductRecommendation(product_id=product_id, recommended_id=other_id, rank=rank, score=score)
+                for product_id, other_id, rank, score in rows
+            ],
+            batch_size=BATCH_SIZE,
+        )
+        transaction.on_commit(catalog.bump_version)
+    return len(rows)
+
+
+def build(chunk_size=CHUNK_SIZE, reset=False, rescore_all=False, metric=METRIC, top_k=TOP_K, progress=None):
+    """
+    Fold the orders placed since the last run into the pair counts and
+    rescore the products they affect
+
+    Args:
+        chunk_size (int): Orders per transaction
+        reset (bool): Drop the counts and start from the first order
+        rescore_all (bool): Rescore every product, not only the
+            affected ones
+        metric (str): 'cosine' or 'lift'
+        top_k (int): Recommendations kept per product
+        progress (callable): Called with (last_order_id, orders) after
+            every chunk
+
+    Returns:
+        tuple: (orders folded in, recommendations written)
+    """
+    checkpoint, created = BackfillCheckpoint.objects.get_or_create(name=CHECKPOINT)
+    if reset:
+        with transaction.atomic():
+            ProductPairCount.objects.all().delete()
+            checkpoint.last_pk = 0
+            checkpoint.save()
+        rescore_all = True
+
+    touched = set()
+    folded = 0
+    for chunk in batched(baskets(checkpoint.last_pk, chunk_size), chunk_size):
+        counts = cooccurrence([basket for _, basket in chunk])
+        last_order_id = chunk[-1][0]
+        with transaction.atomic():
+            _fold(counts)
+            BackfillCheckpoint.objects.filter(pk=checkpoint.pk).update(last_pk=last_order_id)
+        # The diagonal holds every product of the chunk
+        touched.update(a for a, b in counts if a == b)
+        folded += len(chunk)
+        if progress:
+            progress(last_order_id, folded)
+
+    if rescore_all:
+        return folded, rescore(metric=metric, top_k=top_k)
+    if touched:
+        return folded, rescore(touched, metric=metric, top_k=top_k)
+    return folded, 0
+
+
+def _build_for_product(product_id):
+    return [
+        recommendation.recommended
+        for recommendation in ProductRecommendation.objects.filter(product_id=product_id)
+        .select_related('recommended').order_by('rank')[:TOP_K]
+    ]
+
+
+def for_product(product):
+    """The products frequently bought together with product, best first"""
+    return catalog.cached(f'recommendations:{product.pk}', lambda: _build_for_product(product.pk))
@@ -0,0 +1,85 @@
+"""
+Full-text search for the product catalog
+
+On SQLite the catalog is indexed in an FTS5 virtual table that holds
+its own copy of each product's title, brand and description. The
+table and the triggers that keep it in sync with store_product are
+created by migration 0003. Results are ranked with bm25, weighting a
+match in the title above the brand and the brand above the description.
+
+Other database backends fall back to the original icontains filter.
+"""
+
+import re
+
+from django.db import connection
+from django.db.models import Q
+
+from .models import Product
+
+
+FTS_TABLE = 'store_product_fts'
+
+# bm25 column weights: title, brand, description
+RANK_WEIGHTS = (10.0, 5.0, 1.0)
+
+# Result limits for the AJAX suggestions and the full results page
+SUGGESTION_LIMIT = 10
+RESULTS_LIMIT = 60
+
+_TOKEN_RE = re.compile(r'\w+', re.UNICODE)
+
+
+def fts_enabled(using=None):
+    """Check if the current database backend can hold the FTS5 index"""
+    conn = using or connection
+    return conn.vendor == 'sqlite'
+
+
+def match_expression(query):
+    """
+    Turn free text typed by a user into an FTS5 MATCH expression
+
+    Every word becomes a quoted prefix term, so FTS5 operators and
+    punctuation in the input can never produce a syntax error, and
+    the terms are implicitly AND-ed together.
+    Example: 'Zelda tears' -> '"zelda"* "tears"*'
+    """
+    tokens = _TOKEN_RE.findall(query.lower())
+    return ' '.join(f'"{token}"*' for token in tokens)
+
+
+def search(query, limit=None):
+    """
+    Return the products matching query, best match first
+
+    Args:
+        query (str): Raw search text
+        limit (int): Maximum number of products to return
+
+    Returns:
+        list: Product objects in rank order
+    """
+    if not fts_enabled():
+        products = Product.objects.filter(
+            Q(title__icontains=query) |
+            Q(brand__icontains=query) |
+            Q(description__icontains=query)
+        ).distinct()
+        return list(products[:limit] if limit else products)
+
+    expression = match_expression(query)
+    if not expression:
+        return []
+
+    weights = ', '.join(str(weight) for weight in RANK_WEIGHTS)
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s "
+            f"ORDER BY bm25({FTS_TABLE}, {weights}) LIMIT %s",
+            [expression, limit or -1],
+        )
+        ranked_ids = [row[0] for row in cursor.fetchall()]
+
+    products = Product.objects.in_bulk(ranked_ids)
+    return [products[product_id] for product_id in ranked_ids if product_id in products]
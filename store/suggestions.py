@@ -0,0 +1,133 @@
+"""
+In-memory prefix index for search suggestions
+
+Every process keeps a sorted array of (key, product id) pairs built
+from product titles and brands. The keys of a title are the title
+itself and every tail of it that starts at a word, so typing
+'kart' finds 'Mario Kart' just like typing 'mario k' does. A
+lookup is a bisect into the array followed by a short forward scan,
+so answering a keystroke needs no SQL at all.
+
+The index is built on first use and remembers the catalog version
+(store/catalog.py) it was built from. When a Product change bumps
+that version, in this or any other process, the next lookup rebuilds it.
+"""
+
+import re
+import threading
+from bisect import bisect_left
+
+from django.urls import reverse
+
+from . import catalog, search
+from .models import Product
+
+
+_WORD_RE = re.compile(r'\w+', re.UNICODE)
+
+
+def normalize(text):
+    """Lowercase text and collapse punctuation and spacing to single spaces"""
+    return ' '.join(_WORD_RE.findall(text.lower()))
+
+
+def product_payload(product_id, title, brand, price, slug, image, image_variants=None):
+    """The fields a suggestion needs, so rendering it needs no model instance"""
+    image_field = Product._meta.get_field('image')
+    thumbnails = (image_variants or {}).get('jpeg')
+    if thumbnails:
+        # Smallest resized copy, suggestions are shown as small icons
+        image = thumbnails[0][1]
+    return {
+        'id': product_id,
+        'title': title,
+        'brand': brand,
+        'price': str(price),
+        'url': reverse('product-info', args=[slug]),
+        'image_url': image_field.storage.url(str(image)) if image else '',
+    }
+
+
+class PrefixIndex:
+    """
+    Sorted-array prefix index over product titles and brands
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        # (keys, ids, payloads), swapped in as one object so that a
+        # concurrent lookup never mixes arrays from two builds
+        self._arrays = ([], [], {})
+        self._version = None
+
+    def build(self, version):
+        """Load titles and brands for the whole catalog and rebuild the arrays"""
+        entries = []
+        payloads = {}
+        rows = Product.objects.values_list('id', 'title', 'brand', 'price', 'slug', 'image', 'image_variants')
+        for product_id, title, brand, price, slug, image, image_variants in rows.iterator():
+            payloads[product_id] = product_payload(product_id, title, brand, price, slug, image, image_variants)
+            words = normalize(title).split()
+            # Title keys rank before brand keys sharing the same text
+            for start in range(len(words)):
+                entries.append((' '.join(words[start:]), 0, product_id))
+            brand_key = normalize(brand)
+            if brand_key:
+                entries.append((brand_key, 1, product_id))
+        entries.sort()
+        keys = [entry[0] for entry in entries]
+        ids = [entry[2] for entry in entries]
+        self._arrays = (keys, ids, payloads)
+        self._version = version
+
+    def _ensure_built(self):
+        version = catalog.get_version()
+        if self._version != version:
+            with self._lock:
+                if self._version != version:
+                    self.build(version)
+
+    def lookup(self, query, limit):
+        """
+        Return up to limit suggestion payloads whose title or brand
+        contains a word starting with query
+        """
+        prefix = normalize(query)
+        if not prefix:
+            return []
+        self._ensure_built()
+        keys, ids, payloads = self._arrays
+        results = []
+        seen = set()
+        position = bisect_left(keys, prefix)
+        while position < len(keys) and keys[position].startswith(prefix):
+            product_id = ids[position]
+            if product_id not in seen:
+                seen.add(product_id)
+                results.append(payloads[product_id])
+                if len(results) >= limit:
+                    break
+            position += 1
+        return results
+
+
+prefix_index = PrefixIndex()
+
+
+def suggest(query, limit):
+    """
+    Top suggestions for a partially typed query
+
+    Served from the in-memory prefix index. Only when no title or
+    brand matches does it fall back to the full-text search, which
+    also looks at product descriptions.
+    """
+    results = prefix_index.lookup(query, limit)
+    if results:
+        return results
+    return [
+        product_payload(
+            product.id, product.title, product.brand, product.price, product.slug, product.image, product.image_variants
+        )
+        for product in search.search(query, limit=limit)
+    ]
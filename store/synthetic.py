@@ -0,0 +1,235 @@
+"""
+Synthetic data
+
+generate() fills the database with a made-up but realistic shop:
+categories, branded products, customers, their order history and the
+rewards those orders earned, at any scale from a few rows to
+millions. Everything is written with bulk_create() in batches, so
+neither time nor memory grows with more than the batch size, apart
+from the (id, price) pairs of the products orders are drawn from.
+
+Every run tags its slugs, usernames and emails with a run token, so
+several runs can be loaded into the same database. A seed makes a
+run reproducible, apart from that token.
+
+bulk_create() skips Product.save() and the model signals, so the
+brand slugs are filled in here, and the catalog version and the
+reward balances are brought up to date at the end. The search index
+follows through its database triggers.
+"""
+
+import random
+import time
+from contextlib import contextmanager
+from datetime import timedelta
+from decimal import Decimal
+
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.db import transaction
+from django.utils import timezone
+from django.utils.text import slugify
+
+from . import catalog
+from .models import Category, Product
+
+
+BATCH_SIZE = 1000
+
+# Orders are spread over this many days before now
+HISTORY_DAYS = 365
+
+PASSWORD = 'synthetic-password'
+
+ADJECTIVES = (
+    'Classic', 'Compact', 'Deluxe', 'Eco', 'Essential', 'Heavy Duty', 'Lightweight', 'Modern',
+    'Portable', 'Premium', 'Pro', 'Retro', 'Smart', 'Travel', 'Ultra', 'Vintage', 'Wireless',
+)
+NOUNS = (
+    'Backpack', 'Blender', 'Camera', 'Chair', 'Controller', 'Desk Lamp', 'Headphones', 'Jacket',
+    'Keyboard', 'Kettle', 'Monitor', 'Mouse', 'Notebook', 'Speaker', 'Sneakers', 'Tent',
+    'Toaster', 'Water Bottle', 'Watch', 'Yoga Mat',
+)
+BRAND_PARTS = (
+    'Acme', 'Apex', 'Blue', 'Bright', 'Cedar', 'Delta', 'Echo', 'Falcon', 'Granite', 'Harbor',
+    'Iron', 'Juniper', 'Kite', 'Lumen', 'Maple', 'Nova', 'Orbit', 'Pioneer', 'Quartz', 'River',
+)
+
+
+def run_token():
+    """Short token that keeps the slugs of one run apart from other runs"""
+    return format(int(time.time() * 1000), 'x')[-8:]
+
+
+@contextmanager
+def explicit_dates(*fields):
+    """
+    Let bulk_create() keep the dates given for auto_now_add fields,
+    which it would otherwise overwrite with the current time
+    """
+    saved = [(field, field.auto_now_add) for field in fields]
+    for field in fields:
+        field.auto_now_add = False
+    try:
+        yield
+    finally:
+        for field, auto_now_add in saved:
+            field.auto_now_add = auto_now_add
+
+
+def make_categories(count, token):
+    categories = [
+        Category(name=f'Category {i + 1}', slug=f'category-{token}-{i + 1}')
+        for i in range(count)
+    ]
+    return Category.objects.bulk_create(categories, batch_size=BATCH_SIZE)
+
+
+def make_brands(count, rng):
+    brands = [f'{a} {b}' for a in BRAND_PARTS for b in BRAND_PARTS if a != b]
+    rng.shuffle(brands)
+    while len(brands) < count:
+        brands.append(f'Brand {len(brands) + 1}')
+    return brands[:count]
+
+
+def make_products(count, categories, brands, token, rng, batch_size=BATCH_SIZE):
+    """Create count products, returns their [(id, price)]"""
+    now = timezone.now()
+    field = Product._meta.get_field('date_uploaded')
+    created = []
+    with explicit_dates(field):
+        for start in range(0, count, batch_size):
+            batch = []
+            for i in range(start, min(start + batch_size, count)):
+                title = f'{rng.choice(ADJECTIVES)} {rng.choice(NOUNS)} {i + 1}'
+                brand = rng.choice(brands)
+                batch.append(Product(
+                    category=rng.choice(categories),
+                    title=title,
+                    brand=brand,
+                    # bulk_create() does not call save(), which sets it
+                    brand_slug=slugify(brand),
+                    description=f'{title} by {brand}. Synthetic product for load testing.',
+                    slug=f'{slugify(title)}-{token}',
+                    price=Decimal(rng.randint(199, 9999)).scaleb(-2),
+                    image='images/synthetic.jpg',
+                    quantity_available=rng.randint(0, 500),
+                    date_uploaded=now - timedelta(minutes=rng.randint(0, HISTORY_DAYS * 24 * 60)),
+                ))
+            created.extend((product.pk, product.price) for product in Product.objects.bulk_create(batch))
+    return created
+
+
+def make_users(count, token, batch_size=BATCH_SIZE):
+    """Create count customers, all with the password PASSWORD, returns their ids"""
+    password = make_password(PASSWORD)
+    ids = []
+    for start in range(0, count, batch_size):
+        batch = [
+            User(username=f'synth-{token}-{i + 1}', email=f'synth-{token}-{i + 1}@example.com', password=password)
+            for i in range(start, min(start + batch_size, count))
+        ]
+        ids.extend(user.pk for user in User.objects.bulk_create(batch))
+    return ids
+
+
+def make_orders(count, user_ids, products, rng, max_items=5, guest_share=0.2, batch_size=BATCH_SIZE):
+    """
+    Create count orders with 1 to max_items items each, drawn from
+    products, a guest_share of them by guests
+
+    Returns:
+        int: Order items created
+    """
+    from payment.models import Order, OrderItem
+
+    now = timezone.now()
+    items_created = 0
+    with explicit_dates(Order._meta.get_field('date_ordered')):
+        for start in range(0, count, batch_size):
+            orders, lines = [], []
+            for _ in range(min(batch_size, count - start)):
+                user_id = None if not user_ids or rng.random() < guest_share else rng.choice(user_ids)
+                picked = rng.sample(products, min(rng.randint(1, max_items), len(products)))
+                order_lines = [(product_id, rng.randint(1, 3), price) for product_id, price in picked]
+                orders.append(Order(
+                    user_id=user_id,
+                    full_name=f'Customer {user_id or "Guest"}',
+                    email=f'customer-{user_id or "guest"}@example.com',
+                    shipping_address='1 Synthetic Street\n\nTestville\nTS\n00000',
+                    amount_paid=sum((price * qty for _, qty, price in order_lines), Decimal('0.00')),
+                    date_ordered=now - timedelta(minutes=rng.randint(0, HISTORY_DAYS * 24 * 60)),
+                ))
+                lines.append(order_lines)
+
+            with transaction.atomic():
+                Order.objects.bulk_create(orders)
+                items = [
+                    OrderItem(order=order, product_id=product_id, quantity=qty, price=price, user_id=order.user_id)
+                    for order, order_lines in zip(orders, lines)
+                    for product_id, qty, price in order_lines
+                ]
+                OrderItem.objects.bulk_create(items, batch_size=batch_size)
+            items_created += len(items)
+    return items_created
+
+
+def generate(products=1000, categories=20, brands=50, users=200, orders=2000, max_items=5, seed=None,
+             batch_size=BATCH_SIZE, rewards=True, progress=None):
+    """
+    Generate a synthetic shop
+
+    Args:
+        products (int): Products to create
+        categories (int): Categories the products are spread over
+        brands (int): Distinct brand names
+        users (int): Registered customers
+        orders (int): Orders, about a fifth of them by guests
+        max_items (int): Most items per order
+        seed (int): Random seed
+        batch_size (int): Rows per INSERT
+        rewards (bool): Award the rewards the customers' orders earned
+        progress (callable): Called with a message after every step
+
+    Returns:
+        dict: Rows created per model, and the run token
+    """
+    progress = progress or (lambda message: None)
+    rng = random.Random(seed)
+    token = run_token()
+
+    category_objects = make_categories(categories, token)
+    brand_names = make_brands(brands, rng)
+    progress(f'{len(category_objects)} categories, {len(brand_names)} brands')
+
+    product_rows = make_products(products, category_objects, brand_names, token, rng, batch_size)
+    progress(f'{len(product_rows)} products')
+
+    user_ids = make_users(users, token, batch_size)
+    progress(f'{len(user_ids)} users')
+
+    items = make_orders(orders, user_ids, product_rows, rng, max_items=max_items, batch_size=batch_size) if product_rows else 0
+    progress(f'{orders if product_rows else 0} orders, {items} order items')
+
+    summary = {
+        'token': token,
+        'categories': len(category_objects),
+        'products': len(product_rows),
+        'users': len(user_ids),
+        'orders': orders if product_rows else 0,
+        'order_items': items,
+        'reward_transactions': 0,
+    }
+
+    if rewards:
+        from account import backfill
+
+        awarded, points = backfill.backfill(chunk_size=batch_size)
+        summary['reward_transactions'] = awarded
+        progress(f'{awarded} reward transactions, ${points}')
+
+    # Writes above bypassed the model signals
+    catalog.bump_version()
+    progress('catalog version bumped')
+    return summary
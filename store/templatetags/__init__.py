@@ -0,0 +1 @@
+# This file makes the templatetags directory a Python package
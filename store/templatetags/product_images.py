@@ -0,0 +1,49 @@
+"""
+Template tags for responsive product images
+
+"""
+
+from django import template
+from django.core.files.storage import default_storage
+from django.utils.html import format_html
+
+register = template.Library()
+
+# Product grids are five columns wide on desktop, two on tablets
+GRID_SIZES = '(min-width: 768px) 20vw, (min-width: 576px) 50vw, 100vw'
+
+
+def _srcset(variants):
+    return ', '.join(f'{default_storage.url(name)} {width}w' for width, name in variants)
+
+
+@register.simple_tag
+def product_image(product, sizes=GRID_SIZES, css_class='img-fluid', alt='Responsive image', width=''):
+    """
+    Render a product image as a <picture> with WebP and JPEG srcsets
+    Usage: {% product_image product sizes="200px" css_class="img-fluid" %}
+
+    Falls back to a plain <img> of the original upload until the
+    variants for the image have been generated.
+    """
+    if not product.image:
+        return ''
+    variants = product.image_variants or {}
+    webp = variants.get('webp')
+    jpeg = variants.get('jpeg')
+    width_attr = format_html(' width="{}"', width) if width else ''
+
+    if not (webp and jpeg):
+        return format_html(
+            '<img class="{}"{} alt="{}" src="{}" loading="lazy">',
+            css_class, width_attr, alt, product.image.url,
+        )
+
+    return format_html(
+        '<picture>'
+        '<source type="image/webp" srcset="{}" sizes="{}">'
+        '<img class="{}"{} alt="{}" src="{}" srcset="{}" sizes="{}" loading="lazy">'
+        '</picture>',
+        _srcset(webp), sizes,
+        css_class, width_attr, alt, default_storage.url(jpeg[-1][1]), _srcset(jpeg), sizes,
+    )
@@ -1,3 +1,401 @@
-from django.test import TestCase
+from datetime import timedelta
+from decimal import Decimal
+from unittest import mock
 
-# Create your tests here.
+from django.contrib.sessions.backends.db import SessionStore
+from django.core.cache import cache
+from django.db import connection, transaction
+from django.test import RequestFactory, TestCase
+from django.urls import reverse
+from django.utils import timezone
+from django.utils.text import slugify
+
+from ecom_model.tests.fixtures import PASSWORD, build_catalog, build_customer, fill_cart
+from payment.models import Order, OrderItem
+
+from . import catalog, inventory, product_cache, rankings, recommendations, search
+from .models import Category, Product, ProductPairCount, ProductRanking, ProductRecommendation, StockReservation
+
+
+def session_request():
+    request = RequestFactory().get('/')
+    request.session = SessionStore()
+    return request
+
+
+class StockHoldTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.products = build_catalog(2)
+
+    def stock(self):
+        return dict(Product.objects.filter(pk__in=[product.pk for product in self.products])
+                    .values_list('pk', 'quantity_available'))
+
+    def hold(self, request, quantity=2):
+        return inventory.hold_cart(request, [{'product': product, 'qty': quantity} for product in self.products])
+
+    def test_hold_takes_the_stock(self):
+        request = session_request()
+        self.assertTrue(self.hold(request))
+
+        key = inventory.hold_key(request)
+        self.assertEqual(inventory.held_quantities(key), {product.pk: 2 for product in self.products})
+        self.assertEqual(set(self.stock().values()), {998})
+
+    def test_short_cart_holds_nothing(self):
+        Product.objects.filter(pk=self.products[1].pk).update(quantity_available=1)
+        request = session_request()
+
+        self.assertFalse(self.hold(request))
+
+        self.assertFalse(StockReservation.objects.exists())
+        self.assertEqual(self.stock(), {self.products[0].pk: 1000, self.products[1].pk: 1})
+
+    def test_claim_keeps_the_stock_taken(self):
+        request = session_request()
+        self.hold(request)
+        key = inventory.hold_key(request)
+
+        self.assertEqual(inventory.claim_holds(key), {product.pk: 2 for product in self.products})
+        inventory.holds_claimed(request)
+
+        self.assertFalse(StockReservation.objects.exists())
+        self.assertIsNone(inventory.hold_key(request))
+        self.assertEqual(inventory.claim_holds(key), {})
+        self.assertEqual(set(self.stock().values()), {998})
+
+    def test_release_returns_the_stock(self):
+        request = session_request()
+        self.hold(request)
+
+        self.assertEqual(inventory.release_holds(request), 4)
+
+        self.assertFalse(StockReservation.objects.exists())
+        self.assertEqual(set(self.stock().values()), {1000})
+        self.assertEqual(inventory.release_holds(request), 0)
+
+    def test_expired_holds_are_swept(self):
+        expired, current = session_request(), session_request()
+        self.hold(expired)
+        self.hold(current, quantity=1)
+        StockReservation.objects.filter(session_key=inventory.hold_key(expired)).update(
+            expires_at=timezone.now() - timedelta(seconds=1)
+        )
+
+        self.assertEqual(inventory.release_expired(batch_size=1), 4)
+
+        self.assertEqual(StockReservation.objects.get(product=self.products[0]).session_key, inventory.hold_key(current))
+        self.assertEqual(set(self.stock().values()), {999})
+        # The swept holds can no longer be claimed
+        self.assertEqual(inventory.claim_holds(inventory.hold_key(expired)), {})
+
+
+class CheckoutHoldTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.products = build_catalog(2)
+        cls.customer = build_customer()
+
+    def test_guest_checkout_holds_nothing(self):
+        fill_cart(self.client, self.products)
+        self.client.get(reverse('checkout'))
+        self.assertFalse(StockReservation.objects.exists())
+
+    def test_customer_checkout_holds_the_cart(self):
+        self.client.login(username=self.customer.username, password=PASSWORD)
+        fill_cart(self.client, self.products)
+        self.client.get(reverse('checkout'))
+        self.assertEqual(StockReservation.objects.count(), 2)
+
+
+class SearchTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        category = Category.objects.create(name='Games', slug='games')
+
+        def product(title, brand, description):
+            return Product.objects.create(
+                category=category, title=title, brand=brand, description=description,
+                slug=slugify(title), price=Decimal('10.00'), image='images/test.png',
+            )
+
+        cls.in_description = product('Kart Racer', 'Acme', 'A racer from the makers of Zelda')
+        cls.in_brand = product('Puzzle Box', 'Zelda Works', 'A box full of puzzles to solve')
+        cls.in_title = product('Zelda Quest', 'Acme', 'An adventure across the kingdom')
+
+    def titles(self, query):
+        return [product.title for product in search.search(query)]
+
+    def test_title_outranks_brand_outranks_description(self):
+        self.assertEqual(self.titles('zelda'), ['Zelda Quest', 'Puzzle Box', 'Kart Racer'])
+
+    def test_words_are_prefixes_and_all_must_match(self):
+        self.assertEqual(self.titles('zel'), ['Zelda Quest', 'Puzzle Box', 'Kart Racer'])
+        self.assertEqual(self.titles('zelda kart'), ['Kart Racer'])
+        self.assertEqual(self.titles('puzzles'), ['Puzzle Box'])
+        self.assertEqual(self.titles('nothing'), [])
+
+    def test_operators_in_the_query_are_plain_words(self):
+        self.assertEqual(self.titles('"zelda" OR -'), [])
+        self.assertEqual(self.titles('zelda*'), ['Zelda Quest', 'Puzzle Box', 'Kart Racer'])
+        self.assertEqual(self.titles('!!!'), [])
+
+    def test_index_follows_saves_and_deletes(self):
+        self.in_title.title = 'Hyrule Quest'
+        self.in_title.save()
+        self.assertEqual(self.titles('hyrule'), ['Hyrule Quest'])
+        self.assertEqual(self.titles('zelda'), ['Puzzle Box', 'Kart Racer'])
+
+        self.in_brand.delete()
+        self.assertEqual(self.titles('zelda'), ['Kart Racer'])
+
+    def test_sync_triggers_exist(self):
+        # A migration that rebuilds store_product drops them
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT name FROM sqlite_master WHERE type = 'trigger' AND tbl_name = 'store_product'")
+            triggers = {row[0] for row in cursor.fetchall()}
+        self.assertEqual(triggers, {'store_product_fts_insert', 'store_product_fts_update', 'store_product_fts_delete'})
+
+    def test_index_follows_bulk_writes(self):
+        Product.objects.filter(pk=self.in_title.pk).update(brand='Hyrule')
+        Product.objects.bulk_create([Product(
+            category=self.in_title.category, title='Hyrule Map', slug='hyrule-map', price=Decimal('5.00'), image='images/test.png',
+        )])
+        self.assertEqual(self.titles('hyrule'), ['Hyrule Map', 'Zelda Quest'])
+
+
+def place(products, customer=None):
+    """An order of one of each of products"""
+    order = Order.objects.create(
+        full_name='Test Customer', email='customer@example.com', shipping_address='1 Test Street',
+        amount_paid=sum(product.price for product in products), user=customer,
+    )
+    OrderItem.objects.bulk_create([OrderItem(order=order, product=product, quantity=1, price=product.price) for product in products])
+    return order
+
+
+class RecommendationTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.a, cls.b, cls.c, cls.d = build_catalog(4)
+        for basket in ([cls.a, cls.b], [cls.a, cls.b, cls.c], [cls.a, cls.c], [cls.a, cls.b], [cls.d]):
+            place(basket)
+
+    def recommended(self, product):
+        return [
+            (row.recommended_id, round(row.score, 4))
+            for row in ProductRecommendation.objects.filter(product=product).order_by('rank')
+        ]
+
+    def test_cooccurrence_of_a_known_matrix(self):
+        a, b, c, d = (product.pk for product in (self.a, self.b, self.c, self.d))
+        baskets = [[a, b], [a, b, c], [a, c], [a, b], [d]]
+        expected = {(a, a): 4, (b, b): 3, (c, c): 2, (d, d): 1, (a, b): 3, (a, c): 2, (b, c): 1}
+
+        self.assertEqual(dict(recommendations.cooccurrence(baskets)), expected)
+        with mock.patch.object(recommendations, 'numpy', None):
+            self.assertEqual(dict(recommendations.cooccurrence(baskets)), expected)
+
+    def test_cosine_scores(self):
+        self.assertEqual(recommendations.build(chunk_size=2), (5, 4))
+
+        # b and c share one order only, below MIN_ORDERS
+        self.assertEqual(self.recommended(self.a), [(self.b.pk, round(3 / 12 ** 0.5, 4)), (self.c.pk, round(2 / 8 ** 0.5, 4))])
+        self.assertEqual(self.recommended(self.b), [(self.a.pk, round(3 / 12 ** 0.5, 4))])
+        self.assertEqual(self.recommended(self.d), [])
+
+        scored = {product.pk: self.recommended(product) for product in (self.a, self.b, self.c, self.d)}
+        with mock.patch.object(recommendations, 'numpy', None):
+            recommendations.rescore()
+        self.assertEqual({product.pk: self.recommended(product) for product in (self.a, self.b, self.c, self.d)}, scored)
+
+    def test_lift_ties_go_to_the_lower_id(self):
+        recommendations.build(metric='lift')
+        self.assertEqual(self.recommended(self.a), [(self.b.pk, 1.25), (self.c.pk, 1.25)])
+
+    def test_new_orders_are_folded_in(self):
+        recommendations.build()
+        place([self.b, self.c])
+
+        self.assertEqual(recommendations.build()[0], 1)
+        incremental = set(ProductPairCount.objects.values_list('product', 'other', 'orders'))
+        self.assertEqual(self.recommended(self.b)[0], (self.a.pk, round(3 / 16 ** 0.5, 4)))
+        self.assertEqual(self.recommended(self.b)[1], (self.c.pk, round(2 / 12 ** 0.5, 4)))
+
+        recommendations.build(reset=True)
+        self.assertEqual(set(ProductPairCount.objects.values_list('product', 'other', 'orders')), incremental)
+
+
+class RankingTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.recent, cls.older, cls.unsold = build_catalog(3)
+        now = timezone.now()
+        for product, days in ((cls.recent, 1), (cls.older, 40)):
+            order = place([product])
+            OrderItem.objects.filter(order=order).update(quantity=5)
+            Order.objects.filter(pk=order.pk).update(date_ordered=now - timedelta(days=days))
+
+    def titles(self, sort):
+        page = rankings.ranked(RequestFactory().get('/', {'sort': sort}))
+        return [product.title for product in page]
+
+    def test_decay_halves_every_half_life(self):
+        self.assertEqual(rankings.decay(0, 30), 1)
+        self.assertEqual(rankings.decay(30, 30), 0.5)
+        self.assertEqual(rankings.decay(90, 30), 0.125)
+        self.assertEqual(rankings.decay(-1, 30), 1)
+
+    def test_recent_sale_outranks_an_older_one(self):
+        self.assertEqual(rankings.build(), 2)
+
+        scores = {ranking.product_id: ranking for ranking in ProductRanking.objects.all()}
+        self.assertGreater(scores[self.recent.pk].best_seller, scores[self.older.pk].best_seller)
+        self.assertGreater(scores[self.recent.pk].trending, scores[self.older.pk].trending)
+        self.assertAlmostEqual(scores[self.recent.pk].best_seller, 5 * rankings.decay(1, 30), delta=0.1)
+        self.assertEqual(scores[self.unsold.pk].best_seller, 0)
+        expected = [self.recent.title, self.older.title, self.unsold.title]
+        self.assertEqual(self.titles('best-sellers'), expected)
+        self.assertEqual(self.titles('trending'), expected)
+
+    def test_incremental_runs_match_a_rebuild(self):
+        start = timezone.now()
+        with mock.patch('store.rankings.timezone.now', return_value=start):
+            rankings.build()
+        with mock.patch('store.rankings.timezone.now', return_value=start + timedelta(days=10)):
+            rankings.build()
+            incremental = {row.product_id: (row.best_seller, row.trending) for row in ProductRanking.objects.all()}
+            rankings.build(reset=True)
+        for row in ProductRanking.objects.all():
+            with self.subTest(product=row.product_id):
+                self.assertAlmostEqual(row.best_seller, incremental[row.product_id][0])
+                self.assertAlmostEqual(row.trending, incremental[row.product_id][1])
+
+
+class ConditionalGetTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.products = build_catalog(2)
+        cls.customer = build_customer()
+
+    def setUp(self):
+        # Products cached by earlier tests may hold rolled back changes
+        cache.clear()
+
+    def get(self, url=None, **headers):
+        return self.client.get(url or reverse('store'), headers=headers)
+
+    def assertPrivate(self, response):
+        self.assertIn('Cookie', response['Vary'])
+        self.assertIn('private', response['Cache-Control'])
+        self.assertIn('no-cache', response['Cache-Control'])
+
+    def test_anonymous_page_revalidates(self):
+        response = self.get()
+        self.assertEqual(response.status_code, 200)
+        self.assertPrivate(response)
+
+        revalidated = self.get(if_none_match=response['ETag'])
+        self.assertEqual(revalidated.status_code, 304)
+        self.assertPrivate(revalidated)
+        self.assertEqual(self.get(if_modified_since=response['Last-Modified']).status_code, 304)
+
+    def test_catalog_change_invalidates(self):
+        etag = self.get()['ETag']
+        catalog.bump_version()
+
+        response = self.get(if_none_match=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+
+    def test_visitors_get_their_own_etags(self):
+        anonymous = self.get()['ETag']
+
+        fill_cart(self.client, self.products[:1])
+        with_cart = self.get()
+        self.assertNotIn('Last-Modified', with_cart)
+
+        self.client.login(username=self.customer.username, password=PASSWORD)
+        signed_in = self.get()
+        self.assertNotIn('Last-Modified', signed_in)
+
+        self.assertEqual(len({anonymous, with_cart['ETag'], signed_in['ETag']}), 3)
+        self.assertEqual(self.get(if_none_match=anonymous).status_code, 200)
+        self.assertEqual(self.get(if_none_match=signed_in['ETag']).status_code, 304)
+        self.assertPrivate(signed_in)
+
+    def test_product_page_follows_its_stock(self):
+        url = reverse('product-info', args=[self.products[0].slug])
+        response = self.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertPrivate(response)
+        self.assertNotIn('Last-Modified', response)
+        self.assertEqual(self.get(url, if_none_match=response['ETag']).status_code, 304)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            inventory.take_stock({self.products[0].pk: 1})
+
+        self.assertEqual(self.get(url, if_none_match=response['ETag']).status_code, 200)
+
+
+class ProductCacheTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.product, cls.other = build_catalog(2)
+
+    def setUp(self):
+        cache.clear()
+
+    def prime(self):
+        """Cache both products, then check they are served without a query"""
+        product_cache.get_many([self.product.pk, self.other.pk])
+        product_cache.get_by_slug(self.product.slug)
+        with self.assertNumQueries(0):
+            product_cache.get(self.product.pk)
+
+    def test_sale_drops_the_product(self):
+        self.prime()
+        product = Product.objects.get(pk=self.product.pk)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertTrue(product.process_sale(3, Decimal('30.00')))
+
+        self.assertEqual(product_cache.get(self.product.pk).quantity_available, 997)
+        fresh = product_cache.get_many([self.product.pk, self.other.pk])
+        self.assertEqual(fresh[self.product.pk].quantity_sold, 3)
+        self.assertEqual(fresh[self.other.pk].quantity_available, 1000)
+
+    def test_checkout_stock_drops_the_product(self):
+        self.prime()
+        with self.captureOnCommitCallbacks(execute=True):
+            inventory.take_stock({self.product.pk: 5})
+        self.assertEqual(product_cache.get(self.product.pk).quantity_available, 995)
+
+    def test_save_drops_every_product(self):
+        self.prime()
+        product = Product.objects.get(pk=self.product.pk)
+        product.price = Decimal('1.23')
+        with self.captureOnCommitCallbacks(execute=True):
+            product.save()
+
+        self.assertEqual(product_cache.get(self.product.pk).price, Decimal('1.23'))
+        self.assertEqual(product_cache.get_by_slug(self.product.slug).price, Decimal('1.23'))
+
+    def test_rolled_back_change_keeps_the_cache(self):
+        self.prime()
+        with self.captureOnCommitCallbacks(execute=True) as callbacks:
+            with self.assertRaises(RuntimeError):
+                with transaction.atomic():
+                    Product.objects.get(pk=self.product.pk).process_sale(3, Decimal('30.00'))
+                    raise RuntimeError('payment failed')
+
+        self.assertEqual(callbacks, [])
+        with self.assertNumQueries(0):
+            self.assertEqual(product_cache.get(self.product.pk).quantity_available, 1000)
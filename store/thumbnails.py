@@ -0,0 +1,139 @@
+"""
+Responsive image variants for Product.image
+
+When a product image is uploaded through the admin, the original is
+resized with Pillow into a few widths, each saved as WebP plus a JPEG
+fallback, under MEDIA_ROOT/images/variants/ with a content hash in
+the file name, so variant URLs can be cached forever. The result is
+recorded in Product.image_variants and rendered as a srcset by the
+product_image template tag.
+
+Resizing runs in a process pool, off the request path. Only
+render_variants() runs in the worker processes and it uses nothing
+but Pillow, so the workers never need Django set up.
+"""
+
+import hashlib
+import io
+import logging
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+
+from django.conf import settings
+from django.db import close_old_connections, transaction
+
+
+VARIANT_DIR = 'images/variants'
+
+# Widths generated for every image, in pixels
+VARIANT_WIDTHS = (200, 400, 800)
+
+# Pillow format name, file extension and save options per variant format
+VARIANT_FORMATS = {
+    'webp': ('WEBP', 'webp', {'quality': 80, 'method': 4}),
+    'jpeg': ('JPEG', 'jpg', {'quality': 82, 'optimize': True, 'progressive': True}),
+}
+
+logger = logging.getLogger(__name__)
+
+_executor = None
+
+
+def render_variants(source_path, media_root, widths=VARIANT_WIDTHS):
+    """
+    Resize one image into every width and format
+
+    Widths larger than the original are skipped, except that the
+    smallest width is always produced so every image has a variant.
+
+    Args:
+        source_path (str): Absolute path of the original image
+        media_root (str): Directory the variant paths are relative to
+        widths (tuple): Target widths in pixels
+
+    Returns:
+        dict: {'webp': [[width, name], ...], 'jpeg': [...]}, where name
+        is relative to media_root
+    """
+    from PIL import Image, ImageOps
+
+    stem = os.path.splitext(os.path.basename(source_path))[0]
+    output_dir = os.path.join(media_root, VARIANT_DIR)
+    os.makedirs(output_dir, exist_ok=True)
+
+    variants = {key: [] for key in VARIANT_FORMATS}
+    with Image.open(source_path) as original:
+        original = ImageOps.exif_transpose(original)
+        targets = [width for width in widths if width < original.width] or [min(widths)]
+        for width in targets:
+            height = max(1, round(original.height * width / original.width))
+            resized = original.resize((width, height), Image.LANCZOS)
+            for key, (pil_format, extension, options) in VARIANT_FORMATS.items():
+                image = resized
+                if pil_format == 'JPEG' and image.mode not in ('RGB', 'L'):
+                    # JPEG has no alpha channel, flatten onto white
+                    background = Image.new('RGB', image.size, (255, 255, 255))
+                    background.paste(image, mask=image.convert('RGBA').getchannel('A'))
+                    image = background
+                buffer = io.BytesIO()
+                image.save(buffer, pil_format, **options)
+                data = buffer.getvalue()
+                digest = hashlib.sha256(data).hexdigest()[:12]
+                name = f'{VARIANT_DIR}/{stem}.{digest}.{width}w.{extension}'
+                path = os.path.join(media_root, name)
+                if not os.path.exists(path):
+                    with open(path, 'wb') as output:
+                        output.write(data)
+                variants[key].append([width, name])
+    return variants
+
+
+def get_executor():
+    global _executor
+    if _executor is None:
+        # spawn, so that workers never inherit a forked copy of a
+        # threaded server or its database connections
+        _executor = ProcessPoolExecutor(
+            max_workers=getattr(settings, 'IMAGE_VARIANT_WORKERS', 2),
+            mp_context=multiprocessing.get_context('spawn'),
+        )
+    return _executor
+
+
+def _store_variants(product_id, image_name, future):
+    """Record finished variants, unless the image was replaced meanwhile"""
+    from . import catalog
+    from .models import Product
+
+    try:
+        variants = future.result()
+    except Exception:
+        logger.exception('Image variant generation failed for product %s', product_id)
+        return
+    try:
+        updated = Product.objects.filter(pk=product_id, image=image_name).update(image_variants=variants)
+        if updated:
+            catalog.bump_version()
+    finally:
+        # Runs on the executor's thread, which Django does not manage
+        close_old_connections()
+
+
+def schedule(product):
+    """
+    Queue variant generation for a product's current image, once the
+    surrounding transaction has committed
+    """
+    if not product.image:
+        return
+    source_path = product.image.path
+    image_name = product.image.name
+    product_id = product.pk
+
+    def submit():
+        future = get_executor().submit(render_variants, source_path, str(settings.MEDIA_ROOT))
+        future.add_done_callback(partial(_store_variants, product_id, image_name))
+
+    transaction.on_commit(submit)
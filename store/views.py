@@ -1,85 +1,102 @@
 from django.shortcuts import render
 from . models import Category, Product
 from django.shortcuts import get_object_or_404
-from django.db.models import Q
 from django.template.loader import render_to_string
-from django.http import HttpResponse
+from django.http import HttpResponse, JsonResponse
+from django.utils.functional import SimpleLazyObject
+from django.utils.text import slugify
+from . import catalog, rankings, recommendations, search
+from .conditional import catalog_page, page_product, product_page
+from .pagination import paginate
+from .suggestions import suggest
 
 
+@catalog_page
 def store(request):
-    all_products = Product.objects.all()
-    context = {'my_products':all_products}
+    all_products = rankings.ranked(request)
+    if all_products is None:
+        all_products = paginate(Product.objects.all(), request)
+    context = {'my_products':all_products, 'page':all_products, 'sort': request.GET.get('sort', '')}
     return render(request, 'store/store.html', context)
 
 def categories(request):
-    all_categories = Category.objects.all()
-    return {'all_categories': all_categories}
+    """Context processor for the category list, cached per catalog version"""
+    # Lazy, so templates that never read it cost nothing
+    return {'all_categories': SimpleLazyObject(catalog.get_categories)}
 
 def brands(request):
-    """Context processor to get all unique brands with their product counts"""
-    all_brands = Product.objects.values_list('brand', flat=True).distinct().order_by('brand')
-    # Filter out empty brands and 'un-branded'
-    all_brands = [brand for brand in all_brands if brand and brand.lower() != 'un-branded']
-    return {'all_brands': all_brands}
+    """Context processor to get all unique brands, cached per catalog version"""
+    return {'all_brands': SimpleLazyObject(catalog.get_brands)}
 
+@catalog_page
 def list_category(request, category_slug=None):
     category = get_object_or_404(Category, slug=category_slug)
-    products = Product.objects.filter(category=category)
-    return render(request, 'store/list-category.html', {'category':category, 'products':products})
+    products = rankings.ranked(request, category)
+    if products is None:
+        products = paginate(Product.objects.filter(category=category), request)
+    context = {'category':category, 'products':products, 'page':products, 'sort': request.GET.get('sort', '')}
+    return render(request, 'store/list-category.html', context)
 
+@catalog_page
 def list_brand(request, brand_name=None):
     """Display all products from a specific brand"""
-    # Decode URL-encoded brand name and get products
-    brand_name = brand_name.replace('-', ' ')
-    products = Product.objects.filter(brand__iexact=brand_name)
-    
-    if not products.exists():
-        # If no products found, try to find closest match
-        products = Product.objects.filter(brand__icontains=brand_name)
-    
+    # One indexed lookup on the normalized brand key. slugify() also
+    # accepts older links that used the raw brand name
+    brand_slug = slugify(brand_name)
+    products = paginate(Product.objects.filter(brand_slug=brand_slug), request)
     context = {
-        'brand': brand_name,
+        'brand': products.object_list[0].brand if products else brand_name.replace('-', ' '),
         'products': products,
-        'product_count': products.count()
+        'page': products
     }
     return render(request, 'store/brand.html', context)
 
+@product_page
 def product_info(request, product_slug):
-    product = get_object_or_404(Product, slug=product_slug)
-    context = {'product': product}
+    # Already read for the ETag, from the product cache
+    product = page_product(request, product_slug)
+    context = {'product': product, 'recommendations': recommendations.for_product(product)}
     return render(request, 'store/product-info.html', context)
 
 def search_products(request):
     query = request.GET.get('q', '')
     is_ajax = request.GET.get('ajax', '') == '1'
-    if query:
-        # Search in product title, brand, and description
-        products = Product.objects.filter(
-            Q(title__icontains=query) | 
-            Q(brand__icontains=query) | 
-            Q(description__icontains=query)
-        ).distinct()[:10]  # Limit to 10 results for AJAX
-    else:
-        products = Product.objects.none()
-    # If this is an AJAX request, return HTML snippet for suggestions
+    # If this is an AJAX request, answer from the in-memory prefix index
     if is_ajax:
-        html = render_to_string('store/search-suggestions.html', {'products': products, 'query': query})
+        suggestions = suggest(query, search.SUGGESTION_LIMIT) if query else []
+        if request.GET.get('format') == 'json':
+            return JsonResponse({'query': query, 'results': suggestions})
+        html = render_to_string('store/search-suggestions.html', {'products': suggestions, 'query': query})
         return HttpResponse(html)
+    if query:
+        # Ranked full-text search over title, brand and description
+        products = search.search(query, limit=search.RESULTS_LIMIT)
+    else:
+        products = []
     # Otherwise, return full page
     context = {
         'products': products,
         'query': query,
-        'product_count': products.count()
+        'product_count': len(products)
     }
     return render(request, 'store/search-results.html', context)
 
 '''
-The Q module is used for advanced Django query. Whereas a 
-filter() is used to filter any data, as is here, that would
-be title, brand, and description. With Q, it is done by the use
-of tranditional filter, with the use of Q(args). The args
-would be any of the title, brand and/or description that would 
-then be the query variable as it is transalted in their search 
-html pages. 
+Searching is delegated to store/search.py. On SQLite it queries an
+FTS5 index of product title, brand and description, ranked with
+bm25 so that title matches come first, instead of scanning the
+product table with three LIKE clauses on every keystroke. The
+index is kept up to date by the signal handlers in store/signals.py.
+
+Keystrokes in the search bar (ajax=1) are answered by the prefix
+index in store/suggestions.py without touching the database. With
+format=json the suggestions come back as JSON for the client to
+render, otherwise as the search-suggestions.html snippet.
+
+?sort=best-sellers and ?sort=trending on the store and category
+pages list products by the time-decayed scores of store/rankings.py.
+
+The "Frequently bought together" row of the product page is read
+from the table store/recommendations.py precomputes.
 
 '''
\ No newline at end of file